@@ -6,6 +6,8 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app.db.base import Base
 from app.db.models.api_key import ProjectApiKeyDB
+from app.db.models.auth_revision import AuthRevisionDB
+from app.db.models.usage_rollup import UsageRollupDB
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
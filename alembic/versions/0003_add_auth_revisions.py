@@ -0,0 +1,21 @@
+"""
+add auth_revisions counter for cross-worker auth cache invalidation
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003_add_auth_revisions'
+down_revision = '0002_add_key_fingerprint'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'auth_revisions',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('revision', sa.BigInteger, nullable=False, server_default='0'),
+    )
+    op.execute("INSERT INTO auth_revisions (id, revision) VALUES (1, 0)")
+
+def downgrade():
+    op.drop_table('auth_revisions')
@@ -0,0 +1,19 @@
+"""
+add (project_id, created_at, id) index for keyset-paginated API key listing
+"""
+from alembic import op
+
+revision = '0004_add_api_key_listing_index'
+down_revision = '0003_add_auth_revisions'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index(
+        'ix_project_api_keys_project_id_created_at_id',
+        'project_api_keys',
+        ['project_id', 'created_at', 'id']
+    )
+
+def downgrade():
+    op.drop_index('ix_project_api_keys_project_id_created_at_id', table_name='project_api_keys')
@@ -0,0 +1,25 @@
+"""
+add usage_rollups for aggregated per-project usage metering
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005_add_usage_rollups'
+down_revision = '0004_add_api_key_listing_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'usage_rollups',
+        sa.Column('project_id', sa.String(64), primary_key=True),
+        sa.Column('bucket_start', sa.BigInteger, primary_key=True),
+        sa.Column('requests', sa.BigInteger, nullable=False, server_default='0'),
+        sa.Column('pages', sa.BigInteger, nullable=False, server_default='0'),
+        sa.Column('decoded_bytes', sa.BigInteger, nullable=False, server_default='0'),
+        sa.Column('engine_ms', sa.BigInteger, nullable=False, server_default='0'),
+        sa.Column('cache_hits', sa.BigInteger, nullable=False, server_default='0'),
+    )
+
+def downgrade():
+    op.drop_table('usage_rollups')
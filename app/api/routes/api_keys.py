@@ -1,27 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
 from app.security.auth import require_api_key_dep, require_api_key_for_revoke, AuthContext
 from app.security.api_keys import generate_api_key
 from app.deps.stores import get_api_key_store
 from fastapi import Depends
 from app.schemas.api_key_endpoints import (
-    ApiKeyCreateRequest, ApiKeyCreateResponse, ApiKeyPublic, ApiKeyListResponse, ApiKeyRevokeResponse
+    ApiKeyCreateRequest, ApiKeyCreateResponse, ApiKeyPublic, ApiKeyListResponse, ApiKeyRevokeResponse,
+    ApiKeyBulkCreateRequest, ApiKeyBulkCreateResponse, ApiKeyRotateResponse
 )
+from app import config
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/projects/{project_id}/api-keys", tags=["api-keys"])
 
 
 
 @router.post("", response_model=ApiKeyCreateResponse)
-def create_api_key(
+async def create_api_key(
     project_id: str,
     req: ApiKeyCreateRequest,
     request: Request,
     auth: AuthContext = Depends(require_api_key_dep),
     store = Depends(get_api_key_store)
 ):
-    raw_key, api_key = store.create(project_id, req.name)
+    raw_key, api_key = await store.create(project_id, req.name)
     return ApiKeyCreateResponse(
         api_key=raw_key,
         api_key_id=api_key.id,
@@ -30,13 +32,54 @@ def create_api_key(
         created_at=api_key.created_at
     )
 
+def _created(raw_key: str, api_key) -> ApiKeyCreateResponse:
+    return ApiKeyCreateResponse(
+        api_key=raw_key,
+        api_key_id=api_key.id,
+        key_prefix=api_key.key_prefix,
+        name=api_key.name,
+        created_at=api_key.created_at
+    )
+
+@router.post("/bulk", response_model=ApiKeyBulkCreateResponse)
+async def bulk_create_api_keys(
+    project_id: str,
+    req: ApiKeyBulkCreateRequest,
+    auth: AuthContext = Depends(require_api_key_dep),
+    store = Depends(get_api_key_store)
+):
+    if req.count > config.API_KEY_BULK_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail={"error_code": "BULK_LIMIT_EXCEEDED", "message": f"count must be at most {config.API_KEY_BULK_MAX}"}
+        )
+    created = await store.bulk_create(project_id, req.count, req.name)
+    return ApiKeyBulkCreateResponse(items=[_created(raw, key) for raw, key in created])
+
+@router.post("/rotate", response_model=ApiKeyRotateResponse)
+async def rotate_api_keys(
+    project_id: str,
+    auth: AuthContext = Depends(require_api_key_dep),
+    store = Depends(get_api_key_store)
+):
+    """Revokes every active key of the project (including the caller's) and returns the replacements."""
+    revoked_count, created = await store.rotate_all(project_id)
+    return ApiKeyRotateResponse(revoked_count=revoked_count, items=[_created(raw, key) for raw, key in created])
+
 @router.get("", response_model=ApiKeyListResponse)
-def list_api_keys(
+async def list_api_keys(
     project_id: str,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    active_only: bool = False,
     auth: AuthContext = Depends(require_api_key_dep),
     store = Depends(get_api_key_store)
 ):
-    keys = store.list(project_id)
+    limit = min(limit or config.API_KEY_LIST_DEFAULT_LIMIT, config.API_KEY_LIST_MAX_LIMIT)
+    try:
+        keys, next_cursor = await store.list_page(project_id, limit=limit, cursor=cursor, active_only=active_only)
+    except ValueError:
+        raise HTTPException(status_code=400, detail={"error_code": "INVALID_CURSOR", "message": "Invalid pagination cursor"})
     items = [
         ApiKeyPublic(
             api_key_id=k.id,
@@ -47,16 +90,16 @@ def list_api_keys(
             revoked_at=k.revoked_at
         ) for k in keys
     ]
-    return ApiKeyListResponse(items=items)
+    return ApiKeyListResponse(items=items, next_cursor=next_cursor)
 
 @router.post("/{key_id}/revoke", response_model=ApiKeyRevokeResponse)
-def revoke_api_key(
+async def revoke_api_key(
     project_id: str,
     key_id: str,
     auth: AuthContext = Depends(require_api_key_for_revoke),
     store = Depends(get_api_key_store)
 ):
-    key = store.revoke(project_id, key_id)
+    key = await store.revoke(project_id, key_id)
     if not key:
         raise HTTPException(status_code=404, detail={"error": "not_found", "message": "API key not found"})
     return ApiKeyRevokeResponse(api_key_id=key.id, revoked_at=key.revoked_at)
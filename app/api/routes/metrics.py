@@ -0,0 +1,69 @@
+from collections import Counter as _StatusCounts
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.metrics import REGISTRY
+from app.services.job_store import JOBS
+from app.services import ocr_service
+from app.security.auth_cache import auth_cache
+from app.engines.factory import get_ocr_engine
+from app.engines.batching_engine import BatchingOCREngine
+from app.db.session import engine, async_engine
+from app.memory_accounting import traced_memory
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Scrape-time collectors: read state kept elsewhere instead of mirroring it per request
+
+@REGISTRY.collected("ocr_jobs", "OCR jobs in the job store by status", labelnames=("status",))
+def _ocr_jobs():
+    counts = _StatusCounts(job.status for job in list(JOBS.values()))
+    return [((status,), n) for status, n in counts.items()]
+
+@REGISTRY.collected("ocr_job_queue_depth", "OCR jobs enqueued and not yet started")
+def _ocr_job_queue_depth():
+    return [((), sum(1 for job in list(JOBS.values()) if job.status == "pending"))]
+
+@REGISTRY.collected("ocr_batch_pending_pages", "Pages waiting in the OCR micro-batcher")
+def _ocr_batch_pending_pages():
+    ocr_engine = get_ocr_engine()
+    if isinstance(ocr_engine, BatchingOCREngine):
+        return [((), ocr_engine.pending_pages())]
+    return []
+
+@REGISTRY.collected("ocr_cache_entries", "Entries in the OCR result cache")
+def _ocr_cache_entries():
+    return [((), len(ocr_service._ocr_cache))]
+
+@REGISTRY.collected("auth_cache_lookups", "API key auth cache lookups by result", kind="counter", labelnames=("result",))
+def _auth_cache_lookups():
+    return [(("hit",), auth_cache.hits), (("miss",), auth_cache.misses)]
+
+@REGISTRY.collected("auth_cache_entries", "Entries in the API key auth cache")
+def _auth_cache_entries():
+    return [((), len(auth_cache))]
+
+@REGISTRY.collected("db_pool_connections", "DB pool connections by engine and state", labelnames=("engine", "state"))
+def _db_pool_connections():
+    samples = []
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        # QueuePool-style pools only; SQLite memory/singleton pools have no sizing
+        if not hasattr(pool, "checkedout"):
+            continue
+        checked_out = pool.checkedout()
+        samples.append(((name, "checked_out"), checked_out))
+        samples.append(((name, "idle"), pool.checkedin()))
+        samples.append(((name, "overflow"), max(0, pool.overflow())))
+        samples.append(((name, "size"), pool.size()))
+    return samples
+
+@REGISTRY.collected("tracemalloc_traced_bytes", "Memory currently traced by tracemalloc (memory accounting only)")
+def _tracemalloc_traced_bytes():
+    current = traced_memory()
+    return [((), current)] if current else []
@@ -0,0 +1,53 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse
+from app import config
+from app.profiling import ProfilerBusyError, collapsed, get_request_profiles, get_sampling_profiler
+
+def require_profiling_admin(request: Request) -> None:
+    token = request.headers.get("x-admin-token", "")
+    if config.PROFILING_ADMIN_TOKEN:
+        allowed = hmac.compare_digest(token.encode(), config.PROFILING_ADMIN_TOKEN.encode())
+    else:
+        allowed = config.is_dev
+    if not allowed:
+        # Same answer as a missing route
+        raise HTTPException(status_code=404, detail="Not found")
+
+router = APIRouter(prefix="/debug/profile", tags=["debug"], dependencies=[Depends(require_profiling_admin)])
+
+@router.post("/sample")
+async def sample_profile(seconds: float = Query(10.0, gt=0)):
+    """
+    Samples every thread of this worker for seconds and returns collapsed stacks
+    (flamegraph.pl / speedscope input). Only one sampling run at a time per worker.
+    """
+    seconds = min(seconds, config.PROFILING_MAX_SECONDS)
+    try:
+        stacks = await run_in_threadpool(get_sampling_profiler().sample, seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail={"error_code": "PROFILER_BUSY", "message": str(e)})
+    return PlainTextResponse(
+        collapsed(stacks),
+        headers={"content-disposition": f'attachment; filename="profile-{os.getpid()}.collapsed"'}
+    )
+
+@router.get("/requests")
+def list_request_profiles():
+    return {"items": get_request_profiles().list()}
+
+@router.get("/requests/{profile_id}")
+def get_request_profile(profile_id: str, format: str = Query("pstats", pattern="^(pstats|text)$")):
+    """Downloads a per-request capture as a pstats file (snakeviz, pstats) or a text summary."""
+    profiles = get_request_profiles()
+    try:
+        path = profiles.path(profile_id)
+    except ValueError:
+        path = None
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail={"error_code": "NOT_FOUND", "message": "Profile not found"})
+    if format == "text":
+        return PlainTextResponse(profiles.text(profile_id))
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
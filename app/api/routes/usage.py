@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from app import config
+from app.deps.stores import get_async_db
+from app.schemas.usage import UsageBucket, UsageRollupResponse
+from app.security.auth import require_api_key_dep, AuthContext
+from app.usage import USAGE_FIELDS, query_rollups_async
+
+router = APIRouter(prefix="/api/projects/{project_id}/usage", tags=["usage"])
+
+GRANULARITY_SECONDS = {"hour": 3600, "day": 86400}
+
+def _utc(value: datetime) -> datetime:
+    # Naive timestamps are taken as UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+@router.get("", response_model=UsageRollupResponse)
+async def get_usage_rollup(
+    project_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: Literal["bucket", "hour", "day"] = "hour",
+    auth: AuthContext = Depends(require_api_key_dep),
+    db = Depends(get_async_db)
+):
+    """
+    Usage of the project between start (inclusive) and end (exclusive), default the last 24
+    hours, summed per hour, day or metering bucket. Counts lag by up to USAGE_FLUSH_SECONDS.
+    """
+    end = _utc(end) if end else datetime.now(timezone.utc)
+    start = _utc(start) if start else end - timedelta(days=1)
+    if start >= end or end - start > timedelta(days=config.USAGE_QUERY_MAX_DAYS):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error_code": "INVALID_RANGE",
+                "message": f"start must be before end and the range at most {config.USAGE_QUERY_MAX_DAYS} days"
+            }
+        )
+    step = config.USAGE_BUCKET_SECONDS if granularity == "bucket" else GRANULARITY_SECONDS[granularity]
+    buckets = await query_rollups_async(db, project_id, int(start.timestamp()), int(end.timestamp()), step)
+    totals = {name: sum(b[name] for b in buckets) for name in USAGE_FIELDS}
+    return UsageRollupResponse(
+        project_id=project_id,
+        start=start,
+        end=end,
+        granularity=granularity,
+        buckets=[UsageBucket(**b) for b in buckets],
+        totals=UsageBucket(start=start, **totals),
+    )
@@ -1,5 +1,6 @@
 # Maximum allowed total decoded bytes for OCR images (20MB)
 MAX_OCR_TOTAL_IMAGE_BYTES = 20 * 1024 * 1024
+import json
 import os
 
 ENV = os.getenv("ENV", "dev")
@@ -7,9 +8,164 @@ is_dev = ENV.lower() in {"dev", "development", "local"}
 APP_NAME = "fieldscript-api"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+
+def _env_flag(name: str, default: str = "false") -> bool:
+	return os.getenv(name, default).strip().lower() in {"1", "true", "yes", "on"}
+
 # Parse CORS_ORIGINS env var as comma-separated list
 _cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()]
 if is_dev:
 	allowed_origins = ["http://localhost:3000", "http://127.0.0.1:3000"] + _cors_origins
 else:
 	allowed_origins = _cors_origins
+
+# Per-page OCR fan-out: when enabled each page is sent to the engine on its own,
+# at most OCR_PAGE_CONCURRENCY pages in flight per job, retrying a failed page
+# up to OCR_PAGE_RETRIES times before marking only that page as failed. Per-page job progress
+# and the "page" lines of /jobs/{job_id}/stream exist only in this mode.
+OCR_PER_PAGE = _env_flag("OCR_PER_PAGE")
+OCR_PAGE_CONCURRENCY = int(os.getenv("OCR_PAGE_CONCURRENCY", "4"))
+OCR_PAGE_RETRIES = int(os.getenv("OCR_PAGE_RETRIES", "1"))
+
+# Cross-job micro-batching in front of the OCR engine: pages are grouped into one
+# engine call of up to OCR_BATCH_MAX_SIZE pages, waiting at most OCR_BATCH_MAX_WAIT_MS.
+OCR_BATCH_ENABLED = _env_flag("OCR_BATCH_ENABLED")
+OCR_BATCH_MAX_SIZE = int(os.getenv("OCR_BATCH_MAX_SIZE", "16"))
+OCR_BATCH_MAX_WAIT_MS = float(os.getenv("OCR_BATCH_MAX_WAIT_MS", "5"))
+
+# OCR engine selection: "default" (placeholder) or "synthetic" (load profile for capacity testing)
+OCR_ENGINE = os.getenv("OCR_ENGINE", "default").strip().lower()
+
+# document_type values kept as ocr_engine_duration_seconds labels; any other client-supplied
+# value is counted as "other" so the number of series stays bounded
+OCR_METRIC_DOCUMENT_TYPES = frozenset(
+	t.strip() for t in os.getenv("OCR_METRIC_DOCUMENT_TYPES", "invoice,receipt,id_card,form,letter").split(",") if t.strip()
+)
+
+# Synthetic engine load profile (see app/engines/synthetic_engine.py)
+SYNTHETIC_OCR_SEED = int(os.getenv("SYNTHETIC_OCR_SEED", "0"))
+SYNTHETIC_OCR_CPU_MS = float(os.getenv("SYNTHETIC_OCR_CPU_MS", "5"))
+SYNTHETIC_OCR_CPU_MODE = os.getenv("SYNTHETIC_OCR_CPU_MODE", "thread")
+SYNTHETIC_OCR_LATENCY = os.getenv("SYNTHETIC_OCR_LATENCY", "lognormal")
+SYNTHETIC_OCR_LATENCY_MS = float(os.getenv("SYNTHETIC_OCR_LATENCY_MS", "50"))
+SYNTHETIC_OCR_LATENCY_SIGMA = float(os.getenv("SYNTHETIC_OCR_LATENCY_SIGMA", "0.5"))
+SYNTHETIC_OCR_TAIL_ALPHA = float(os.getenv("SYNTHETIC_OCR_TAIL_ALPHA", "1.5"))
+SYNTHETIC_OCR_ALLOC_KB = int(os.getenv("SYNTHETIC_OCR_ALLOC_KB", "0"))
+SYNTHETIC_OCR_FAILURE_RATE = float(os.getenv("SYNTHETIC_OCR_FAILURE_RATE", "0"))
+
+# In-process cache of verified API keys (keyed by HMAC digest). AUTH_CACHE_TTL_SECONDS bounds
+# how long a revoked key may keep working on other workers; negative results expire sooner.
+# Set AUTH_CACHE_MAX_ENTRIES=0 to disable.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+# API key last_used_at is written behind: coarsened to this granularity and flushed in one
+# batched UPDATE every API_KEY_LAST_USED_FLUSH_SECONDS (and on shutdown).
+API_KEY_LAST_USED_GRANULARITY_SECONDS = int(os.getenv("API_KEY_LAST_USED_GRANULARITY_SECONDS", "60"))
+API_KEY_LAST_USED_FLUSH_SECONDS = float(os.getenv("API_KEY_LAST_USED_FLUSH_SECONDS", "15"))
+
+# How often each worker checks the shared auth revision counter; revocations on other
+# workers take effect in this worker's auth cache within this many seconds.
+AUTH_REVISION_POLL_SECONDS = float(os.getenv("AUTH_REVISION_POLL_SECONDS", "2"))
+
+# Database connection pooling (server databases; ignored for SQLite) and SQLite tuning
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "true")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Maximum keys per bulk-create API call (the CLI has no limit)
+API_KEY_BULK_MAX = int(os.getenv("API_KEY_BULK_MAX", "1000"))
+
+# API key listing page size: default and hard cap for the limit query parameter
+API_KEY_LIST_DEFAULT_LIMIT = int(os.getenv("API_KEY_LIST_DEFAULT_LIMIT", "50"))
+API_KEY_LIST_MAX_LIMIT = int(os.getenv("API_KEY_LIST_MAX_LIMIT", "200"))
+
+# Token-bucket rate limiting (app/services/rate_limiter.py), charged per request against the
+# client IP, the API key and the project in the path. A per-minute value of 0 disables a dimension;
+# burst defaults to the per-minute value. "sqlite" shares buckets across workers on a host.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "./ratelimit.db")
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "60"))
+RATE_LIMIT_IP_BURST = os.getenv("RATE_LIMIT_IP_BURST")
+RATE_LIMIT_KEY_PER_MINUTE = float(os.getenv("RATE_LIMIT_KEY_PER_MINUTE", "120"))
+RATE_LIMIT_KEY_BURST = os.getenv("RATE_LIMIT_KEY_BURST")
+RATE_LIMIT_PROJECT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PROJECT_PER_MINUTE", "600"))
+RATE_LIMIT_PROJECT_BURST = os.getenv("RATE_LIMIT_PROJECT_BURST")
+# JSON per-tenant limits, e.g. {"project:acme": {"per_minute": 1200, "burst": 2000}, "key:mph_ab12": {"per_minute": 10}}
+RATE_LIMIT_OVERRIDES = os.getenv("RATE_LIMIT_OVERRIDES", "")
+# Idle buckets are evicted after this long; keep it >= the slowest full refill (burst / rate)
+RATE_LIMIT_IDLE_SECONDS = float(os.getenv("RATE_LIMIT_IDLE_SECONDS", "600"))
+RATE_LIMIT_MAX_ENTRIES = int(os.getenv("RATE_LIMIT_MAX_ENTRIES", "100000"))
+
+# Per-project OCR cost quota (app/services/quota.py): each OCR request is charged its page
+# count and decoded image bytes against rolling per-minute and per-day budgets; 0 disables
+# a budget. Minute byte budgets below the 20MB request cap would reject the largest requests.
+OCR_QUOTA_PAGES_PER_MINUTE = float(os.getenv("OCR_QUOTA_PAGES_PER_MINUTE", "300"))
+OCR_QUOTA_PAGES_PER_DAY = float(os.getenv("OCR_QUOTA_PAGES_PER_DAY", "50000"))
+OCR_QUOTA_BYTES_PER_MINUTE = float(os.getenv("OCR_QUOTA_BYTES_PER_MINUTE", str(200 * 1024 * 1024)))
+OCR_QUOTA_BYTES_PER_DAY = float(os.getenv("OCR_QUOTA_BYTES_PER_DAY", str(20 * 1024 * 1024 * 1024)))
+# JSON per-project budgets, e.g. {"acme": {"pages_per_day": 200000, "bytes_per_day": 107374182400}}
+OCR_QUOTA_OVERRIDES = os.getenv("OCR_QUOTA_OVERRIDES", "")
+
+# Log lines are queued and written by a background thread in batches of up to LOG_BATCH_MAX;
+# beyond LOG_QUEUE_MAX pending lines new lines are dropped (and counted) instead of blocking.
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_BATCH_MAX = int(os.getenv("LOG_BATCH_MAX", "256"))
+
+# Request log sampling (app/middleware/log_sampling.py). Errors, 4xx/5xx and requests taking
+# at least REQUEST_LOG_SLOW_MS are always logged; other requests are kept at the rate of the
+# first matching rule (method optional, path is a glob: * within a segment, ** across),
+# else REQUEST_LOG_SAMPLE_RATE.
+# Sampling is by request_id, so all lines of one request are kept or dropped together.
+REQUEST_LOG_SAMPLING = os.getenv("REQUEST_LOG_SAMPLING", json.dumps([
+	{"path": "/health", "rate": 0},
+	{"path": "/ready", "rate": 0},
+	{"path": "/metrics", "rate": 0},
+	{"method": "GET", "path": "/v1/projects/*/jobs/*", "rate": 0.01},
+]))
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "1.0"))
+REQUEST_LOG_SLOW_MS = float(os.getenv("REQUEST_LOG_SLOW_MS", "1000"))
+
+# Per-stage timings (app/timing.py): sent as a Server-Timing response header and returned by
+# GET /v1/projects/{project_id}/jobs/{job_id}?debug=true. On by default in dev only, since
+# stage durations describe server internals.
+SERVER_TIMING_ENABLED = _env_flag("SERVER_TIMING_ENABLED", "true" if is_dev else "false")
+
+# Usage metering (app/usage.py): per-project counters aggregated in memory into
+# USAGE_BUCKET_SECONDS buckets and added to usage_rollups every USAGE_FLUSH_SECONDS (and on
+# shutdown). Rollup queries may span at most USAGE_QUERY_MAX_DAYS.
+USAGE_BUCKET_SECONDS = int(os.getenv("USAGE_BUCKET_SECONDS", "300"))
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "30"))
+USAGE_QUERY_MAX_DAYS = int(os.getenv("USAGE_QUERY_MAX_DAYS", "92"))
+
+# Profiling (app/profiling.py). With PROFILING_ENABLED, requests sending "x-profile: 1" with
+# the admin token or an API key listed in PROFILING_API_KEY_IDS (checked against the auth
+# cache before the handler runs) are captured with cProfile (newest PROFILING_MAX_STORED
+# kept in PROFILING_DIR). The /debug/profile endpoints (sampling profiler, capture
+# downloads) require the x-admin-token header to match PROFILING_ADMIN_TOKEN; without a
+# token they are only served in dev. Disabled profiling installs nothing on the request path.
+PROFILING_ENABLED = _env_flag("PROFILING_ENABLED")
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILING_API_KEY_IDS = frozenset(k.strip() for k in os.getenv("PROFILING_API_KEY_IDS", "").split(",") if k.strip())
+PROFILING_DIR = os.getenv("PROFILING_DIR", "")
+PROFILING_MAX_STORED = int(os.getenv("PROFILING_MAX_STORED", "50"))
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5"))
+
+# tracemalloc-based memory accounting (app/memory_accounting.py): peak allocation per stage
+# for requests and OCR jobs, in job debug output, /debug/memory and stage_memory_peak_bytes.
+# Slows allocation-heavy code; meant for capacity tests and canary workers.
+MEMORY_ACCOUNTING_ENABLED = _env_flag("MEMORY_ACCOUNTING_ENABLED")
+MEMORY_ACCOUNTING_FRAMES = int(os.getenv("MEMORY_ACCOUNTING_FRAMES", "1"))
+
+# Tracing (app/tracing.py): share of new traces sampled (0 disables tracing; an incoming
+# traceparent's sampled flag is followed). Spans are appended as JSON lines to
+# TRACING_EXPORT_PATH by a background writer, dropping spans beyond TRACING_QUEUE_MAX.
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0"))
+TRACING_EXPORT_PATH = os.getenv("TRACING_EXPORT_PATH", "./traces.jsonl")
+TRACING_QUEUE_MAX = int(os.getenv("TRACING_QUEUE_MAX", "10000"))
+TRACING_BATCH_MAX = int(os.getenv("TRACING_BATCH_MAX", "256"))
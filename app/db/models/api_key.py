@@ -19,4 +19,5 @@ class ProjectApiKeyDB(Base):
     __table_args__ = (
         UniqueConstraint("key_hash", name="uq_project_api_keys_key_hash"),
         Index("ix_project_api_keys_project_id_revoked_at", "project_id", "revoked_at"),
+        Index("ix_project_api_keys_project_id_created_at_id", "project_id", "created_at", "id"),
     )
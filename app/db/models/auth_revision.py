@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, BigInteger
+from app.db.base import Base
+
+class AuthRevisionDB(Base):
+    """
+    Single-row monotonic counter bumped whenever cached auth state becomes stale
+    (e.g. an API key is revoked). Workers poll it to invalidate their caches.
+    """
+    __tablename__ = "auth_revisions"
+    id = Column(Integer, primary_key=True)
+    revision = Column(BigInteger, nullable=False, default=0)
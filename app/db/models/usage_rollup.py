@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, BigInteger
+from app.db.base import Base
+
+class UsageRollupDB(Base):
+    """
+    Per-project usage counters for one time bucket (see app.usage). bucket_start is the
+    bucket's start in epoch seconds, so any coarser rollup is an integer GROUP BY.
+    """
+    __tablename__ = "usage_rollups"
+    project_id = Column(String(64), primary_key=True)
+    bucket_start = Column(BigInteger, primary_key=True)
+    requests = Column(BigInteger, nullable=False, default=0)
+    pages = Column(BigInteger, nullable=False, default=0)
+    decoded_bytes = Column(BigInteger, nullable=False, default=0)
+    engine_ms = Column(BigInteger, nullable=False, default=0)
+    cache_hits = Column(BigInteger, nullable=False, default=0)
@@ -1,6 +1,6 @@
 
 from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, AsyncSessionLocal
 from fastapi import Depends
 
 def get_db():
@@ -10,7 +10,11 @@ def get_db():
     finally:
         db.close()
 
-from app.stores.sql_api_keys import SqlApiKeyStore
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+from app.stores.async_sql_api_keys import AsyncSqlApiKeyStore
 
-def get_api_key_store(db=Depends(get_db)):
-    return SqlApiKeyStore(db)
+def get_api_key_store(db=Depends(get_async_db)):
+    return AsyncSqlApiKeyStore(db)
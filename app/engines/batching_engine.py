@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+from app.engines.ocr_engine import OCREngine, PAGE_SEPARATOR
+from app.engines.ocr_result import StructuredOCRResult
+
+logger = logging.getLogger("ocr_batching")
+
+@dataclass
+class _PendingPage:
+    image: str
+    future: asyncio.Future
+
+class BatchingOCREngine(OCREngine):
+    """
+    Micro-batching adapter in front of a batch-capable engine.
+
+    Pages submitted by concurrent jobs are collected per document_type and dispatched
+    to the wrapped engine's run_batch in one call once max_batch_size pages are waiting
+    or the oldest page has waited max_wait_ms, whichever comes first. Each caller only
+    awaits its own pages, so results are scattered back in order. Dispatch tasks are
+    referenced until they finish (the loop keeps only weak references) and are drained by
+    aclose() on shutdown.
+    """
+
+    def __init__(self, engine: OCREngine, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.engine = engine
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._pending: Dict[Optional[str], List[_PendingPage]] = {}
+        self._timers: Dict[Optional[str], asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def run(self, images: List[str], document_type: Optional[str]) -> str:
+        return PAGE_SEPARATOR.join(await self.run_batch(images, document_type))
+
+    def pending_pages(self) -> int:
+        """Pages waiting for their batch to be dispatched."""
+        return sum(len(pages) for pages in self._pending.values())
+
+    async def run_batch(self, images: List[str], document_type: Optional[str]) -> List[str]:
+        futures = [self._submit(image, document_type) for image in images]
+        return list(await asyncio.gather(*futures))
+
+    async def run_structured(self, images: List[str], document_type: Optional[str]) -> StructuredOCRResult:
+        # Layout output is engine-specific, so it goes straight to the wrapped engine unbatched
+        return await self.engine.run_structured(images, document_type)
+
+    def _submit(self, image: str, document_type: Optional[str]) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(document_type, [])
+        pending.append(_PendingPage(image, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(document_type)
+        elif document_type not in self._timers:
+            self._timers[document_type] = loop.call_later(self.max_wait, self._flush, document_type)
+        return future
+
+    def _flush(self, document_type: Optional[str]) -> None:
+        timer = self._timers.pop(document_type, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.pop(document_type, [])
+        while pending:
+            batch, pending = pending[:self.max_batch_size], pending[self.max_batch_size:]
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch, document_type))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def aclose(self, timeout: float = 10.0) -> None:
+        """Dispatches waiting pages and waits for in-flight batches; cancels what is left after timeout."""
+        for document_type in list(self._pending):
+            self._flush(document_type)
+        if not self._tasks:
+            return
+        _, still_running = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            await asyncio.wait(still_running)
+
+    async def _dispatch(self, batch: List[_PendingPage], document_type: Optional[str]) -> None:
+        try:
+            texts = await self.engine.run_batch([p.image for p in batch], document_type)
+            if len(texts) != len(batch):
+                raise RuntimeError(f"Engine returned {len(texts)} results for a batch of {len(batch)}")
+        except asyncio.CancelledError:
+            # Shutdown: the waiting jobs fail instead of hanging
+            self._fail(batch, RuntimeError("OCR batch cancelled on shutdown"))
+            raise
+        except Exception as e:
+            logger.warning(f"OCR batch of {len(batch)} pages failed: {e}")
+            self._fail(batch, e)
+            return
+        for page, text in zip(batch, texts):
+            if not page.future.done():
+                page.future.set_result(text)
+
+    @staticmethod
+    def _fail(batch: List[_PendingPage], error: BaseException) -> None:
+        for page in batch:
+            if not page.future.done():
+                page.future.set_exception(error)
@@ -0,0 +1,37 @@
+from typing import Optional
+from app import config
+from app.engines.ocr_engine import OCREngine, DefaultOCREngine
+from app.engines.batching_engine import BatchingOCREngine
+from app.engines.synthetic_engine import SyntheticOCREngine
+from app.engines.instrumented_engine import InstrumentedOCREngine
+
+_engine: Optional[OCREngine] = None
+
+def build_ocr_engine() -> OCREngine:
+    engine: OCREngine
+    if config.OCR_ENGINE == "synthetic":
+        engine = SyntheticOCREngine()
+    elif config.OCR_ENGINE == "default":
+        engine = DefaultOCREngine()
+    else:
+        raise ValueError(f"Unknown OCR_ENGINE: {config.OCR_ENGINE}")
+    # Inside the batching adapter, so latency is per real engine call (not batch wait)
+    engine = InstrumentedOCREngine(engine)
+    if config.OCR_BATCH_ENABLED:
+        engine = BatchingOCREngine(engine, config.OCR_BATCH_MAX_SIZE, config.OCR_BATCH_MAX_WAIT_MS)
+    return engine
+
+def get_ocr_engine() -> OCREngine:
+    """
+    Process-wide engine shared by all OCRService instances, so that the batching
+    adapter (when enabled) can combine pages across concurrent jobs.
+    """
+    global _engine
+    if _engine is None:
+        _engine = build_ocr_engine()
+    return _engine
+
+async def close_ocr_engine() -> None:
+    """Drains in-flight work of the shared engine (batches still being dispatched) on shutdown."""
+    if _engine is not None and hasattr(_engine, "aclose"):
+        await _engine.aclose()
@@ -0,0 +1,46 @@
+import time
+from typing import FrozenSet, List, Optional
+from app import config
+from app.engines.ocr_engine import OCREngine
+from app.engines.ocr_result import StructuredOCRResult
+from app.metrics import OCR_ENGINE_DURATION
+
+class InstrumentedOCREngine(OCREngine):
+    """
+    Records the latency of every call to the wrapped engine, labelled by document_type.
+    document_type is free-form client input: values outside document_types are labelled
+    "other" (and a missing one "none").
+    """
+
+    def __init__(self, engine: OCREngine, document_types: Optional[FrozenSet[str]] = None):
+        self.engine = engine
+        self.document_types = config.OCR_METRIC_DOCUMENT_TYPES if document_types is None else document_types
+
+    async def run(self, images: List[str], document_type: Optional[str]) -> str:
+        start = time.perf_counter()
+        try:
+            return await self.engine.run(images, document_type)
+        finally:
+            self._observe(start, document_type)
+
+    async def run_batch(self, images: List[str], document_type: Optional[str]) -> List[str]:
+        start = time.perf_counter()
+        try:
+            return await self.engine.run_batch(images, document_type)
+        finally:
+            self._observe(start, document_type)
+
+    async def run_structured(self, images: List[str], document_type: Optional[str]) -> StructuredOCRResult:
+        start = time.perf_counter()
+        try:
+            return await self.engine.run_structured(images, document_type)
+        finally:
+            self._observe(start, document_type)
+
+    def document_type_label(self, document_type: Optional[str]) -> str:
+        if not document_type:
+            return "none"
+        return document_type if document_type in self.document_types else "other"
+
+    def _observe(self, start: float, document_type: Optional[str]) -> None:
+        OCR_ENGINE_DURATION.observe(time.perf_counter() - start, (self.document_type_label(document_type),))
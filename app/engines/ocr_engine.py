@@ -1,11 +1,30 @@
 import abc
 from typing import List, Optional
+from app.engines.ocr_result import StructuredOCRResult
+
+# Separator used when per-page texts are merged back into one document text
+PAGE_SEPARATOR = "\n\n"
 
 class OCREngine(abc.ABC):
     @abc.abstractmethod
     async def run(self, images: List[str], document_type: Optional[str]) -> str:
         pass
 
+    async def run_batch(self, images: List[str], document_type: Optional[str]) -> List[str]:
+        """
+        Returns one text per image, in order. Batch-capable engines should override this
+        to process all images in a single inference call; the default runs pages one by one.
+        """
+        return [await self.run([image], document_type) for image in images]
+
+    async def run_structured(self, images: List[str], document_type: Optional[str]) -> StructuredOCRResult:
+        """
+        Returns pages with lines, bounding boxes and confidences. Engines that expose
+        layout should override this; the default derives one line per text line with
+        no position or confidence from run_batch.
+        """
+        return StructuredOCRResult.from_texts(await self.run_batch(images, document_type))
+
 class DefaultOCREngine(OCREngine):
     async def run(self, images: List[str], document_type: Optional[str]) -> str:
         return "OCR engine not yet implemented"
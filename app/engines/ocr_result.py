@@ -0,0 +1,103 @@
+import math
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Fields a client can select from a structured result
+STRUCTURED_FIELDS = ("text", "bbox", "confidence")
+
+# Stored in place of a missing confidence; serialized as null
+_NO_CONFIDENCE = -1.0
+# Stored in place of each coordinate of a missing bbox; serialized as null. (0, 0, 0, 0)
+# would be indistinguishable from a real box at the origin
+_NO_BBOX = (math.nan,) * 4
+
+BBox = Tuple[float, float, float, float]
+
+class OCRLine:
+    """
+    A single recognized line. Used to build and iterate pages; pages themselves
+    store lines column-wise so large documents don't pay per-object overhead.
+    """
+    __slots__ = ("text", "bbox", "confidence")
+
+    def __init__(self, text: str, bbox: Optional[BBox] = None, confidence: Optional[float] = None):
+        self.text = text
+        self.bbox = bbox
+        self.confidence = confidence
+
+    def __repr__(self) -> str:
+        return f"OCRLine(text={self.text!r}, bbox={self.bbox!r}, confidence={self.confidence!r})"
+
+class OCRPageLayout:
+    """
+    Lines of one page in columnar form: texts in a list, bounding boxes as a flat
+    array of (x0, y0, x1, y1) quads and confidences in a parallel array.
+    """
+    __slots__ = ("index", "texts", "boxes", "confidences")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.texts: List[str] = []
+        self.boxes = array("d")
+        self.confidences = array("d")
+
+    @classmethod
+    def from_text(cls, index: int, text: str) -> "OCRPageLayout":
+        page = cls(index)
+        for line in text.splitlines():
+            page.add_line(line)
+        return page
+
+    def add_line(self, text: str, bbox: Optional[Sequence[float]] = None, confidence: Optional[float] = None) -> None:
+        self.texts.append(text)
+        self.boxes.extend(bbox if bbox is not None else _NO_BBOX)
+        self.confidences.append(_NO_CONFIDENCE if confidence is None else confidence)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def lines(self) -> Iterator[OCRLine]:
+        boxes = self.boxes
+        for i, text in enumerate(self.texts):
+            conf = self.confidences[i]
+            x0 = boxes[4 * i]
+            yield OCRLine(
+                text,
+                None if math.isnan(x0) else (x0, boxes[4 * i + 1], boxes[4 * i + 2], boxes[4 * i + 3]),
+                None if conf == _NO_CONFIDENCE else conf,
+            )
+
+    def text(self) -> str:
+        return "\n".join(self.texts)
+
+    def to_dict(self, fields: Iterable[str] = STRUCTURED_FIELDS) -> Dict[str, Any]:
+        """
+        Columnar serialization: {"index", "text": [...], "bbox": [x0, y0, x1, y1, ...],
+        "confidence": [...]} restricted to the requested fields. A line without a box has
+        four nulls in bbox, so the list keeps four entries per line.
+        """
+        out: Dict[str, Any] = {"index": self.index}
+        if "text" in fields:
+            out["text"] = list(self.texts)
+        if "bbox" in fields:
+            out["bbox"] = [None if math.isnan(b) else b for b in self.boxes]
+        if "confidence" in fields:
+            out["confidence"] = [None if c == _NO_CONFIDENCE else c for c in self.confidences]
+        return out
+
+class StructuredOCRResult:
+    __slots__ = ("pages",)
+
+    def __init__(self, pages: Optional[List[OCRPageLayout]] = None):
+        self.pages: List[OCRPageLayout] = pages or []
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "StructuredOCRResult":
+        return cls([OCRPageLayout.from_text(i, t) for i, t in enumerate(texts)])
+
+    def text(self, separator: str = "\n\n") -> str:
+        return separator.join(page.text() for page in self.pages)
+
+    def to_dict(self, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        selected = STRUCTURED_FIELDS if fields is None else tuple(fields)
+        return {"pages": [page.to_dict(selected) for page in self.pages]}
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+from app import config
+from app.engines.ocr_engine import OCREngine, PAGE_SEPARATOR
+from app.engines.ocr_result import OCRPageLayout, StructuredOCRResult
+
+LATENCY_DISTRIBUTIONS = ("fixed", "lognormal", "heavy_tail")
+
+class SyntheticOCRError(RuntimeError):
+    pass
+
+@dataclass
+class SyntheticProfile:
+    """
+    Load profile of the synthetic engine. Latency is per engine call (I/O wait, e.g. a
+    remote model); cpu_ms and alloc_kb are per page.
+    """
+    seed: int = 0
+    cpu_ms: float = 0.0
+    cpu_mode: str = "thread"  # "thread" (offloaded) or "inline" (blocks the event loop)
+    latency: str = "fixed"
+    latency_ms: float = 0.0  # fixed value, or median for lognormal / scale for heavy_tail
+    latency_sigma: float = 0.5
+    tail_alpha: float = 1.5
+    alloc_kb: int = 0
+    failure_rate: float = 0.0
+    lines_per_page: int = 3
+
+    @classmethod
+    def from_config(cls) -> "SyntheticProfile":
+        return cls(
+            seed=config.SYNTHETIC_OCR_SEED,
+            cpu_ms=config.SYNTHETIC_OCR_CPU_MS,
+            cpu_mode=config.SYNTHETIC_OCR_CPU_MODE,
+            latency=config.SYNTHETIC_OCR_LATENCY,
+            latency_ms=config.SYNTHETIC_OCR_LATENCY_MS,
+            latency_sigma=config.SYNTHETIC_OCR_LATENCY_SIGMA,
+            tail_alpha=config.SYNTHETIC_OCR_TAIL_ALPHA,
+            alloc_kb=config.SYNTHETIC_OCR_ALLOC_KB,
+            failure_rate=config.SYNTHETIC_OCR_FAILURE_RATE,
+        )
+
+def _burn_cpu(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    x = 0
+    while time.perf_counter() < deadline:
+        x += 1
+
+class SyntheticOCREngine(OCREngine):
+    """
+    Engine that simulates OCR cost for load and capacity testing: per-page CPU time,
+    per-call I/O latency drawn from a fixed, lognormal or heavy-tailed (Pareto)
+    distribution, per-page memory allocation and random failures.
+
+    All random draws come from one RNG seeded with profile.seed and are taken when a
+    call starts, so a run is reproducible for a given seed and call order.
+    Batch-capable: run_batch pays the call latency once for the whole batch.
+    """
+
+    def __init__(self, profile: Optional[SyntheticProfile] = None):
+        self.profile = profile or SyntheticProfile.from_config()
+        if self.profile.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown synthetic latency distribution: {self.profile.latency}")
+        self._rng = random.Random(self.profile.seed)
+
+    def sample_latency_ms(self) -> float:
+        p = self.profile
+        if p.latency == "lognormal":
+            return p.latency_ms * self._rng.lognormvariate(0.0, p.latency_sigma)
+        if p.latency == "heavy_tail":
+            return p.latency_ms * self._rng.paretovariate(p.tail_alpha)
+        return p.latency_ms
+
+    async def run(self, images: List[str], document_type: Optional[str]) -> str:
+        return PAGE_SEPARATOR.join(await self.run_batch(images, document_type))
+
+    async def run_batch(self, images: List[str], document_type: Optional[str]) -> List[str]:
+        result = await self.run_structured(images, document_type)
+        return [page.text() for page in result.pages]
+
+    async def run_structured(self, images: List[str], document_type: Optional[str]) -> StructuredOCRResult:
+        p = self.profile
+        # Draw everything up front so the sequence does not depend on timing
+        latency_s = self.sample_latency_ms() / 1000
+        fail = self._rng.random() < p.failure_rate
+        confidences = [[self._rng.uniform(0.8, 1.0) for _ in range(p.lines_per_page)] for _ in images]
+
+        buffers = [bytearray(p.alloc_kb * 1024) for _ in images] if p.alloc_kb > 0 else []
+        if latency_s > 0:
+            await asyncio.sleep(latency_s)
+        cpu_s = p.cpu_ms * len(images) / 1000
+        if cpu_s > 0:
+            if p.cpu_mode == "inline":
+                _burn_cpu(cpu_s)
+            else:
+                await asyncio.to_thread(_burn_cpu, cpu_s)
+        del buffers
+        if fail:
+            raise SyntheticOCRError("Synthetic OCR failure")
+
+        pages = []
+        for index, page_confidences in enumerate(confidences):
+            page = OCRPageLayout(index)
+            for line, confidence in enumerate(page_confidences):
+                top = 20.0 + 40.0 * line
+                page.add_line(
+                    f"synthetic {document_type or 'document'} page {index + 1} line {line + 1}",
+                    (20.0, top, 580.0, top + 30.0),
+                    round(confidence, 4),
+                )
+            pages.append(page)
+        return StructuredOCRResult(pages)
@@ -3,3 +3,11 @@ class PayloadTooLargeError(Exception):
     def __init__(self, message: str):
         self.message = message
         super().__init__(message)
+
+
+class QuotaCostTooLargeError(Exception):
+    """The request alone costs more than a quota bucket can ever hold, so retrying cannot help."""
+    error_code = "QUOTA_COST_TOO_LARGE"
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(message)
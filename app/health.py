@@ -2,7 +2,8 @@
 
 from fastapi import APIRouter, status
 from fastapi.responses import JSONResponse
-from app.db.session import engine
+from sqlalchemy import text
+from app.db.session import async_engine
 
 router = APIRouter()
 
@@ -12,10 +13,10 @@ def health():
 
 
 @router.get("/ready")
-def ready():
+async def ready():
     try:
-        with engine.connect() as conn:
-            conn.execute("SELECT 1")
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
         return {"status": "ready"}
     except Exception:
         return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "not_ready"})
@@ -1,8 +1,159 @@
+import atexit
+import json
+import logging
+import queue
 import sys
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, TextIO
 from loguru import logger
-import json
+from app import config
+
+_STOP = object()
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class LogWriter:
+    """
+    Bounded queue of log lines drained by a daemon thread, so callers never block on the
+    output stream. Lines available together are joined into a single write. When the
+    queue is full new lines are dropped and counted; the writer reports drops itself.
+    """
+
+    def __init__(self, stream: Callable[[], TextIO], max_queue: int, batch_size: int):
+        # The stream is looked up per batch so redirected stdout/stderr (tests, reloaders) is honoured
+        self._stream = stream
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._reported_dropped = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, line: str) -> bool:
+        try:
+            self._queue.put_nowait(line)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _run(self) -> None:
+        while True:
+            batch = []
+            item = self._queue.get()
+            # Take whatever else is already queued, up to batch_size, for one write
+            while isinstance(item, str):
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    item = None
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            self._write(batch)
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is _STOP:
+                return
+
+    def _write(self, batch) -> None:
+        with self._lock:
+            dropped = self.dropped - self._reported_dropped
+            self._reported_dropped = self.dropped
+        if dropped:
+            batch.append(json.dumps({"level": "WARNING", "event": "log_lines_dropped", "count": dropped}))
+        if not batch:
+            return
+        try:
+            stream = self._stream()
+            stream.write("\n".join(batch) + "\n")
+            stream.flush()
+        except (OSError, ValueError):
+            with self._lock:
+                self.dropped += len(batch)
+                self._reported_dropped += len(batch)
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until everything queued before the call is written (or timeout)."""
+        if not self._thread.is_alive():
+            return False
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Writes everything queued so far and stops the thread."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "batches": self.batches,
+                "dropped": self.dropped,
+            }
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    stdlib logging -> LogWriter. Records logged with extra={"preformatted": True} carry a
+    ready JSON line in msg and are queued as-is; others are rendered as a JSON object.
+    """
+
+    def __init__(self, writer: LogWriter, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if getattr(record, "preformatted", False):
+                line = record.msg
+            else:
+                log = {
+                    "level": record.levelname,
+                    "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                    "logger": record.name,
+                    "message": record.getMessage(),
+                    "module": record.module,
+                    "function": record.funcName,
+                    "line": record.lineno,
+                }
+                if record.exc_info:
+                    log["exception"] = self.formatException(record.exc_info)
+                line = json.dumps(log, default=str)
+            self.writer.put(line)
+        except Exception:
+            self.handleError(record)
+
 
 class JsonLogSink:
+    def __init__(self, writer: LogWriter):
+        self.writer = writer
+
     def write(self, message):
         record = message.record
         log = {
@@ -13,12 +164,90 @@ class JsonLogSink:
             "function": record["function"],
             "line": record["line"]
         }
-        print(json.dumps(log))
+        self.writer.put(json.dumps(log))
 
     def flush(self):
         pass
 
+
+# The app's stdlib loggers. Only these go to the queue: third-party loggers (httpx, uvicorn,
+# sqlalchemy) and the root logger keep whatever the host process configured.
+APP_LOGGERS = (
+    "app",
+    "request_log",
+    "payload_guard",
+    "usage",
+    "rate_limit",
+    "ocr_service",
+    "ocr_batching",
+    "api_key_last_used",
+)
+
+stdout_writer: Optional[LogWriter] = None
+stderr_writer: Optional[LogWriter] = None
+_handler: Optional[QueueLogHandler] = None
+
+
 def setup_logging():
+    global stdout_writer, stderr_writer, _handler
+    if stdout_writer is None:
+        stdout_writer = LogWriter(lambda: sys.stdout, config.LOG_QUEUE_MAX, config.LOG_BATCH_MAX)
+        stderr_writer = LogWriter(lambda: sys.stderr, config.LOG_QUEUE_MAX, config.LOG_BATCH_MAX)
+        atexit.register(shutdown_logging)
+    logger.remove()
+    logger.add(JsonLogSink(stdout_writer), level="INFO")
+    logger.add(lambda message: stderr_writer.put(str(message).rstrip("\n")), level="ERROR")
+    previous, _handler = _handler, QueueLogHandler(stdout_writer)
+    for name in APP_LOGGERS:
+        log = logging.getLogger(name)
+        if previous is not None:
+            log.removeHandler(previous)
+        log.addHandler(_handler)
+        log.setLevel(config.LOG_LEVEL.upper())
+        log.propagate = False
+
+
+def log_json(event: dict) -> None:
+    """Queues one JSON line on stdout (startup/shutdown events and other non-logger output)."""
+    line = json.dumps(event, default=str)
+    if stdout_writer is None:
+        print(line)
+    else:
+        stdout_writer.put(line)
+
+
+def log_stderr(text: str) -> None:
+    if stderr_writer is None:
+        print(text, file=sys.stderr)
+    else:
+        stderr_writer.put(text)
+
+
+def log_stats() -> Dict[str, Dict[str, int]]:
+    return {
+        "stdout": stdout_writer.stats() if stdout_writer else {},
+        "stderr": stderr_writer.stats() if stderr_writer else {},
+    }
+
+
+def flush_logging(timeout: float = 5.0) -> None:
+    """Waits for queued lines to be written; called from the app lifespan on shutdown."""
+    for writer in (stdout_writer, stderr_writer):
+        if writer is not None:
+            writer.flush(timeout)
+
+
+def shutdown_logging() -> None:
+    """Flushes and stops the writers; later log lines go straight to the streams."""
+    global stdout_writer, stderr_writer, _handler
+    if _handler is not None:
+        for name in APP_LOGGERS:
+            log = logging.getLogger(name)
+            log.removeHandler(_handler)
+            log.propagate = True
+        _handler = None
     logger.remove()
-    logger.add(JsonLogSink(), level="INFO")
-    logger.add(sys.stderr, level="ERROR")
+    for writer in (stdout_writer, stderr_writer):
+        if writer is not None:
+            writer.close()
+    stdout_writer = stderr_writer = None
@@ -1,7 +1,7 @@
 from fastapi import BackgroundTasks
 from uuid import uuid4
 from app.schemas.job import OCRJob
-from app.services.job_store import JOBS
+from app.services.job_store import JOBS, subscribe_job, unsubscribe_job, notify_job_update
 #
 # Payload limits are enforced INSIDE this route (route-local guard) to guarantee the 413 contract regardless of middleware stack or exception handler behavior.
 # Limits are based on DECODED bytes (not base64 string length): 10MB per image, 20MB total.
@@ -23,23 +23,25 @@ def b64_decoded_size(b64_s: str) -> int:
 import sys
 import time
 import json
+import asyncio
 import logging
 from fastapi import FastAPI, Request, status, HTTPException, APIRouter
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
-from app.errors import PayloadTooLargeError
-from app.middleware.request_id import RequestIDMiddleware
-from app.logging_setup import setup_logging
+from app.errors import PayloadTooLargeError, QuotaCostTooLargeError
+from app.middleware.pipeline import RequestPipelineMiddleware
+from app.logging_setup import setup_logging, log_json, log_stderr, log_stats, flush_logging
 from app.schemas.common import ErrorResponse
 from app.schemas.ocr import OCRRequest, OCRResponse
 from app.services.ocr_service import OCRService
+from app.engines.factory import close_ocr_engine
+from app.services.quota import get_cost_quota
+from app.metrics import OCR_JOB_QUEUE_WAIT, RATE_LIMIT_REJECTIONS
+from app.timing import StageTimings, mark, stage, track_memory, use_timings
+from app import memory_accounting, tracing
 from app.schemas.export import ExportRequest, ExportResponse
-from app.request_logging import RequestLoggingMiddleware
-from app.context_middleware import ContextMiddleware
-from app.rate_limit_middleware import RateLimitMiddleware
-from app.security_headers_middleware import SecurityHeadersMiddleware
-from app.usage import get_usage_events
+from app.usage import usage_aggregator, run_usage_flusher, flush_usage
+from app.security.last_used import run_last_used_flusher, flush_last_used
 from app import config
 from app.utils.project_scope import enforce_project_scope
 from app.utils.base64_size import estimate_base64_decoded_bytes as _estimate_base64_decoded_bytes
@@ -64,6 +66,10 @@ TEMPLATE_VERSION = "template_v1"
 
 setup_logging()
 
+if config.MEMORY_ACCOUNTING_ENABLED:
+    # Before the app exists, so everything allocated while serving is traced
+    memory_accounting.enable_memory_accounting(config.MEMORY_ACCOUNTING_FRAMES)
+
 @asynccontextmanager
 async def lifespan(app):
     # Startup
@@ -82,17 +88,35 @@ async def lifespan(app):
             "dev_flag": True,
             "version": SERVICE_VERSION
         })
-    print(json.dumps(startup_log))
+    log_json(startup_log)
+    last_used_flusher = asyncio.create_task(run_last_used_flusher(config.API_KEY_LAST_USED_FLUSH_SECONDS))
+    usage_flusher = asyncio.create_task(run_usage_flusher(config.USAGE_FLUSH_SECONDS))
     yield
     # Shutdown
-    print(json.dumps({
+    last_used_flusher.cancel()
+    usage_flusher.cancel()
+    try:
+        await close_ocr_engine()
+    except Exception:
+        logger.exception("Failed to drain OCR engine batches on shutdown")
+    try:
+        await flush_last_used()
+    except Exception:
+        logger.exception("Failed to flush API key last_used_at updates on shutdown")
+    try:
+        await flush_usage()
+    except Exception:
+        logger.exception("Failed to flush usage rollups on shutdown")
+    log_json({
         "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
         "level": "INFO",
         "event": "shutdown",
         "service_name": SERVICE_NAME,
         "service_version": SERVICE_VERSION,
         "env": config.ENV
-    }))
+    })
+    tracing.flush_tracing()
+    flush_logging()
 
 
 
@@ -100,29 +124,37 @@ async def lifespan(app):
 # Instantiate FastAPI app
 app = FastAPI(lifespan=lifespan)
 
+if tracing.get_tracer() is not None:
+    from app.db.session import engine as _db_engine, async_engine as _async_db_engine
+    tracing.instrument_engine(_db_engine)
+    tracing.instrument_engine(_async_db_engine.sync_engine)
+
 # Register API key management router (required for tests)
 from app.api.routes import api_keys as api_keys_router
 app.include_router(api_keys_router.router)
+from app.api.routes import metrics as metrics_router
+app.include_router(metrics_router.router)
+from app.api.routes import usage as usage_router
+app.include_router(usage_router.router)
 
 
-# New middleware order for correct short-circuit header application
-app.add_middleware(RateLimitMiddleware)
-app.add_middleware(RequestLoggingMiddleware)
-app.add_middleware(ContextMiddleware)
+# Request id, security headers, CORS, context, rate limit and request logging in one
+# pure-ASGI pass (see app/middleware/pipeline.py for the header/short-circuit contracts)
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=config.allowed_origins,
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["*"]
+    RequestPipelineMiddleware,
+    cors_options=dict(
+        allow_origins=config.allowed_origins,
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+        allow_headers=["*"]
+    )
 )
-app.add_middleware(SecurityHeadersMiddleware)
-app.add_middleware(RequestIDMiddleware)
 
 
 # Register the dry-run endpoint after app = FastAPI(...)
 @app.post("/v1/projects/{project_id}/ocr/dry-run")
 async def ocr_dry_run(project_id: str, request: Request, body: OCRRequest):
+    mark("validation")
     # Project scoping enforcement
     request.state.project_id = project_id
     header_id = request.headers.get("x-project-id")
@@ -146,8 +178,10 @@ async def ocr_dry_run(project_id: str, request: Request, body: OCRRequest):
         return resp
     service = OCRService()
     request_id = getattr(request.state, "request_id", "unknown")
-    req_hash = service.compute_request_hash(body)
-    cache_hit = service.is_cache_hit(req_hash)
+    with stage("hash"):
+        req_hash = service.compute_request_hash(body)
+    with stage("cache_lookup"):
+        cache_hit = service.is_cache_hit(req_hash)
     request.state.cache_hit = cache_hit
     resp = JSONResponse(content={
         "request_id": request_id,
@@ -186,24 +220,27 @@ async def ocr(
     Accepts OCR requests, enqueues background processing, and returns a job_id for async polling.
     Uses FastAPI BackgroundTasks to avoid blocking the request thread.
     """
+    # Routing, body parsing and OCRRequest validation happen before the handler runs
+    mark("validation")
     enforce_project_scope(request, project_id)
     PER_IMAGE_CAP = 10 * 1024 * 1024
     TOTAL_CAP = 20 * 1024 * 1024
     request_id = getattr(request.state, "request_id", "unknown")
     images = body.images
     total_bytes = 0
-    for img in images:
-        size_i = b64_decoded_size(img)
-        if size_i > PER_IMAGE_CAP:
-            body_ = {
-                "error_code": "PAYLOAD_TOO_LARGE",
-                "message": "An individual image exceeds allowed size",
-                "request_id": request_id,
-            }
-            resp = JSONResponse(status_code=413, content=body_)
-            resp.headers["x-request-id"] = request_id
-            return resp
-        total_bytes += size_i
+    with stage("b64_size"):
+        for img in images:
+            size_i = b64_decoded_size(img)
+            if size_i > PER_IMAGE_CAP:
+                body_ = {
+                    "error_code": "PAYLOAD_TOO_LARGE",
+                    "message": "An individual image exceeds allowed size",
+                    "request_id": request_id,
+                }
+                resp = JSONResponse(status_code=413, content=body_)
+                resp.headers["x-request-id"] = request_id
+                return resp
+            total_bytes += size_i
     if total_bytes > TOTAL_CAP:
         body_ = {
             "error_code": "PAYLOAD_TOO_LARGE",
@@ -214,6 +251,35 @@ async def ocr(
         resp.headers["x-request-id"] = request_id
         return resp
 
+    # Charge pages and decoded bytes before anything is enqueued
+    try:
+        with stage("quota"):
+            quota = await get_cost_quota().charge_async(project_id, len(images), total_bytes)
+    except QuotaCostTooLargeError as e:
+        # No amount of waiting fits this request in the budget: no Retry-After
+        request.state.error_code = e.error_code
+        RATE_LIMIT_REJECTIONS.inc(labels=("quota",))
+        resp = JSONResponse(
+            status_code=413,
+            content={"error_code": e.error_code, "message": e.message, "request_id": request_id}
+        )
+        resp.headers["x-request-id"] = request_id
+        return resp
+    if quota is not None and not quota.allowed:
+        request.state.error_code = "QUOTA_EXCEEDED"
+        RATE_LIMIT_REJECTIONS.inc(labels=("quota",))
+        resp = JSONResponse(
+            status_code=429,
+            content={
+                "error_code": "QUOTA_EXCEEDED",
+                "message": "OCR quota exceeded for this project",
+                "request_id": request_id,
+            }
+        )
+        resp.headers["x-request-id"] = request_id
+        resp.headers["retry-after"] = str(quota.retry_after)
+        return resp
+
     job_id = str(uuid4())
     job = OCRJob(
         job_id=job_id,
@@ -221,27 +287,62 @@ async def ocr(
         status="pending",
         result=None,
         error=None,
-        request_id=request_id
+        request_id=request_id,
+        pages_total=len(images)
     )
     JOBS[job_id] = job
 
-    async def process_ocr_job(job_id: str, body: OCRRequest, request_id: str):
+    async def process_ocr_job(job_id: str, body: OCRRequest, request_id: str, enqueued_at: float):
         job = JOBS.get(job_id)
         if not job:
             return
+        # The job gets its own timings; the request's were already sent as Server-Timing
+        timings = StageTimings()
+        timings.add("queue_wait", timings.started - enqueued_at)
+        OCR_JOB_QUEUE_WAIT.observe(timings.started - enqueued_at)
+        # Child of the request's handler span (background tasks run in the request context)
+        with tracing.span("ocr.job", job_id=job_id, project_id=project_id) as job_span:
+            if job_span is not None:
+                waited_ns = int((timings.started - enqueued_at) * 1e9)
+                job_span.child("queue_wait", start_ns=job_span.start_ns - waited_ns).end(job_span.start_ns)
+            await run_ocr_job(job, body, request_id, timings, job_span)
+
+    async def run_ocr_job(job: OCRJob, body: OCRRequest, request_id: str, timings: StageTimings, job_span):
+        job_id = job.job_id
         job.status = "processing"
+        notify_job_update(job_id)
+
+        def on_page(page):
+            job.record_page(page)
+            notify_job_update(job_id)
+
+        cache_hit = False
         try:
             service = OCRService()
-            response, _cache_hit = await service.process(body, request_id)
+            with use_timings(timings), track_memory("job"):
+                response, cache_hit = await service.process(body, request_id, on_page=on_page)
             job.status = "completed"
             job.result = response
         except Exception as e:
             job.status = "failed"
             job.error = str(e)
+            if job_span is not None:
+                job_span.status = "error"
             logger.exception(f"OCR job {job_id} failed")
             # Do not re-raise; log and mark as failed
-
-    background_tasks.add_task(process_ocr_job, job_id, body, request_id)
+        finally:
+            job.timings = timings.as_ms()
+            job.memory_peaks = dict(timings.memory_peaks)
+            # Engine time is metered for failed jobs too
+            usage_aggregator.record(
+                project_id,
+                engine_ms=timings.durations.get("engine", 0.0) * 1000,
+                cache_hits=1 if cache_hit else 0
+            )
+            notify_job_update(job_id)
+
+    background_tasks.add_task(process_ocr_job, job_id, body, request_id, time.perf_counter())
+    usage_aggregator.record(project_id, requests=1, pages=len(images), decoded_bytes=total_bytes)
 
     resp = JSONResponse(
         status_code=202,
@@ -257,9 +358,11 @@ async def ocr(
 
 # GET /v1/projects/{project_id}/jobs/{job_id}
 @app.get("/v1/projects/{project_id}/jobs/{job_id}")
-async def get_ocr_job(project_id: str, job_id: str, request: Request):
+async def get_ocr_job(project_id: str, job_id: str, request: Request, debug: bool = False):
     """
     Returns the status/result of an OCR job. Enforces project scope and error contract.
+    With ?debug=true (and SERVER_TIMING_ENABLED) the per-stage timings are included, and
+    the per-stage peak allocations when memory accounting is on.
     """
     enforce_project_scope(request, project_id)
     request_id = getattr(request.state, "request_id", "unknown")
@@ -276,17 +379,78 @@ async def get_ocr_job(project_id: str, job_id: str, request: Request):
     result = {
         "job_id": job.job_id,
         "status": job.status,
-        "request_id": job.request_id
+        "request_id": job.request_id,
+        "progress": job.progress,
+        "pages": [p.model_dump(exclude_none=True) for p in job.finished_pages()]
     }
     if job.status == "completed" and job.result:
-        result["result"] = job.result.model_dump()
+        # Per-page results are already listed under "pages"
+        result["result"] = job.result.model_dump(exclude_none=True, exclude={"pages"})
     if job.status == "failed" and job.error:
         result["error"] = job.error
+    if debug and config.SERVER_TIMING_ENABLED:
+        result["timings"] = job.timings
+        if job.memory_peaks:
+            result["memory_peaks"] = job.memory_peaks
     resp = JSONResponse(content=result)
     resp.headers["x-request-id"] = request_id
     return resp
 
 
+# Seconds between re-checks of a streamed job when no update notification arrives
+JOB_STREAM_POLL_SECONDS = 1.0
+
+# GET /v1/projects/{project_id}/jobs/{job_id}/stream
+@app.get("/v1/projects/{project_id}/jobs/{job_id}/stream")
+async def stream_ocr_job(project_id: str, job_id: str, request: Request):
+    """
+    Streams an OCR job as NDJSON: one "page" line per page as it finishes, then a final
+    "job" line with the terminal status (and result or error). Enforces project scope.
+    """
+    enforce_project_scope(request, project_id)
+    request_id = getattr(request.state, "request_id", "unknown")
+    job = JOBS.get(job_id)
+    if not job or job.project_id != project_id:
+        body = {
+            "error_code": "NOT_FOUND",
+            "message": "Job not found",
+            "request_id": request_id
+        }
+        resp = JSONResponse(status_code=404, content=body)
+        resp.headers["x-request-id"] = request_id
+        return resp
+
+    async def events():
+        update = subscribe_job(job_id)
+        try:
+            sent = set()
+            while True:
+                update.clear()
+                for page in job.finished_pages():
+                    if page.index not in sent:
+                        sent.add(page.index)
+                        line = {"type": "page", "job_id": job_id, **page.model_dump(exclude_none=True)}
+                        yield json.dumps(line) + "\n"
+                if job.status in ("completed", "failed"):
+                    final = {"type": "job", "job_id": job_id, "status": job.status, "progress": job.progress}
+                    if job.status == "completed" and job.result:
+                        final["result"] = job.result.model_dump(exclude_none=True, exclude={"pages"})
+                    if job.status == "failed" and job.error:
+                        final["error"] = job.error
+                    yield json.dumps(final) + "\n"
+                    return
+                try:
+                    await asyncio.wait_for(update.wait(), timeout=JOB_STREAM_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            unsubscribe_job(job_id, update)
+
+    resp = StreamingResponse(events(), media_type="application/x-ndjson")
+    resp.headers["x-request-id"] = request_id
+    return resp
+
+
 @app.post("/v1/projects/{project_id}/export", response_model=ExportResponse)
 def export(project_id: str, request: Request, body: ExportRequest):
     request_id = getattr(request.state, "request_id", "unknown")
@@ -342,16 +506,19 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 
 
-# Ensure exactly one global Exception handler that prints tracebacks to sys.stderr
+# Ensure exactly one global Exception handler that writes tracebacks to stderr
 import traceback
 
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     request_id = getattr(request.state, "request_id", "unknown")
     request.state.error_code = "INTERNAL_ERROR"
-    print(f"\n================ TRACEBACK_START request_id={request_id} ================", file=sys.stderr)
-    traceback.print_exc(file=sys.stderr)
-    print(f"================ TRACEBACK_END request_id={request_id} ================\n", file=sys.stderr)
+    # One queued block so concurrent tracebacks do not interleave
+    log_stderr(
+        f"\n================ TRACEBACK_START request_id={request_id} ================\n"
+        + "".join(traceback.format_exception(exc)).rstrip("\n")
+        + f"\n================ TRACEBACK_END request_id={request_id} ================\n"
+    )
     resp = JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content=ErrorResponse(
@@ -375,7 +542,7 @@ def debug_usage(request: Request):
         request_id = getattr(request.state, "request_id", "unknown")
         resp.headers["x-request-id"] = request_id
         return resp
-    resp = JSONResponse(content=get_usage_events())
+    resp = JSONResponse(content=usage_aggregator.snapshot())
     request_id = getattr(request.state, "request_id", "unknown")
     resp.headers["x-request-id"] = request_id
     return resp
@@ -387,13 +554,33 @@ def debug_health(request: Request):
         request_id = getattr(request.state, "request_id", "unknown")
         resp.headers["x-request-id"] = request_id
         return resp
-    resp = JSONResponse(content={"status": "ok", "env": config.ENV})
+    resp = JSONResponse(content={"status": "ok", "env": config.ENV, "logging": log_stats()})
     request_id = getattr(request.state, "request_id", "unknown")
     resp.headers["x-request-id"] = request_id
     return resp
 
+@debug_router.get("/debug/memory")
+def debug_memory(request: Request, limit: int = 25):
+    """tracemalloc totals and the largest live allocation sites (with MEMORY_ACCOUNTING_ENABLED)."""
+    request_id = getattr(request.state, "request_id", "unknown")
+    if not config.is_dev:
+        resp = JSONResponse(status_code=404, content={"detail": "Not found"})
+        resp.headers["x-request-id"] = request_id
+        return resp
+    resp = JSONResponse(content={
+        "enabled": memory_accounting.enabled,
+        "traced_bytes": memory_accounting.traced_memory(),
+        "top_allocations": memory_accounting.top_allocations(max(1, min(limit, 200))),
+    })
+    resp.headers["x-request-id"] = request_id
+    return resp
+
 if config.is_dev:
     app.include_router(debug_router)
 
+if config.is_dev or config.PROFILING_ENABLED:
+    from app.api.routes import profiling as profiling_router
+    app.include_router(profiling_router.router)
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
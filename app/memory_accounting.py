@@ -0,0 +1,101 @@
+"""
+Optional tracemalloc-based memory accounting (MEMORY_ACCOUNTING_ENABLED).
+
+When enabled, every app.timing stage also records the peak traced allocation above the
+stage's starting point (see timing.stage), stored per request/job next to the timings and
+observed into the stage_memory_peak_bytes histogram. tracemalloc has a single
+process-wide peak, so a stage's peak includes whatever ran concurrently: numbers are
+exact for a request running alone (a capacity test at concurrency 1, or a canary worker)
+and an upper bound otherwise. Tracing slows allocation-heavy code noticeably; keep it off
+in normal serving.
+"""
+import threading
+import tracemalloc
+from typing import Dict, List
+
+enabled = False
+
+
+def enable_memory_accounting(frames: int = 1) -> None:
+    global enabled
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, frames))
+    enabled = True
+
+
+def disable_memory_accounting() -> None:
+    global enabled
+    enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+class MemorySpan:
+    __slots__ = ("start", "peak")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.peak = start
+
+    def peak_bytes(self) -> int:
+        return max(0, self.peak - self.start)
+
+
+# Open spans share the single tracemalloc peak: before anyone resets it, the peak so far is
+# folded into every open span, so nested and overlapping spans keep their own maxima
+_open: List[MemorySpan] = []
+_lock = threading.Lock()
+
+
+def _fold_peak() -> None:
+    peak = tracemalloc.get_traced_memory()[1]
+    for span in _open:
+        if peak > span.peak:
+            span.peak = peak
+
+
+def span_start() -> MemorySpan:
+    with _lock:
+        _fold_peak()
+        tracemalloc.reset_peak()
+        span = MemorySpan(tracemalloc.get_traced_memory()[0])
+        _open.append(span)
+    return span
+
+
+def span_peak(span: MemorySpan) -> int:
+    """Peak bytes allocated above the span's start so far."""
+    with _lock:
+        _fold_peak()
+    return span.peak_bytes()
+
+
+def span_end(span: MemorySpan) -> int:
+    with _lock:
+        _fold_peak()
+        for i, open_span in enumerate(_open):
+            if open_span is span:
+                del _open[i]
+                break
+    return span.peak_bytes()
+
+
+def traced_memory() -> int:
+    """Currently traced bytes, or 0 when not tracing (the peak is reset by every span)."""
+    if not tracemalloc.is_tracing():
+        return 0
+    return tracemalloc.get_traced_memory()[0]
+
+
+def top_allocations(limit: int = 25) -> List[Dict[str, object]]:
+    """Largest live allocation sites by source line."""
+    if not tracemalloc.is_tracing():
+        return []
+    stats = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    )).statistics("lineno")
+    return [
+        {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size, "count": stat.count}
+        for stat in stats[:limit]
+    ]
@@ -0,0 +1,219 @@
+"""
+In-process metrics in Prometheus text format (served at /metrics).
+
+Counters, up/down gauges and histograms are sharded per thread: each shard has a single
+writer (its thread), so recording takes no lock and loses no updates; a scrape copies
+each shard (dict.copy() is atomic under the GIL) and sums them. Values
+that already live elsewhere (job counts, cache sizes, DB pools) are read at scrape time
+by collector callbacks instead of being mirrored on the hot path.
+"""
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Labels, float]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+class _Sharded:
+    """Per-thread dict shards; a shard is only written by its own thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self) -> List[dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__()
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+
+    def inc(self, amount: float = 1.0, labels: Labels = ()) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        totals: Dict[Labels, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        return totals
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self.values().items():
+            yield self.name + "_total", labels, value
+
+
+class Gauge(Counter):
+    """Up/down gauge (e.g. in-flight requests); inc/dec may happen on different threads."""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, labels: Labels = ()) -> None:
+        self.inc(-amount, labels)
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self.values().items():
+            yield self.name, labels, value
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__()
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # [count per bucket..., +Inf count, sum]
+            series = [0] * (len(self.buckets) + 1) + [0.0]
+            shard[labels] = series
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def values(self) -> Dict[Labels, List[float]]:
+        totals: Dict[Labels, List[float]] = {}
+        for shard in self._snapshots():
+            for labels, series in shard.items():
+                series = list(series)
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = series
+                else:
+                    totals[labels] = [a + b for a, b in zip(total, series)]
+        return totals
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, series in self.values().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                yield self.name + "_bucket", labels + (_format_value(bound),), cumulative
+            yield self.name + "_count", labels, cumulative
+            yield self.name + "_sum", labels, series[-1]
+
+    def _label_names_for(self, sample_name: str) -> Tuple[str, ...]:
+        return self.labelnames + ("le",) if sample_name.endswith("_bucket") else self.labelnames
+
+
+class CollectedMetric:
+    """Gauge or counter whose samples are produced by a callback at scrape time."""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str], collect: Callable[[], Iterable[Tuple[Labels, float]]]):
+        self.name, self.help, self.kind, self.labelnames = name, help, kind, tuple(labelnames)
+        self._collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        name = self.name + "_total" if self.kind == "counter" else self.name
+        for labels, value in self._collect():
+            yield name, labels, value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._names: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._names:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._names[metric.name] = metric
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, name: str, help: str, kind: str = "gauge", labelnames: Sequence[str] = ()):
+        """Decorator registering a scrape-time callback returning [(label values, value), ...]."""
+        def decorator(fn):
+            self.register(CollectedMetric(name, help, kind, labelnames, fn))
+            return fn
+        return decorator
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                # A failing collector must not break the whole scrape
+                continue
+            # Counter samples carry the _total suffix; the family name must match them
+            family = metric.name + "_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {family} {metric.help}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            label_names = getattr(metric, "_label_names_for", lambda _: metric.labelnames)
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(label_names(name), labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests", "HTTP requests by method, route template and status", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency by method and route template", ("method", "route"))
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests currently being served")
+RATE_LIMIT_REJECTIONS = REGISTRY.counter("rate_limit_rejections", "Requests rejected with 429 by reason", ("reason",))
+OCR_JOB_QUEUE_WAIT = REGISTRY.histogram("ocr_job_queue_wait_seconds", "Time from OCR job enqueue to processing start")
+OCR_ENGINE_DURATION = REGISTRY.histogram("ocr_engine_duration_seconds", "OCR engine call latency by document_type", ("document_type",))
+OCR_CACHE_LOOKUPS = REGISTRY.counter("ocr_cache_lookups", "OCR result cache lookups by result", ("result",))
+# Only observed with MEMORY_ACCOUNTING_ENABLED (see app.memory_accounting)
+STAGE_MEMORY_PEAK = REGISTRY.histogram(
+    "stage_memory_peak_bytes",
+    "Peak traced allocation per pipeline stage",
+    ("stage",),
+    buckets=tuple(2 ** n for n in range(16, 31, 2)),
+)
+
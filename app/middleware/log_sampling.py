@@ -0,0 +1,89 @@
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Pattern
+from app import config
+
+
+@dataclass(frozen=True)
+class SamplingRule:
+    pattern: Pattern
+    rate: float
+    method: Optional[str] = None
+
+
+def sample_point(request_id: str) -> float:
+    """Maps a request id to a stable point in [0, 1); every component hashing the same id agrees."""
+    digest = hashlib.blake2b(request_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+class RequestLogSampler:
+    """
+    Decides whether a request log line is written. Errors (status >= 400 or an exception)
+    and requests at or above slow_ms are always logged. Otherwise the first rule matching
+    method and path glob (segment-aware) gives the sample rate (default_rate if none match). A request is
+    kept when sample_point(request_id) < rate, so the decision is the same wherever the
+    request id is seen.
+    """
+
+    def __init__(self, rules: List[SamplingRule], default_rate: float = 1.0, slow_ms: float = 1000):
+        self.rules = rules
+        self.default_rate = default_rate
+        self.slow_ms = slow_ms
+
+    def rate_for(self, method: str, path: str) -> float:
+        for rule in self.rules:
+            if (rule.method is None or rule.method == method) and rule.pattern.match(path):
+                return rule.rate
+        return self.default_rate
+
+    def should_log(self, method: str, path: str, status_code: int, latency_ms: float, request_id: str) -> Optional[float]:
+        """Returns the sample rate that applied when the line should be written, else None."""
+        if status_code >= 400 or latency_ms >= self.slow_ms:
+            return 1.0
+        rate = self.rate_for(method, path)
+        if rate >= 1.0:
+            return 1.0
+        if rate > 0 and sample_point(request_id) < rate:
+            return rate
+        return None
+
+
+def compile_path_glob(glob: str) -> Pattern:
+    """
+    Path glob matched segment by segment: "*" matches within one path segment, "**" across
+    any number of them and "?" one character other than "/". So /v1/projects/*/jobs/* does
+    not match /v1/projects/p/jobs/j/stream.
+    """
+    parts = re.split(r"(\*\*|\*|\?)", glob)
+    wildcards = {"**": ".*", "*": "[^/]*", "?": "[^/]"}
+    return re.compile("".join(wildcards.get(part) or re.escape(part) for part in parts) + r"\Z")
+
+
+def parse_rules(raw: str) -> List[SamplingRule]:
+    """
+    Parses REQUEST_LOG_SAMPLING, a JSON list of {"path": glob, "rate": 0..1, "method": optional}
+    (see compile_path_glob).
+    """
+    rules = []
+    for item in json.loads(raw or "[]"):
+        rate = float(item["rate"])
+        if not 0 <= rate <= 1:
+            raise ValueError(f"REQUEST_LOG_SAMPLING rate must be between 0 and 1: {item}")
+        method = item.get("method")
+        rules.append(SamplingRule(
+            pattern=compile_path_glob(item["path"]),
+            rate=rate,
+            method=method.upper() if method else None,
+        ))
+    return rules
+
+
+def build_request_log_sampler() -> RequestLogSampler:
+    return RequestLogSampler(
+        parse_rules(config.REQUEST_LOG_SAMPLING),
+        default_rate=config.REQUEST_LOG_SAMPLE_RATE,
+        slow_ms=config.REQUEST_LOG_SLOW_MS,
+    )
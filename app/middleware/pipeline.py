@@ -0,0 +1,306 @@
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional
+from starlette.middleware.cors import CORSMiddleware
+from app import config
+from app.models import ErrorResponse
+from app.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_DURATION, HTTP_REQUESTS, RATE_LIMIT_REJECTIONS
+from app.middleware.log_sampling import build_request_log_sampler
+from app import memory_accounting
+from app.profiling import get_request_profiles, profiling_grant
+from app.security.api_keys import hash_api_key
+from app.security.auth_cache import auth_cache
+from app.services.rate_limiter import get_rate_limiter
+from app.timing import StageTimings, use_timings
+from app.tracing import get_tracer, span, use_span
+
+logger = logging.getLogger("request_log")
+
+_SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"referrer-policy", b"no-referrer"),
+    (b"x-frame-options", b"DENY"),
+)
+_SECURITY_HEADER_NAMES = frozenset(name for name, _ in _SECURITY_HEADERS)
+
+
+def _verified_project_id(api_key: Optional[str]) -> Optional[str]:
+    """
+    Project of a key this worker has already verified (auth cache, no DB access). Rate
+    limiting runs before auth, so the project bucket is charged only for such keys: the
+    project in the URL is client-chosen and would let anyone drain another tenant's budget.
+    """
+    if not api_key:
+        return None
+    record = auth_cache.peek(hash_api_key(api_key))
+    return record.project_id if record is not None else None
+
+
+async def _rate_limited_app(scope, receive, send):
+    request_id = scope["state"]["request_id"]
+    body = json.dumps(ErrorResponse(
+        error_code="RATE_LIMIT_EXCEEDED",
+        message="Too many requests",
+        request_id=request_id
+    ).model_dump()).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _annotate_spans(scope, status_code: int, root_span, handler_span) -> None:
+    route = getattr(scope.get("route"), "path", None)
+    root_span.set_attribute("http.status_code", status_code)
+    if route:
+        root_span.set_attribute("http.route", route)
+        root_span.name = f"{scope['method']} {route}"
+    if status_code >= 500:
+        root_span.status = "error"
+    if handler_span is not None and route:
+        handler_span.name = f"handler {route}"
+
+
+class RequestPipelineMiddleware:
+    """
+    Single pure-ASGI middleware replacing the RequestID, SecurityHeaders, CORS, Context,
+    RequestLogging and RateLimit stack. Request headers are scanned once and response
+    headers rewritten once in a single send wrapper.
+
+    Contracts kept from the separate middlewares:
+    - x-request-id is taken from the request (stripped) or generated, exposed as
+      request.state.request_id and set (replacing any existing value) on every response
+    - security headers are added unless the response already sets them
+    - CORS preflights are answered by CORSMiddleware without being rate limited or logged
+    - x-user-id / x-project-id populate request.state.user_id / project_id
+    - over-limit clients get the 429 RATE_LIMIT_EXCEEDED body, with CORS headers and
+      Retry-After; rate-limited requests carry X-RateLimit-Limit/Remaining/Reset. The
+      project bucket is charged only for keys already in the auth cache, never from the path
+    - at most one request_log entry per request, including auth metadata when authenticated;
+      successful fast requests are sampled per route (see log_sampling)
+    - latency, metrics and the log line are recorded when the last response body message
+      is sent, so background tasks that run afterwards (the OCR job) do not count
+    - stages recorded by the handler (app.timing) are sent as Server-Timing, plus total
+      time to the response start, when server_timing is enabled
+    - with profiling enabled, "x-profile: 1" runs cProfile until the response starts, but
+      only with the admin token or a PROFILING_API_KEY_IDS key already in the auth cache
+      (see profiling_grant); other clients cannot enable it. The capture id is sent as
+      x-profile-id
+    - sampled requests (app.tracing) get an http.request span continuing the incoming
+      traceparent, with rate_limit and handler children, and a traceparent response header;
+      both spans end with the response body, before background tasks run
+    """
+
+    def __init__(
+        self,
+        app,
+        cors_options: Optional[Dict[str, Any]] = None,
+        limiter=None,
+        sampler=None,
+        server_timing: Optional[bool] = None,
+        profiles=None,
+        tracer=None
+    ):
+        self._limiter = limiter
+        self.sampler = sampler or build_request_log_sampler()
+        self.server_timing = config.SERVER_TIMING_ENABLED if server_timing is None else server_timing
+        if profiles is None and config.PROFILING_ENABLED:
+            profiles = get_request_profiles()
+        self.profiles = profiles
+        self.tracer = tracer if tracer is not None else get_tracer()
+        # CORS stays inside the pipeline so preflights and 429s get the same CORS handling as before
+        self.cors = cors_options is not None
+        if self.cors:
+            self.app = CORSMiddleware(app, **cors_options)
+            self.rate_limited = CORSMiddleware(_rate_limited_app, **cors_options)
+        else:
+            self.app = app
+            self.rate_limited = _rate_limited_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+
+        request_id = user_id = project_id = api_key = traceparent = admin_token = None
+        has_origin = has_preflight_method = wants_profile = False
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                if value[:7].lower() == b"bearer ":
+                    api_key = value[7:].decode("latin-1").strip() or api_key
+            elif name == b"x-api-key":
+                api_key = api_key or value.decode("latin-1").strip() or None
+            elif name == b"x-request-id":
+                request_id = value.decode("latin-1").strip() or None
+            elif name == b"x-user-id":
+                user_id = value.decode("latin-1")
+            elif name == b"x-project-id":
+                project_id = value.decode("latin-1")
+            elif name == b"origin":
+                has_origin = True
+            elif name == b"access-control-request-method":
+                has_preflight_method = True
+            elif name == b"x-profile":
+                wants_profile = value.strip() in (b"1", b"true")
+            elif name == b"traceparent":
+                traceparent = value.decode("latin-1")
+            elif name == b"x-admin-token":
+                admin_token = value.decode("latin-1")
+        if request_id is None:
+            request_id = str(uuid.uuid4())
+        request_id_bytes = request_id.encode("latin-1")
+
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
+        timings = state["timings"] = StageTimings(start)
+        status_code = 500
+        rate_limit_headers = ()
+        profiler = profile_grant = None
+        root_span = handler_span = None
+        recorded = False
+
+        def finish(final_status: int) -> None:
+            """Records the request once, when its response is complete (or the request failed)."""
+            nonlocal recorded
+            recorded = True
+            if timings.memory_span is not None:
+                timings.add_memory("request", memory_accounting.span_end(timings.memory_span))
+            HTTP_IN_FLIGHT.dec()
+            elapsed = time.perf_counter() - start
+            latency_ms = int(elapsed * 1000)
+            # Route template (set by the router) keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(labels=(scope["method"], route, str(final_status)))
+            HTTP_REQUEST_DURATION.observe(elapsed, (scope["method"], route))
+            sample_rate = self.sampler.should_log(scope["method"], scope["path"], final_status, latency_ms, request_id)
+            if sample_rate is not None:
+                log_data = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status_code": final_status,
+                    "latency_ms": latency_ms,
+                    "request_id": request_id
+                }
+                if sample_rate < 1.0:
+                    # Lets log consumers re-weight sampled counts
+                    log_data["sample_rate"] = sample_rate
+                auth = state.get("auth")
+                if auth:
+                    log_data["project_id"] = getattr(auth, "project_id", None)
+                    log_data["api_key_id"] = getattr(auth, "api_key_id", None)
+                    log_data["key_fingerprint"] = getattr(auth, "key_fingerprint", None)
+                # Never log Authorization or raw API key. Serialized once here; the queue handler
+                # writes preformatted lines as-is
+                logger.info(json.dumps(log_data), extra={"preformatted": True})
+
+        async def send_wrapper(message):
+            nonlocal status_code, profiler
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = []
+                if root_span is not None:
+                    _annotate_spans(scope, status_code, root_span, handler_span)
+                    headers.append((b"traceparent", root_span.traceparent.encode("latin-1")))
+                if profiler is not None:
+                    # Started only for an admin token or an allowlisted key already in the auth
+                    # cache; auth has run by now, so a key capture is kept only if it still holds
+                    auth = state.get("auth")
+                    allowed = profile_grant == "admin" or (
+                        auth is not None and getattr(auth, "api_key_id", None) in config.PROFILING_API_KEY_IDS
+                    )
+                    profile_id = self.profiles.stop(profiler, uuid.uuid4().hex if allowed else None)
+                    profiler = None
+                    if profile_id:
+                        headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                present = set()
+                for name, value in message.get("headers", ()):
+                    lower = name.lower()
+                    if lower == b"x-request-id":
+                        continue
+                    if lower in _SECURITY_HEADER_NAMES:
+                        present.add(lower)
+                    headers.append((name, value))
+                for name, value in _SECURITY_HEADERS:
+                    if name not in present:
+                        headers.append((name, value))
+                headers.extend(rate_limit_headers)
+                if self.server_timing:
+                    total = f"total;dur={(time.perf_counter() - start) * 1000:.3f}"
+                    stages = timings.server_timing()
+                    headers.append((b"server-timing", (f"{stages}, {total}" if stages else total).encode("latin-1")))
+                headers.append((b"x-request-id", request_id_bytes))
+                message["headers"] = headers
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                # Background tasks (the OCR job) run after this inside the handler: latency,
+                # metrics, the log line and spans describe the response, not the job
+                await send(message)
+                if root_span is not None:
+                    if handler_span is not None:
+                        handler_span.end()
+                    root_span.end()
+                if not recorded:
+                    finish(status_code)
+                return
+            await send(message)
+
+        if self.cors and scope["method"] == "OPTIONS" and has_origin and has_preflight_method:
+            recorded = True
+            await self.app(scope, receive, send_wrapper)
+            return
+
+        if user_id:
+            state["user_id"] = user_id
+        if project_id:
+            state["project_id"] = project_id
+
+        if memory_accounting.enabled:
+            timings.memory_span = memory_accounting.span_start()
+        if self.tracer is not None:
+            root_span = self.tracer.start_trace("http.request", traceparent)
+            if root_span is not None:
+                root_span.set_attribute("http.method", scope["method"])
+                root_span.set_attribute("http.target", scope["path"])
+                root_span.set_attribute("request_id", request_id)
+        failed = False
+        HTTP_IN_FLIGHT.inc()
+        try:
+            with use_span(root_span):
+                with span("rate_limit"):
+                    client = scope.get("client")
+                    limiter = self._limiter or get_rate_limiter()
+                    decision = await limiter.check_async(client[0] if client else "unknown", api_key, _verified_project_id(api_key))
+                if decision is not None:
+                    rate_limit_headers = decision.headers()
+                if decision is None or decision.allowed:
+                    if wants_profile and self.profiles is not None:
+                        profile_grant = profiling_grant(api_key, admin_token)
+                        if profile_grant is not None:
+                            profiler = self.profiles.start()
+                    with use_timings(timings), span("handler") as handler_span:
+                        await self.app(scope, receive, send_wrapper)
+                else:
+                    state["error_code"] = "RATE_LIMIT_EXCEEDED"
+                    RATE_LIMIT_REJECTIONS.inc(labels=("rate_limit",))
+                    await self.rate_limited(scope, receive, send_wrapper)
+        except BaseException:
+            failed = True
+            if root_span is not None:
+                root_span.status = "error"
+            raise
+        finally:
+            if root_span is not None:
+                root_span.end()
+            if profiler is not None:
+                # No response was started
+                self.profiles.stop(profiler, None)
+            if not recorded:
+                # No complete response was sent
+                finish(500 if failed else status_code)
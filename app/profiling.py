@@ -0,0 +1,176 @@
+"""
+On-demand profiling of the live process.
+
+- SamplingProfiler: a background thread snapshots every other thread's stack with
+  sys._current_frames() at a fixed interval and counts identical stacks. Output is the
+  collapsed-stack format ("frame;frame;frame count") read by flamegraph.pl, speedscope
+  and inferno. Nothing runs between profiles.
+- RequestProfiles: per-request cProfile captures (x-profile: 1 header, see the pipeline
+  middleware and profiling_grant) saved as pstats files in a bounded directory.
+
+Coroutines suspended on the event loop have no thread stack, so the sampler sees the
+code that is running (handlers, engine threads, the loop itself), not awaiting tasks.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from app import config
+
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+    return f"{module}:{code.co_name}"
+
+
+def profiling_grant(api_key: Optional[str], admin_token: Optional[str]) -> Optional[str]:
+    """
+    Whether an "x-profile: 1" request may start a cProfile capture, decided before the
+    handler runs: "admin" when x-admin-token matches PROFILING_ADMIN_TOKEN, "api_key" when
+    the key was already verified on this worker (auth cache, no DB access) and its id is
+    listed in PROFILING_API_KEY_IDS, else None and the profiler is never enabled.
+    """
+    if admin_token and config.PROFILING_ADMIN_TOKEN:
+        if hmac.compare_digest(admin_token.encode(), config.PROFILING_ADMIN_TOKEN.encode()):
+            return "admin"
+    if not api_key or not config.PROFILING_API_KEY_IDS:
+        return None
+    from app.security.api_keys import hash_api_key
+    from app.security.auth_cache import auth_cache
+    record = auth_cache.peek(hash_api_key(api_key))
+    if record is not None and record.id in config.PROFILING_API_KEY_IDS:
+        return "api_key"
+    return None
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float, skip_thread: Optional[int] = None) -> Counter:
+        """Samples all threads except the sampler (and skip_thread) for seconds; one run at a time."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A sampling profile is already running")
+        try:
+            own = threading.get_ident()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks: Counter = Counter()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own or ident == skip_thread:
+                        continue
+                    frames = []
+                    while frame is not None:
+                        frames.append(_frame_label(frame))
+                        frame = frame.f_back
+                    frames.append(names.get(ident, f"thread-{ident}"))
+                    stacks[";".join(reversed(frames))] += 1
+                time.sleep(self.interval)
+            return stacks
+        finally:
+            self._lock.release()
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class RequestProfiles:
+    """
+    cProfile captures of single requests, stored as <profile_id>.prof (pstats) files; only
+    the newest max_stored are kept. One capture at a time: cProfile hooks the whole
+    thread, so concurrent requests on the event loop show up in the capture as well.
+    """
+
+    def __init__(self, directory: str, max_stored: int):
+        self.directory = directory
+        self.max_stored = max(1, max_stored)
+        self._active = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Returns a running profiler, or None if another capture is in progress."""
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool already hooks this thread
+            self._active.release()
+            return None
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile, profile_id: Optional[str]) -> Optional[str]:
+        """Stops the capture and saves it under profile_id (discarded when None)."""
+        try:
+            profiler.disable()
+        finally:
+            self._active.release()
+        if profile_id is None or not _PROFILE_ID.match(profile_id):
+            return None
+        profiler.dump_stats(self.path(profile_id))
+        self._prune()
+        return profile_id
+
+    def path(self, profile_id: str) -> str:
+        if not _PROFILE_ID.match(profile_id):
+            raise ValueError(f"Invalid profile id: {profile_id!r}")
+        return os.path.join(self.directory, profile_id + ".prof")
+
+    def list(self) -> List[Dict[str, object]]:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".prof"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append({"profile_id": name[:-5], "size": stat.st_size, "created": stat.st_mtime})
+        return sorted(entries, key=lambda e: e["created"], reverse=True)
+
+    def text(self, profile_id: str, limit: int = 50) -> str:
+        out = io.StringIO()
+        pstats.Stats(self.path(profile_id), stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def _prune(self) -> None:
+        for entry in self.list()[self.max_stored:]:
+            try:
+                os.remove(self.path(entry["profile_id"]))
+            except OSError:
+                pass
+
+
+_sampler: Optional[SamplingProfiler] = None
+_request_profiles: Optional[RequestProfiles] = None
+
+def get_sampling_profiler() -> SamplingProfiler:
+    global _sampler
+    if _sampler is None:
+        _sampler = SamplingProfiler(config.PROFILING_SAMPLE_INTERVAL_MS / 1000)
+    return _sampler
+
+def build_request_profiles() -> RequestProfiles:
+    directory = config.PROFILING_DIR or os.path.join(tempfile.gettempdir(), "fieldscript-profiles")
+    return RequestProfiles(directory, config.PROFILING_MAX_STORED)
+
+def get_request_profiles() -> RequestProfiles:
+    global _request_profiles
+    if _request_profiles is None:
+        _request_profiles = build_request_profiles()
+    return _request_profiles
@@ -8,18 +8,26 @@ _rate_limit_store = {}
 _RATE_LIMIT = 60
 _WINDOW = 60  # seconds
 
+def check_rate_limit(client_ip: str) -> bool:
+    """Counts one request for client_ip; returns False once it is over the limit for the window."""
+    now = int(time.time())
+    window_start, count = _rate_limit_store.get(client_ip, (now, 0))
+    if now - window_start >= _WINDOW:
+        window_start, count = now, 0
+    count += 1
+    _rate_limit_store[client_ip] = (window_start, count)
+    return count <= _RATE_LIMIT
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
+    """
+    Legacy per-process fixed-window limiter, kept for benchmarks/bench_middleware.py.
+    The app rate limits in RequestPipelineMiddleware via app.services.rate_limiter.
+    """
     async def dispatch(self, request: Request, call_next):
         if request.scope.get("type") != "http":
             return await call_next(request)
         client_ip = request.client.host if request.client else "unknown"
-        now = int(time.time())
-        window_start, count = _rate_limit_store.get(client_ip, (now, 0))
-        if now - window_start >= _WINDOW:
-            window_start, count = now, 0
-        count += 1
-        _rate_limit_store[client_ip] = (window_start, count)
-        if count > _RATE_LIMIT:
+        if not check_rate_limit(client_ip):
             request_id = getattr(request.state, "request_id", "unknown")
             request.state.error_code = "RATE_LIMIT_EXCEEDED"
             resp = JSONResponse(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from datetime import datetime
 import uuid
 
@@ -14,8 +14,72 @@ class ProjectApiKey(BaseModel):
     last_used_at: Optional[datetime] = None
     revoked_at: Optional[datetime] = None
 
+class ApiKeyRegistry(dict):
+    """
+    Dict of api_key_id -> ProjectApiKey with secondary indexes on key_hash and
+    (project_id, key_hash), kept in sync on every insert/remove so verification is
+    an O(1) lookup instead of a scan over all tenants' keys.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._by_hash: Dict[str, str] = {}
+        self._by_project_hash: Dict[Tuple[str, str], str] = {}
+        self.update(*args, **kwargs)
+
+    def _index(self, api_key: ProjectApiKey) -> None:
+        self._by_hash[api_key.key_hash] = api_key.id
+        self._by_project_hash[(api_key.project_id, api_key.key_hash)] = api_key.id
+
+    def _unindex(self, api_key: ProjectApiKey) -> None:
+        self._by_hash.pop(api_key.key_hash, None)
+        self._by_project_hash.pop((api_key.project_id, api_key.key_hash), None)
+
+    def __setitem__(self, key_id: str, api_key: ProjectApiKey) -> None:
+        old = self.get(key_id)
+        if old is not None:
+            self._unindex(old)
+        super().__setitem__(key_id, api_key)
+        self._index(api_key)
+
+    def __delitem__(self, key_id: str) -> None:
+        self._unindex(self[key_id])
+        super().__delitem__(key_id)
+
+    def pop(self, key_id, *default):
+        if key_id in self:
+            self._unindex(self[key_id])
+        return super().pop(key_id, *default)
+
+    def popitem(self):
+        key_id, api_key = super().popitem()
+        self._unindex(api_key)
+        return key_id, api_key
+
+    def setdefault(self, key_id, default=None):
+        if key_id not in self:
+            self[key_id] = default
+        return self[key_id]
+
+    def update(self, *args, **kwargs):
+        for key_id, api_key in dict(*args, **kwargs).items():
+            self[key_id] = api_key
+
+    def clear(self) -> None:
+        super().clear()
+        self._by_hash.clear()
+        self._by_project_hash.clear()
+
+    def find_by_hash(self, key_hash: str) -> Optional[ProjectApiKey]:
+        key_id = self._by_hash.get(key_hash)
+        return self.get(key_id) if key_id is not None else None
+
+    def find_by_project_hash(self, project_id: str, key_hash: str) -> Optional[ProjectApiKey]:
+        key_id = self._by_project_hash.get((project_id, key_hash))
+        return self.get(key_id) if key_id is not None else None
+
 # In-memory store for dev/demo (replace with DB/ORM in production)
-PROJECT_API_KEYS = {}
+PROJECT_API_KEYS = ApiKeyRegistry()
 
 # Example interface for future DB migration:
 # def save_api_key(api_key: ProjectApiKey): ...
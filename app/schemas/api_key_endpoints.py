@@ -22,7 +22,19 @@ class ApiKeyPublic(BaseModel):
 
 class ApiKeyListResponse(BaseModel):
     items: List[ApiKeyPublic]
+    next_cursor: Optional[str] = None
 
 class ApiKeyRevokeResponse(BaseModel):
     api_key_id: str
     revoked_at: datetime
+
+class ApiKeyBulkCreateRequest(BaseModel):
+    count: int = Field(ge=1)
+    name: Optional[str] = None
+
+class ApiKeyBulkCreateResponse(BaseModel):
+    items: List[ApiKeyCreateResponse]
+
+class ApiKeyRotateResponse(BaseModel):
+    revoked_count: int
+    items: List[ApiKeyCreateResponse]
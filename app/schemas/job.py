@@ -1,10 +1,12 @@
-from typing import Optional, Literal
+from typing import Dict, Optional, Literal, List
 from pydantic import BaseModel
-from app.schemas.ocr import OCRResponse
+from app.schemas.ocr import OCRResponse, OCRPageResult
 
 class OCRJob(BaseModel):
     """
     Represents an asynchronous OCR job for background processing.
+    Pages are recorded incrementally as they finish (per-page mode) so that
+    clients can consume partial results before the whole document completes.
     """
     job_id: str
     project_id: str
@@ -12,3 +14,23 @@ class OCRJob(BaseModel):
     result: Optional[OCRResponse] = None
     error: Optional[str] = None
     request_id: str
+    pages_total: int = 0
+    pages: List[OCRPageResult] = []
+    # Milliseconds per processing stage (queue_wait, hash, cache_lookup, engine); see app.timing
+    timings: Dict[str, float] = {}
+    # Peak traced bytes per stage, only with MEMORY_ACCOUNTING_ENABLED; see app.memory_accounting
+    memory_peaks: Dict[str, int] = {}
+
+    def record_page(self, page: OCRPageResult) -> None:
+        self.pages.append(page)
+
+    def finished_pages(self) -> List[OCRPageResult]:
+        return sorted(self.pages, key=lambda p: p.index)
+
+    @property
+    def progress(self) -> float:
+        if self.status == "completed":
+            return 1.0
+        if not self.pages_total:
+            return 0.0
+        return round(len(self.pages) / self.pages_total, 4)
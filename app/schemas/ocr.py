@@ -1,6 +1,6 @@
 
-from pydantic import BaseModel, field_validator, ValidationError
-from typing import List, Optional, Dict
+from pydantic import BaseModel, field_validator, model_validator, ValidationError
+from typing import Any, List, Optional, Dict, Literal
 import logging
 from app.utils.base64_size import estimate_base64_decoded_bytes
 
@@ -8,6 +8,19 @@ class OCRRequest(BaseModel):
     images: List[str]
     document_type: Optional[str] = None
     metadata: Optional[Dict[str, str]] = None
+    # "structured" adds pages/lines with bounding boxes and confidences to the result
+    output: Literal["text", "structured"] = "text"
+    # Subset of structured fields to return (default: all); only with output "structured"
+    fields: Optional[List[Literal["text", "bbox", "confidence"]]] = None
+
+    @model_validator(mode="after")
+    def validate_fields(self):
+        if self.fields is not None:
+            if self.output != "structured":
+                raise ValueError('fields requires output "structured"')
+            if not self.fields:
+                raise ValueError("fields must name at least one of text, bbox, confidence")
+        return self
 
     @field_validator("images")
     @classmethod
@@ -42,6 +55,19 @@ class OCRRequest(BaseModel):
             logging.warning(f"OCRRequest validation failed: {log_reason}; request_id={request_id}")
             raise ValueError(log_reason)
 
+class OCRPageResult(BaseModel):
+    """
+    Outcome of a single page when pages are processed independently.
+    """
+    index: int
+    status: Literal["completed", "failed"]
+    text: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 1
+
 class OCRResponse(BaseModel):
     text: str
     request_id: str
+    pages: Optional[List[OCRPageResult]] = None
+    # Columnar layout: {"pages": [{"index", "text": [...], "bbox": [x0, y0, x1, y1, ...], "confidence": [...]}]}
+    structured: Optional[Dict[str, Any]] = None
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List, Literal
+from datetime import datetime
+
+class UsageBucket(BaseModel):
+    start: datetime
+    requests: int = 0
+    pages: int = 0
+    decoded_bytes: int = 0
+    engine_ms: int = 0
+    cache_hits: int = 0
+
+class UsageRollupResponse(BaseModel):
+    project_id: str
+    start: datetime
+    end: datetime
+    granularity: Literal["bucket", "hour", "day"]
+    buckets: List[UsageBucket]
+    totals: UsageBucket
@@ -12,6 +12,15 @@ def iso(dt):
         return None
     return dt.isoformat()
 
+def created_json(raw_key, rec):
+    return {
+        "api_key": raw_key,
+        "api_key_id": rec.id,
+        "key_prefix": rec.key_prefix,
+        "name": rec.name,
+        "created_at": iso(rec.created_at)
+    }
+
 def main():
     parser = argparse.ArgumentParser(description="Manage project API keys (DB store)")
     parser.add_argument("--database-url", help="Database URL (overrides env DATABASE_URL)")
@@ -24,11 +33,28 @@ def main():
 
     p_list = subparsers.add_parser("list", help="List API keys for a project")
     p_list.add_argument("--project-id", required=True)
+    p_list.add_argument("--limit", type=int, help="Page size (default: all keys)")
+    p_list.add_argument("--cursor", help="next_cursor from the previous page")
+    p_list.add_argument("--active-only", action="store_true", help="Skip revoked keys")
 
     p_revoke = subparsers.add_parser("revoke", help="Revoke an API key")
     p_revoke.add_argument("--project-id", required=True)
     p_revoke.add_argument("--key-id", required=True)
 
+    p_bulk = subparsers.add_parser("bulk-create", help="Create many API keys in one transaction (JSONL output)")
+    p_bulk.add_argument("--project-id", required=True)
+    p_bulk.add_argument("--count", type=int, required=True)
+    p_bulk.add_argument("--name")
+
+    p_import = subparsers.add_parser("import", help="Import hashed keys from a JSONL file (as written by export)")
+    p_import.add_argument("--file", required=True, help="JSONL file, or - for stdin")
+
+    p_export = subparsers.add_parser("export", help="Export hashed keys as JSONL (raw keys are never stored)")
+    p_export.add_argument("--project-id", help="Only export keys of this project")
+
+    p_rotate = subparsers.add_parser("rotate", help="Revoke all active keys of a project and issue replacements")
+    p_rotate.add_argument("--project-id", required=True)
+
     args = parser.parse_args()
 
     # Set up DB
@@ -67,22 +93,33 @@ def main():
                 print(f"name: {rec.name}")
                 print(f"created_at: {iso(rec.created_at)}")
         elif args.command == "list":
-            keys = store.list(args.project_id)
+            if args.limit is not None and args.limit < 1:
+                print("ERROR: --limit must be at least 1", file=sys.stderr)
+                sys.exit(1)
+            try:
+                keys, next_cursor = store.list_page(args.project_id, args.limit, args.cursor, args.active_only)
+            except ValueError as e:
+                print(f"ERROR: {e}", file=sys.stderr)
+                sys.exit(1)
+            items = [
+                {
+                    "api_key_id": k.id,
+                    "key_prefix": k.key_prefix,
+                    "name": k.name,
+                    "created_at": iso(k.created_at),
+                    "last_used_at": iso(k.last_used_at),
+                    "revoked_at": iso(k.revoked_at)
+                } for k in keys
+            ]
             if args.json:
-                print(json.dumps([
-                    {
-                        "api_key_id": k.id,
-                        "key_prefix": k.key_prefix,
-                        "name": k.name,
-                        "created_at": iso(k.created_at),
-                        "last_used_at": iso(k.last_used_at),
-                        "revoked_at": iso(k.revoked_at)
-                    } for k in keys
-                ], indent=2))
+                # Unpaginated output stays a bare list for existing scripts
+                print(json.dumps(items if args.limit is None else {"items": items, "next_cursor": next_cursor}, indent=2))
             else:
                 print(f"API keys for project {args.project_id}:")
                 for k in keys:
                     print(f"- id: {k.id}  prefix: {k.key_prefix}  name: {k.name}  created: {iso(k.created_at)}  last_used: {iso(k.last_used_at)}  revoked: {iso(k.revoked_at)}")
+                if next_cursor:
+                    print(f"next cursor: {next_cursor}")
         elif args.command == "revoke":
             rec = store.revoke(args.project_id, args.key_id)
             if not rec:
@@ -96,6 +133,38 @@ def main():
                     print(f"API key {rec.id} revoked at {iso(rec.revoked_at)}")
                 else:
                     print(f"API key {rec.id} was already revoked at {iso(rec.revoked_at)}")
+        elif args.command == "bulk-create":
+            if args.count < 1:
+                print("ERROR: --count must be at least 1", file=sys.stderr)
+                sys.exit(1)
+            for raw_key, rec in store.bulk_create(args.project_id, args.count, args.name):
+                print(json.dumps(created_json(raw_key, rec)))
+        elif args.command == "import":
+            stream = sys.stdin if args.file == "-" else open(args.file)
+            try:
+                records = (json.loads(line) for line in stream if line.strip())
+                imported, skipped, conflicts = store.import_hashed(records)
+            except (ValueError, KeyError) as e:
+                print(f"ERROR: Invalid import record: {e}", file=sys.stderr)
+                sys.exit(1)
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+            out = {"imported": imported, "skipped": skipped, "id_conflicts": conflicts}
+            if args.json:
+                print(json.dumps(out, indent=2))
+            else:
+                print(f"Imported {imported} API keys ({skipped} already present)")
+                if conflicts:
+                    print(f"Skipped {len(conflicts)} records whose api_key_id belongs to another key: {', '.join(conflicts)}", file=sys.stderr)
+        elif args.command == "export":
+            for record in store.export(args.project_id):
+                print(json.dumps(record))
+        elif args.command == "rotate":
+            revoked_count, created = store.rotate_all(args.project_id)
+            print(f"Revoked {revoked_count} API keys for project {args.project_id}", file=sys.stderr)
+            for raw_key, rec in created:
+                print(json.dumps(created_json(raw_key, rec)))
         else:
             parser.print_help()
             sys.exit(1)
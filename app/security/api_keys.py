@@ -14,9 +14,9 @@ API_KEY_PREFIX_LEN = 8
 
 def verify_api_key_allow_revoked(raw_key: str, project_id: str) -> Optional[ProjectApiKey]:
     key_hash = hash_api_key(raw_key)
-    for api_key in PROJECT_API_KEYS.values():
-        if compare_hashes(api_key.key_hash, key_hash) and api_key.project_id == project_id:
-            return api_key
+    api_key = PROJECT_API_KEYS.find_by_project_hash(project_id, key_hash)
+    if api_key is not None and compare_hashes(api_key.key_hash, key_hash):
+        return api_key
     return None
 import os
 import base64
@@ -83,14 +83,14 @@ def store_api_key(project_id: str, raw_key: str, name: Optional[str] = None) ->
 
 def verify_api_key(raw_key: str) -> Optional[ProjectApiKey]:
     key_hash = hash_api_key(raw_key)
-    for api_key in PROJECT_API_KEYS.values():
-        if api_key.revoked_at is not None:
-            continue
-        if compare_hashes(api_key.key_hash, key_hash):
-            # Best-effort update last_used_at
-            try:
-                api_key.last_used_at = datetime.utcnow()
-            except Exception:
-                pass
-            return api_key
-    return None
+    api_key = PROJECT_API_KEYS.find_by_hash(key_hash)
+    if api_key is None or api_key.revoked_at is not None:
+        return None
+    if not compare_hashes(api_key.key_hash, key_hash):
+        return None
+    # Best-effort update last_used_at
+    try:
+        api_key.last_used_at = datetime.utcnow()
+    except Exception:
+        pass
+    return api_key
@@ -7,7 +7,7 @@ from app.schemas.api_key import ProjectApiKey
 from app.security.api_keys import verify_api_key_allow_revoked
 
 # Dependency for revoke endpoint: allows revoked keys to authenticate for idempotency
-def require_api_key_for_revoke(
+async def require_api_key_for_revoke(
     project_id: str,
     request: Request,
     store = Depends(get_api_key_store)
@@ -63,7 +63,7 @@ def extract_api_key(request: Request) -> Optional[str]:
     return None
 
 
-def require_api_key(
+async def require_api_key(
     request: Request,
     expected_project_id: Optional[str] = None,
     store = Depends(get_api_key_store)
@@ -79,7 +79,7 @@ def require_api_key(
             detail=body,
             headers={"WWW-Authenticate": "Bearer"}
         )
-    record: ProjectApiKey = store.verify(raw_key)
+    record: ProjectApiKey = await store.verify(raw_key)
     if not record:
         body = {"error": "unauthorized", "message": "Missing or invalid API key"}
         if request_id:
@@ -100,9 +100,9 @@ def require_api_key(
 
 # FastAPI dependency for project-scoped routes
 # Only enforce project_id from path params in dependency/middleware. For body-based project_id, enforce inside handler or use a dependency that caches body bytes on request.state.
-def require_api_key_dep(
+async def require_api_key_dep(
     project_id: str,
     request: Request,
     store = Depends(get_api_key_store)
 ) -> AuthContext:
-    return require_api_key(request, expected_project_id=project_id, store=store)
+    return await require_api_key(request, expected_project_id=project_id, store=store)
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+from app import config
+from app.schemas.api_key import ProjectApiKey
+
+# Returned by VerifiedKeyCache.get when the digest is not cached (None is a cached negative)
+MISS = object()
+
+class VerifiedKeyCache:
+    """
+    Bounded TTL cache of API key verification results keyed by the HMAC digest.
+
+    Positive entries (the verified record) live for ttl_seconds, which is the upper
+    bound on how long a revocation made elsewhere can go unnoticed. Negative entries
+    (unknown or revoked keys) live for negative_ttl_seconds so bursts of bad keys are
+    answered without touching the DB. Least recently used entries are evicted beyond
+    max_entries.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        negative_ttl_seconds: float,
+        max_entries: int,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl = ttl_seconds
+        self.negative_ttl = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Optional[ProjectApiKey]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and (self.ttl > 0 or self.negative_ttl > 0)
+
+    def get(self, key_hash: str):
+        """Returns the cached record, None for a cached negative, or MISS."""
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is not None:
+                expires_at, record = entry
+                if expires_at > self._clock():
+                    self._entries.move_to_end(key_hash)
+                    self.hits += 1
+                    return record
+                del self._entries[key_hash]
+            self.misses += 1
+            return MISS
+
+    def peek(self, key_hash: str) -> Optional[ProjectApiKey]:
+        """Unexpired positive entry, without counting a lookup or refreshing its LRU position."""
+        with self._lock:
+            entry = self._entries.get(key_hash)
+        if entry is None or entry[0] <= self._clock():
+            return None
+        return entry[1]
+
+    def put(self, key_hash: str, record: Optional[ProjectApiKey]) -> None:
+        ttl = self.ttl if record is not None else self.negative_ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key_hash] = (self._clock() + ttl, record)
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key_hash: str) -> None:
+        with self._lock:
+            self._entries.pop(key_hash, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Process-wide cache used by SqlApiKeyStore.verify
+auth_cache = VerifiedKeyCache(
+    ttl_seconds=config.AUTH_CACHE_TTL_SECONDS,
+    negative_ttl_seconds=config.AUTH_CACHE_NEGATIVE_TTL_SECONDS,
+    max_entries=config.AUTH_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,69 @@
+import threading
+import time
+from typing import Callable, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import config
+from app.db.models.auth_revision import AuthRevisionDB
+from app.security.auth_cache import VerifiedKeyCache, auth_cache
+
+AUTH_REVISION_ROW_ID = 1
+
+class RevisionWatcher:
+    """
+    Tracks the last seen auth revision for one worker. At most once per poll_seconds a
+    request is allowed to read the counter; when it has moved, the cache is cleared.
+    Revocations on other workers therefore apply within poll_seconds without a DB
+    read on every request.
+    """
+
+    def __init__(self, cache: VerifiedKeyCache, poll_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.cache = cache
+        self.poll_seconds = poll_seconds
+        self._clock = clock
+        self._revision: Optional[int] = None
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    def claim_poll(self) -> bool:
+        """True if the caller should read the revision now (only one caller per interval)."""
+        now = self._clock()
+        with self._lock:
+            if now < self._next_poll:
+                return False
+            self._next_poll = now + self.poll_seconds
+            return True
+
+    def observe(self, revision: int) -> None:
+        with self._lock:
+            changed = self._revision is not None and revision != self._revision
+            self._revision = revision
+        if changed:
+            self.cache.clear()
+
+_select_revision = select(AuthRevisionDB.revision).where(AuthRevisionDB.id == AUTH_REVISION_ROW_ID)
+_bump_revision = (
+    update(AuthRevisionDB)
+    .where(AuthRevisionDB.id == AUTH_REVISION_ROW_ID)
+    .values(revision=AuthRevisionDB.revision + 1)
+    .execution_options(synchronize_session=False)
+)
+
+def read_auth_revision(db: Session) -> int:
+    return db.execute(_select_revision).scalar() or 0
+
+def bump_auth_revision(db: Session) -> None:
+    """Increments the revision inside the caller's transaction; the caller commits."""
+    if db.execute(_bump_revision).rowcount == 0:
+        db.add(AuthRevisionDB(id=AUTH_REVISION_ROW_ID, revision=1))
+
+async def read_auth_revision_async(db: AsyncSession) -> int:
+    return (await db.execute(_select_revision)).scalar() or 0
+
+async def bump_auth_revision_async(db: AsyncSession) -> None:
+    if (await db.execute(_bump_revision)).rowcount == 0:
+        db.add(AuthRevisionDB(id=AUTH_REVISION_ROW_ID, revision=1))
+
+# Process-wide watcher for auth_cache
+revision_watcher = RevisionWatcher(auth_cache, config.AUTH_REVISION_POLL_SECONDS)
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import config
+from app.db.models.api_key import ProjectApiKeyDB
+
+logger = logging.getLogger("api_key_last_used")
+
+class LastUsedRecorder:
+    """
+    Write-behind buffer for API key last_used_at.
+
+    Timestamps are coarsened down to granularity_seconds; a key is queued at most once
+    per granularity bucket and pending updates are written with one UPDATE per distinct
+    timestamp (normally one per flush) instead of one commit per request.
+    """
+
+    def __init__(self, granularity_seconds: int, clock: Callable[[], datetime] = datetime.utcnow):
+        self.granularity = max(1, int(granularity_seconds))
+        self._clock = clock
+        self._pending: Dict[str, datetime] = {}
+        self._recorded: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def coarsen(self, when: datetime) -> datetime:
+        epoch = int(when.replace(tzinfo=timezone.utc).timestamp())
+        return datetime.fromtimestamp(epoch - epoch % self.granularity, timezone.utc).replace(tzinfo=None)
+
+    def record(self, key_id: str, when: Optional[datetime] = None) -> None:
+        bucket = self.coarsen(when or self._clock())
+        with self._lock:
+            if self._recorded.get(key_id) == bucket:
+                return
+            self._recorded[key_id] = bucket
+            self._pending[key_id] = bucket
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def drain(self) -> Dict[str, datetime]:
+        current = self.coarsen(self._clock())
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            # Dedupe state for past buckets can go: the next use lands in a new bucket anyway
+            self._recorded = {k: v for k, v in self._recorded.items() if v >= current}
+        return pending
+
+    def requeue(self, pending: Dict[str, datetime]) -> None:
+        with self._lock:
+            for key_id, ts in pending.items():
+                current = self._pending.get(key_id)
+                if current is None or current < ts:
+                    self._pending[key_id] = ts
+
+    @staticmethod
+    def _statements(pending: Dict[str, datetime]) -> list:
+        # One UPDATE per distinct (coarsened) timestamp
+        by_ts: Dict[datetime, List[str]] = {}
+        for key_id, ts in pending.items():
+            by_ts.setdefault(ts, []).append(key_id)
+        return [
+            update(ProjectApiKeyDB)
+            .where(ProjectApiKeyDB.id.in_(key_ids))
+            .values(last_used_at=ts)
+            .execution_options(synchronize_session=False)
+            for ts, key_ids in by_ts.items()
+        ]
+
+    def flush(self, db: Session) -> int:
+        """Writes all pending timestamps in a single transaction. Returns the number of keys updated."""
+        pending = self.drain()
+        if not pending:
+            return 0
+        try:
+            for stmt in self._statements(pending):
+                db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.requeue(pending)
+            raise
+        return len(pending)
+
+    async def flush_async(self, db: AsyncSession) -> int:
+        pending = self.drain()
+        if not pending:
+            return 0
+        try:
+            for stmt in self._statements(pending):
+                await db.execute(stmt)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self.requeue(pending)
+            raise
+        return len(pending)
+
+# Process-wide recorder used by the API key stores' verify
+last_used_recorder = LastUsedRecorder(config.API_KEY_LAST_USED_GRANULARITY_SECONDS)
+
+async def flush_last_used() -> int:
+    from app.db.session import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        return await last_used_recorder.flush_async(db)
+
+async def run_last_used_flusher(interval_seconds: float) -> None:
+    """Background loop started from the app lifespan; flushes pending updates every interval."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await flush_last_used()
+        except Exception:
+            logger.exception("Failed to flush API key last_used_at updates")
@@ -1,5 +1,27 @@
-from typing import Dict
+import asyncio
+from typing import Dict, Set
 from app.schemas.job import OCRJob
 
 # Temporary in-memory job store. Replace with persistent DB in production.
 JOBS: Dict[str, OCRJob] = {}
+
+# Per-job listeners woken whenever a job changes (page finished, status change).
+# Jobs are updated from background tasks on the event loop, so plain asyncio.Event is enough.
+_job_listeners: Dict[str, Set[asyncio.Event]] = {}
+
+def subscribe_job(job_id: str) -> asyncio.Event:
+    event = asyncio.Event()
+    _job_listeners.setdefault(job_id, set()).add(event)
+    return event
+
+def unsubscribe_job(job_id: str, event: asyncio.Event) -> None:
+    listeners = _job_listeners.get(job_id)
+    if listeners is None:
+        return
+    listeners.discard(event)
+    if not listeners:
+        _job_listeners.pop(job_id, None)
+
+def notify_job_update(job_id: str) -> None:
+    for event in _job_listeners.get(job_id, ()):
+        event.set()
@@ -1,32 +1,145 @@
-from app.schemas.ocr import OCRRequest, OCRResponse
-from app.engines.ocr_engine import DefaultOCREngine
+from app.schemas.ocr import OCRRequest, OCRResponse, OCRPageResult
+from app.engines.ocr_engine import PAGE_SEPARATOR
+from app.engines.factory import get_ocr_engine
+from app.engines.ocr_result import StructuredOCRResult, OCRPageLayout
+from app import config
+from app.metrics import OCR_CACHE_LOOKUPS
+from app.timing import stage
+from typing import Callable, Dict, List, Optional
+import asyncio
 import hashlib
 import json
+import logging
 
 _ocr_cache = {}
 
+logger = logging.getLogger("ocr_service")
+
 class OCRService:
     def __init__(self):
-        self.engine = DefaultOCREngine()
+        self.engine = get_ocr_engine()
+        self.per_page = config.OCR_PER_PAGE
+        self.page_concurrency = max(1, config.OCR_PAGE_CONCURRENCY)
+        self.page_retries = max(0, config.OCR_PAGE_RETRIES)
 
 
     def compute_request_hash(self, request: OCRRequest) -> str:
-        # Deterministic hash: images + document_type
+        # Deterministic hash: images + document_type (+ output kind when not plain text)
         data = {
             "images": request.images,
             "document_type": request.document_type,
         }
+        if request.output != "text":
+            data["output"] = request.output
         serialized = json.dumps(data, sort_keys=True, separators=(",", ":"))
         return hashlib.sha256(serialized.encode()).hexdigest()
 
     def is_cache_hit(self, req_hash: str) -> bool:
         return req_hash in _ocr_cache
 
-    async def process(self, request: OCRRequest, request_id: str) -> tuple[OCRResponse, bool]:
-        req_hash = self.compute_request_hash(request)
-        if self.is_cache_hit(req_hash):
-            cached = _ocr_cache[req_hash]
-            return OCRResponse(text=cached["text"], request_id=request_id), True
-        text = await self.engine.run(request.images, request.document_type)
-        _ocr_cache[req_hash] = {"text": text}
-        return OCRResponse(text=text, request_id=request_id), False
+    async def process(
+        self,
+        request: OCRRequest,
+        request_id: str,
+        on_page: Optional[Callable[[OCRPageResult], None]] = None
+    ) -> tuple[OCRResponse, bool]:
+        with stage("hash"):
+            req_hash = self.compute_request_hash(request)
+        structured_output = request.output == "structured"
+        with stage("cache_lookup"):
+            cached = _ocr_cache.get(req_hash)
+        # Per-page responses carry pages: an entry cached without them (whole-document mode)
+        # is recomputed so the response shape never depends on the cache
+        if cached is not None and (not self.per_page or cached.get("pages") is not None):
+            OCR_CACHE_LOOKUPS.inc(labels=("hit",))
+            response = self._response(cached["text"], request_id, cached.get("structured"), request.fields)
+            if self.per_page:
+                response.pages = [page.model_copy() for page in cached["pages"]]
+                if on_page is not None:
+                    for page in response.pages:
+                        on_page(page)
+            return response, True
+        OCR_CACHE_LOOKUPS.inc(labels=("miss",))
+        if self.per_page:
+            layouts: Optional[Dict[int, OCRPageLayout]] = {} if structured_output else None
+            pages = await self.run_pages(request.images, request.document_type, on_page=on_page, layouts=layouts)
+            completed = [p for p in pages if p.status == "completed"]
+            if not completed:
+                raise RuntimeError(f"All {len(pages)} pages failed: {pages[0].error}")
+            text = PAGE_SEPARATOR.join(p.text for p in completed)
+            structured = None
+            if layouts is not None:
+                structured = StructuredOCRResult([layouts[p.index] for p in completed])
+            # Only cache complete documents so a transient page failure is retried next time
+            if len(completed) == len(pages):
+                _ocr_cache[req_hash] = {"text": text, "structured": structured, "pages": pages}
+            response = self._response(text, request_id, structured, request.fields)
+            response.pages = pages
+            return response, False
+        with stage("engine"):
+            if structured_output:
+                structured = await self.engine.run_structured(request.images, request.document_type)
+                text = structured.text(PAGE_SEPARATOR)
+            else:
+                structured = None
+                text = await self.engine.run(request.images, request.document_type)
+        _ocr_cache[req_hash] = {"text": text, "structured": structured}
+        return self._response(text, request_id, structured, request.fields), False
+
+    def _response(
+        self,
+        text: str,
+        request_id: str,
+        structured: Optional[StructuredOCRResult],
+        fields: Optional[List[str]]
+    ) -> OCRResponse:
+        return OCRResponse(
+            text=text,
+            request_id=request_id,
+            structured=structured.to_dict(fields) if structured is not None else None
+        )
+
+    async def run_pages(
+        self,
+        images: List[str],
+        document_type: Optional[str],
+        on_page: Optional[Callable[[OCRPageResult], None]] = None,
+        layouts: Optional[Dict[int, OCRPageLayout]] = None
+    ) -> List[OCRPageResult]:
+        """
+        Run each page through the engine concurrently (bounded by page_concurrency).
+        Results are returned in the original page order; a page that still fails after
+        page_retries retries is reported as failed instead of failing the whole document.
+        on_page, if given, is called with each page as soon as it finishes. If layouts is
+        given, pages are run through run_structured and each page layout is stored by index.
+        """
+        limit = asyncio.Semaphore(self.page_concurrency)
+
+        async def run_page(index: int, image: str) -> OCRPageResult:
+            page = await attempt_page(index, image)
+            if on_page is not None:
+                on_page(page)
+            return page
+
+        async def attempt_page(index: int, image: str) -> OCRPageResult:
+            async with limit:
+                attempts = 0
+                while True:
+                    attempts += 1
+                    try:
+                        # Summed over pages: with concurrent pages this exceeds the wall time
+                        with stage("engine"):
+                            if layouts is not None:
+                                layout = (await self.engine.run_structured([image], document_type)).pages[0]
+                                layout.index = index
+                                layouts[index] = layout
+                                text = layout.text()
+                            else:
+                                text = await self.engine.run([image], document_type)
+                        return OCRPageResult(index=index, status="completed", text=text, attempts=attempts)
+                    except Exception as e:
+                        if attempts > self.page_retries:
+                            logger.warning(f"OCR page {index} failed after {attempts} attempts: {e}")
+                            return OCRPageResult(index=index, status="failed", error=str(e), attempts=attempts)
+
+        return list(await asyncio.gather(*(run_page(i, img) for i, img in enumerate(images))))
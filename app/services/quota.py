@@ -0,0 +1,97 @@
+import json
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Optional
+from app import config
+from app.errors import QuotaCostTooLargeError
+from app.services.rate_limiter import BucketLimit, RateLimitDecision, acquire_async, build_bucket_store
+
+DAY_SECONDS = 86400
+
+
+@dataclass(frozen=True)
+class QuotaBudget:
+    """Per-project OCR budgets; 0 disables a budget."""
+    pages_per_minute: float = 0
+    pages_per_day: float = 0
+    bytes_per_minute: float = 0
+    bytes_per_day: float = 0
+
+
+class CostQuota:
+    """
+    Charges OCR requests by page count and decoded image bytes against rolling per-minute
+    and per-day token buckets of the project. All four budgets are charged together, or
+    none of them when any is exhausted. A request costing more than a whole budget raises
+    QuotaCostTooLargeError instead of waiting for a refill that could never cover it.
+    """
+
+    def __init__(self, store, budget: QuotaBudget, overrides: Optional[Dict[str, QuotaBudget]] = None):
+        self.store = store
+        self.budget = budget
+        self.overrides = overrides or {}
+
+    def _items(self, project_id: str, pages: int, decoded_bytes: int):
+        budget = self.overrides.get(project_id, self.budget)
+        items, costs = [], []
+        for unit, cost, per_minute, per_day in (
+            ("pages", pages, budget.pages_per_minute, budget.pages_per_day),
+            ("bytes", decoded_bytes, budget.bytes_per_minute, budget.bytes_per_day),
+        ):
+            for period, allowance in (("minute", per_minute), ("day", per_day)):
+                if 0 < allowance < cost:
+                    raise QuotaCostTooLargeError(f"Request needs {cost} {unit}, more than the {allowance:g} {unit} per {period} budget")
+            if per_minute > 0:
+                items.append((f"quota:{project_id}:{unit}:minute", BucketLimit(rate=per_minute / 60, burst=per_minute)))
+                costs.append(cost)
+            if per_day > 0:
+                items.append((f"quota:{project_id}:{unit}:day", BucketLimit(rate=per_day / DAY_SECONDS, burst=per_day)))
+                costs.append(cost)
+        return items, costs
+
+    def charge(self, project_id: str, pages: int, decoded_bytes: int) -> Optional[RateLimitDecision]:
+        """Returns None when the project has no budgets; raises QuotaCostTooLargeError when the cost exceeds one."""
+        items, costs = self._items(project_id, pages, decoded_bytes)
+        if not items:
+            return None
+        return self.store.acquire(items, costs=costs)
+
+    async def charge_async(self, project_id: str, pages: int, decoded_bytes: int) -> Optional[RateLimitDecision]:
+        """charge for the event loop (the SQLite backend runs on the threadpool)."""
+        items, costs = self._items(project_id, pages, decoded_bytes)
+        if not items:
+            return None
+        return await acquire_async(self.store, items, costs=costs)
+
+
+def parse_overrides(raw: str, default: QuotaBudget) -> Dict[str, QuotaBudget]:
+    """Parses OCR_QUOTA_OVERRIDES: {"acme": {"pages_per_day": 100000}, ...}; unset fields keep the default."""
+    if not raw.strip():
+        return {}
+    names = {f.name for f in fields(QuotaBudget)}
+    overrides = {}
+    for project_id, values in json.loads(raw).items():
+        unknown = set(values) - names
+        if unknown:
+            raise ValueError(f"Unknown OCR_QUOTA_OVERRIDES fields for {project_id}: {sorted(unknown)}")
+        overrides[project_id] = replace(default, **{k: float(v) for k, v in values.items()})
+    return overrides
+
+
+_quota: Optional[CostQuota] = None
+
+def build_cost_quota() -> CostQuota:
+    budget = QuotaBudget(
+        pages_per_minute=config.OCR_QUOTA_PAGES_PER_MINUTE,
+        pages_per_day=config.OCR_QUOTA_PAGES_PER_DAY,
+        bytes_per_minute=config.OCR_QUOTA_BYTES_PER_MINUTE,
+        bytes_per_day=config.OCR_QUOTA_BYTES_PER_DAY,
+    )
+    # Day buckets must outlive a full refill, otherwise eviction would hand back the budget
+    store = build_bucket_store("ocr_quota_buckets", DAY_SECONDS)
+    return CostQuota(store, budget, parse_overrides(config.OCR_QUOTA_OVERRIDES, budget))
+
+def get_cost_quota() -> CostQuota:
+    global _quota
+    if _quota is None:
+        _quota = build_cost_quota()
+    return _quota
@@ -0,0 +1,339 @@
+import hashlib
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from fastapi.concurrency import run_in_threadpool
+from app import config
+
+logger = logging.getLogger("rate_limit")
+
+# (tokens, updated_at) of one bucket; a missing bucket is full
+BucketState = Tuple[float, float]
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    """Token bucket: refills rate tokens per second up to burst."""
+    rate: float
+    burst: float
+
+    @classmethod
+    def per_minute(cls, requests: float, burst: Optional[float] = None) -> "BucketLimit":
+        return cls(rate=requests / 60.0, burst=float(burst if burst is not None else requests))
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int  # until the limiting bucket is full again
+    retry_after: int = 0  # seconds until the request would be allowed; 0 when allowed
+
+    def headers(self) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (b"x-ratelimit-limit", str(self.limit).encode()),
+            (b"x-ratelimit-remaining", str(self.remaining).encode()),
+            (b"x-ratelimit-reset", str(self.reset_seconds).encode()),
+        ]
+        if not self.allowed:
+            headers.append((b"retry-after", str(self.retry_after).encode()))
+        return headers
+
+
+def take_tokens(
+    states: Sequence[Optional[BucketState]],
+    limits: Sequence[BucketLimit],
+    costs: Sequence[float],
+    now: float
+) -> Tuple[RateLimitDecision, List[float]]:
+    """
+    Refills each bucket to now and takes its cost from every bucket, or from none if any
+    bucket is short. Returns the decision for the most restrictive bucket and the refilled
+    token counts (already charged when allowed).
+    """
+    tokens = []
+    for state, limit in zip(states, limits):
+        if state is None:
+            tokens.append(limit.burst)
+        else:
+            tokens.append(min(limit.burst, state[0] + max(0.0, now - state[1]) * limit.rate))
+    allowed = all(t >= c for t, c in zip(tokens, costs))
+    if allowed:
+        tokens = [t - c for t, c in zip(tokens, costs)]
+        # Most restrictive = fewest requests of the same cost left
+        i = min(range(len(tokens)), key=lambda j: tokens[j] // costs[j] if costs[j] else math.inf)
+        retry_after = 0
+    else:
+        waits = [(c - t) / limit.rate if t < c else 0.0 for t, c, limit in zip(tokens, costs, limits)]
+        i = max(range(len(waits)), key=lambda j: waits[j])
+        retry_after = max(1, math.ceil(waits[i]))
+    limit = limits[i]
+    decision = RateLimitDecision(
+        allowed=allowed,
+        limit=int(limit.burst),
+        remaining=max(0, int(tokens[i] // costs[i])) if costs[i] else int(tokens[i]),
+        reset_seconds=math.ceil((limit.burst - tokens[i]) / limit.rate),
+        retry_after=retry_after,
+    )
+    return decision, tokens
+
+
+def _costs(items: Sequence[Tuple[str, BucketLimit]], cost: float, costs: Optional[Sequence[float]]) -> List[float]:
+    return list(costs) if costs is not None else [cost] * len(items)
+
+
+async def acquire_async(
+    store,
+    items: Sequence[Tuple[str, BucketLimit]],
+    cost: float = 1.0,
+    costs: Optional[Sequence[float]] = None
+) -> RateLimitDecision:
+    """
+    store.acquire for callers on the event loop: stores doing blocking I/O (blocking = True)
+    run on the threadpool, so waiting on another worker's SQLite lock never stalls the loop;
+    in-memory stores answer inline.
+    """
+    if getattr(store, "blocking", False):
+        return await run_in_threadpool(store.acquire, items, cost, costs)
+    return store.acquire(items, cost, costs)
+
+
+class MemoryBucketStore:
+    """
+    Per-process buckets in an LRU dict. Buckets untouched for idle_seconds are evicted
+    (lossless once idle_seconds covers a full refill) and at most max_entries are kept.
+    """
+
+    blocking = False
+
+    def __init__(self, max_entries: int, idle_seconds: float, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        self._buckets: "OrderedDict[str, BucketState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(
+        self,
+        items: Sequence[Tuple[str, BucketLimit]],
+        cost: float = 1.0,
+        costs: Optional[Sequence[float]] = None
+    ) -> RateLimitDecision:
+        """Charges cost (or costs[i] to bucket i) against all buckets, or none of them."""
+        now = self._clock()
+        costs = _costs(items, cost, costs)
+        with self._lock:
+            states = [self._buckets.get(key) for key, _ in items]
+            decision, tokens = take_tokens(states, [limit for _, limit in items], costs, now)
+            if decision.allowed:
+                for (key, _), t in zip(items, tokens):
+                    self._buckets[key] = (t, now)
+                    self._buckets.move_to_end(key)
+            self._evict(now)
+        return decision
+
+    def _evict(self, now: float) -> None:
+        # Least recently touched buckets are at the front
+        cutoff = now - self.idle_seconds
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if updated >= cutoff and len(self._buckets) <= self.max_entries:
+                break
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SqliteBucketStore:
+    """
+    Buckets in a SQLite file shared by all workers on the host. Each acquire is one
+    BEGIN IMMEDIATE transaction; idle buckets are deleted every sweep_seconds. SQLite
+    errors fail open (the request is allowed and the error logged). acquire blocks for up
+    to busy_timeout_ms under write contention: call it through acquire_async from async code.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        idle_seconds: float,
+        table: str = "rate_limit_buckets",
+        busy_timeout_ms: int = 100,
+        sweep_seconds: float = 60.0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.idle_seconds = idle_seconds
+        self.table = table
+        self.sweep_seconds = sweep_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+        self._conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID"
+        )
+
+    def acquire(
+        self,
+        items: Sequence[Tuple[str, BucketLimit]],
+        cost: float = 1.0,
+        costs: Optional[Sequence[float]] = None
+    ) -> RateLimitDecision:
+        keys = [key for key, _ in items]
+        costs = _costs(items, cost, costs)
+        limits = [limit for _, limit in items]
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    now = self._clock()
+                    rows = self._conn.execute(
+                        f"SELECT key, tokens, updated FROM {self.table} WHERE key IN ({','.join('?' * len(keys))})",
+                        keys,
+                    ).fetchall()
+                    found = {key: (tokens, updated) for key, tokens, updated in rows}
+                    decision, tokens = take_tokens([found.get(k) for k in keys], limits, costs, now)
+                    if decision.allowed:
+                        self._conn.executemany(
+                            f"INSERT INTO {self.table} (key, tokens, updated) VALUES (?, ?, ?) "
+                            "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                            [(k, t, now) for k, t in zip(keys, tokens)],
+                        )
+                    if now >= self._next_sweep:
+                        self._next_sweep = now + self.sweep_seconds
+                        self._conn.execute(f"DELETE FROM {self.table} WHERE updated < ?", (now - self.idle_seconds,))
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error:
+                logger.exception("Rate limit store unavailable; allowing request")
+                return take_tokens([None] * len(items), limits, costs, self._clock())[0]
+        return decision
+
+    def __len__(self) -> int:
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class RateLimiter:
+    """
+    Charges one request against the client IP, API key and project buckets together.
+    API keys are bucketed by a SHA-256 digest, never the raw key. Per-tenant overrides
+    are looked up as "ip:<address>", "key:<key_prefix>" and "project:<project_id>".
+    """
+
+    def __init__(
+        self,
+        store,
+        ip_limit: Optional[BucketLimit],
+        key_limit: Optional[BucketLimit],
+        project_limit: Optional[BucketLimit],
+        overrides: Optional[Dict[str, BucketLimit]] = None
+    ):
+        self.store = store
+        self.ip_limit = ip_limit
+        self.key_limit = key_limit
+        self.project_limit = project_limit
+        self.overrides = overrides or {}
+
+    def buckets(
+        self,
+        client_ip: str,
+        api_key: Optional[str] = None,
+        project_id: Optional[str] = None
+    ) -> List[Tuple[str, BucketLimit]]:
+        items = []
+        limit = self.overrides.get(f"ip:{client_ip}", self.ip_limit)
+        if limit:
+            items.append((f"ip:{client_ip}", limit))
+        if api_key:
+            limit = self.overrides.get(f"key:{api_key[:8]}", self.key_limit)
+            if limit:
+                items.append(("key:" + hashlib.sha256(api_key.encode()).hexdigest()[:32], limit))
+        if project_id:
+            limit = self.overrides.get(f"project:{project_id}", self.project_limit)
+            if limit:
+                items.append((f"project:{project_id}", limit))
+        return items
+
+    def check(
+        self,
+        client_ip: str,
+        api_key: Optional[str] = None,
+        project_id: Optional[str] = None,
+        cost: float = 1.0
+    ) -> Optional[RateLimitDecision]:
+        """Returns None when no limit applies to the request."""
+        items = self.buckets(client_ip, api_key, project_id)
+        if not items:
+            return None
+        return self.store.acquire(items, cost)
+
+    async def check_async(
+        self,
+        client_ip: str,
+        api_key: Optional[str] = None,
+        project_id: Optional[str] = None,
+        cost: float = 1.0
+    ) -> Optional[RateLimitDecision]:
+        """check for the event loop; see acquire_async."""
+        items = self.buckets(client_ip, api_key, project_id)
+        if not items:
+            return None
+        return await acquire_async(self.store, items, cost)
+
+
+def _limit(per_minute: float, burst: Optional[str]) -> Optional[BucketLimit]:
+    if per_minute <= 0:
+        return None
+    return BucketLimit.per_minute(per_minute, float(burst) if burst else None)
+
+
+def parse_overrides(raw: str) -> Dict[str, BucketLimit]:
+    """Parses RATE_LIMIT_OVERRIDES: {"project:acme": {"per_minute": 600, "burst": 1200}, ...}."""
+    if not raw.strip():
+        return {}
+    overrides = {}
+    for key, value in json.loads(raw).items():
+        if not key.startswith(("ip:", "key:", "project:")):
+            raise ValueError(f"RATE_LIMIT_OVERRIDES key must start with ip:, key: or project: ({key})")
+        overrides[key] = BucketLimit.per_minute(float(value["per_minute"]), value.get("burst"))
+    return overrides
+
+
+_limiter: Optional[RateLimiter] = None
+
+def build_bucket_store(table: str, idle_seconds: float):
+    """Bucket store for RATE_LIMIT_BACKEND; each user of the SQLite file gets its own table."""
+    if config.RATE_LIMIT_BACKEND == "sqlite":
+        return SqliteBucketStore(config.RATE_LIMIT_SQLITE_PATH, idle_seconds, table=table)
+    if config.RATE_LIMIT_BACKEND == "memory":
+        return MemoryBucketStore(config.RATE_LIMIT_MAX_ENTRIES, idle_seconds)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {config.RATE_LIMIT_BACKEND}")
+
+def build_rate_limiter() -> RateLimiter:
+    return RateLimiter(
+        build_bucket_store("rate_limit_buckets", config.RATE_LIMIT_IDLE_SECONDS),
+        ip_limit=_limit(config.RATE_LIMIT_IP_PER_MINUTE, config.RATE_LIMIT_IP_BURST),
+        key_limit=_limit(config.RATE_LIMIT_KEY_PER_MINUTE, config.RATE_LIMIT_KEY_BURST),
+        project_limit=_limit(config.RATE_LIMIT_PROJECT_PER_MINUTE, config.RATE_LIMIT_PROJECT_BURST),
+        overrides=parse_overrides(config.RATE_LIMIT_OVERRIDES),
+    )
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = build_rate_limiter()
+    return _limiter
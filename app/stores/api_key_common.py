@@ -0,0 +1,247 @@
+"""
+Row building, queries and verification steps shared by SqlApiKeyStore and
+AsyncSqlApiKeyStore. The stores only add the session calls (sync or awaited), so both
+follow the same rules for hashing, caching and bulk batches.
+"""
+from sqlalchemy import and_, or_, select, update
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from datetime import datetime
+import base64
+import hmac
+import json
+import re
+import uuid
+from app.db.models.api_key import ProjectApiKeyDB
+from app.schemas.api_key import ProjectApiKey
+from app.security.api_keys import generate_api_key, hash_api_key, key_prefix
+from app.security.auth_cache import auth_cache, MISS
+from app.security.last_used import last_used_recorder
+
+# Rows per executemany / IN (...) batch in bulk operations
+BULK_CHUNK_SIZE = 500
+
+_KEY_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def api_key_row_to_schema(row: ProjectApiKeyDB) -> ProjectApiKey:
+    return ProjectApiKey(
+        id=row.id,
+        project_id=row.project_id,
+        key_prefix=row.key_prefix,
+        key_hash=row.key_hash,
+        key_fingerprint=row.key_fingerprint,
+        name=row.name,
+        created_at=row.created_at,
+        last_used_at=row.last_used_at,
+        revoked_at=row.revoked_at
+    )
+
+def api_key_dict_to_schema(row: Dict[str, Any]) -> ProjectApiKey:
+    return ProjectApiKey(**row)
+
+def new_api_key_db(project_id: str, name: Optional[str] = None) -> Tuple[str, ProjectApiKeyDB]:
+    """A fresh raw key and its unsaved row."""
+    raw_key = generate_api_key()
+    key_hash = hash_api_key(raw_key)
+    return raw_key, ProjectApiKeyDB(
+        project_id=project_id,
+        key_prefix=key_prefix(raw_key),
+        key_hash=key_hash,
+        key_fingerprint=key_hash[-8:],
+        name=name,
+        created_at=datetime.utcnow()
+    )
+
+def new_api_key_rows(
+    project_id: str,
+    names: List[Optional[str]],
+    created_at: Optional[datetime] = None
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Generates raw keys and their insert rows (one per name) for bulk INSERTs."""
+    created_at = created_at or datetime.utcnow()
+    raw_keys: List[str] = []
+    rows: List[Dict[str, Any]] = []
+    for name in names:
+        raw_key = generate_api_key()
+        key_hash = hash_api_key(raw_key)
+        raw_keys.append(raw_key)
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "project_id": project_id,
+            "key_prefix": key_prefix(raw_key),
+            "key_hash": key_hash,
+            "key_fingerprint": key_hash[-8:],
+            "name": name,
+            "created_at": created_at,
+        })
+    return raw_keys, rows
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Listing
+
+def list_page_query(project_id: str, limit: Optional[int], cursor: Optional[str], active_only: bool):
+    # ix_project_api_keys_project_id_created_at_id serves both the seek and the ORDER BY, so
+    # a page reads limit + 1 rows without a sort; active_only can also be answered from
+    # ix_project_api_keys_project_id_revoked_at when most keys are revoked
+    q = select(ProjectApiKeyDB).where(ProjectApiKeyDB.project_id == project_id)
+    if active_only:
+        q = q.where(ProjectApiKeyDB.revoked_at.is_(None))
+    if cursor:
+        created_at, key_id = decode_list_cursor(cursor)
+        q = q.where(or_(
+            ProjectApiKeyDB.created_at < created_at,
+            and_(ProjectApiKeyDB.created_at == created_at, ProjectApiKeyDB.id < key_id)
+        ))
+    q = q.order_by(ProjectApiKeyDB.created_at.desc(), ProjectApiKeyDB.id.desc())
+    if limit is not None:
+        # One extra row tells us whether there is a next page
+        q = q.limit(limit + 1)
+    return q
+
+def page_from_rows(keys: List[ProjectApiKey], limit: Optional[int]) -> Tuple[List[ProjectApiKey], Optional[str]]:
+    if limit is None or len(keys) <= limit:
+        return keys, None
+    keys = keys[:limit]
+    return keys, encode_list_cursor(keys[-1].created_at, keys[-1].id)
+
+def encode_list_cursor(created_at: datetime, key_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), key_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_list_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, key_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(key_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+# Rotation
+
+def active_keys_query(project_id: str):
+    return select(ProjectApiKeyDB.key_hash, ProjectApiKeyDB.name).where(
+        ProjectApiKeyDB.project_id == project_id, ProjectApiKeyDB.revoked_at.is_(None)
+    )
+
+def revoke_active_statement(project_id: str, now: datetime):
+    return (
+        update(ProjectApiKeyDB)
+        .where(ProjectApiKeyDB.project_id == project_id, ProjectApiKeyDB.revoked_at.is_(None))
+        .values(revoked_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Verification: cached_verification, then on MISS verify_query and verified_record
+
+def cached_verification(candidate_hash: str):
+    """Cached record (None for a cached negative), or MISS when the DB must be asked."""
+    cached = auth_cache.get(candidate_hash)
+    if cached is not MISS and cached is not None:
+        last_used_recorder.record(cached.id)
+    return cached
+
+def verify_query(candidate_hash: str):
+    return select(ProjectApiKeyDB).where(
+        ProjectApiKeyDB.key_hash == candidate_hash,
+        ProjectApiKeyDB.revoked_at.is_(None)
+    ).limit(1)
+
+def verified_record(candidate_hash: str, row: Optional[ProjectApiKeyDB]) -> Optional[ProjectApiKey]:
+    """Caches the outcome of verify_query and records the use of a matching key."""
+    if not row:
+        auth_cache.put(candidate_hash, None)
+        return None
+    # Optional: constant-time compare
+    if not hmac.compare_digest(row.key_hash, candidate_hash):
+        return None
+    # last_used_at is written behind in batches (see app.security.last_used)
+    last_used_recorder.record(row.id)
+    record = api_key_row_to_schema(row)
+    auth_cache.put(candidate_hash, record)
+    return record
+
+
+# Export / import
+
+def _parse_dt(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def import_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Validates one import record and maps it to an insert row."""
+    key_hash = str(record.get("key_hash", "")).lower()
+    if not _KEY_HASH_RE.match(key_hash):
+        raise ValueError("key_hash must be a 64-character hex HMAC-SHA256 digest")
+    if not record.get("project_id") or not record.get("key_prefix"):
+        raise ValueError("project_id and key_prefix are required")
+    return {
+        "id": record.get("api_key_id") or str(uuid.uuid4()),
+        "project_id": record["project_id"],
+        "key_prefix": record["key_prefix"],
+        "key_hash": key_hash,
+        "key_fingerprint": key_hash[-8:],
+        "name": record.get("name"),
+        "created_at": _parse_dt(record.get("created_at")) or datetime.utcnow(),
+        "last_used_at": _parse_dt(record.get("last_used_at")),
+        "revoked_at": _parse_dt(record.get("revoked_at")),
+    }
+
+def existing_import_keys_query(chunk: List[Dict[str, Any]]):
+    """(key_hash, id) of stored rows sharing a key_hash or an id with the chunk."""
+    return select(ProjectApiKeyDB.key_hash, ProjectApiKeyDB.id).where(or_(
+        ProjectApiKeyDB.key_hash.in_([row["key_hash"] for row in chunk]),
+        ProjectApiKeyDB.id.in_([row["id"] for row in chunk]),
+    ))
+
+def split_import_chunk(
+    chunk: List[Dict[str, Any]],
+    existing: Iterable[Tuple[str, str]],
+    seen_hashes: Set[str],
+    seen_ids: Set[str]
+) -> Tuple[List[Dict[str, Any]], int, List[str]]:
+    """
+    Returns (rows to insert, rows skipped because the key_hash is already stored, ids of
+    rows skipped because a different key already has that api_key_id). seen_hashes and
+    seen_ids carry rows accepted from earlier chunks of the same import.
+    """
+    existing = list(existing)
+    stored_hashes = {key_hash for key_hash, _ in existing}
+    stored_ids = {key_id for _, key_id in existing}
+    fresh: List[Dict[str, Any]] = []
+    skipped = 0
+    conflicts: List[str] = []
+    for row in chunk:
+        if row["key_hash"] in stored_hashes or row["key_hash"] in seen_hashes:
+            skipped += 1
+        elif row["id"] in stored_ids or row["id"] in seen_ids:
+            conflicts.append(row["id"])
+        else:
+            seen_hashes.add(row["key_hash"])
+            seen_ids.add(row["id"])
+            fresh.append(row)
+    return fresh, skipped, conflicts
+
+def export_row(row: ProjectApiKeyDB) -> Dict[str, Any]:
+    return {
+        "api_key_id": row.id,
+        "project_id": row.project_id,
+        "key_prefix": row.key_prefix,
+        "key_hash": row.key_hash,
+        "name": row.name,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "last_used_at": row.last_used_at.isoformat() if row.last_used_at else None,
+        "revoked_at": row.revoked_at.isoformat() if row.revoked_at else None,
+    }
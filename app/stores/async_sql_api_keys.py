@@ -0,0 +1,112 @@
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List, Tuple
+from datetime import datetime
+from app.db.models.api_key import ProjectApiKeyDB
+from app.schemas.api_key import ProjectApiKey
+from app.security.api_keys import hash_api_key
+from app.security.auth_cache import auth_cache, MISS
+from app.security.auth_revision import revision_watcher, read_auth_revision_async, bump_auth_revision_async
+from app.stores.api_key_common import (
+    api_key_row_to_schema, api_key_dict_to_schema, new_api_key_db, new_api_key_rows, chunked, BULK_CHUNK_SIZE,
+    list_page_query, page_from_rows, active_keys_query, revoke_active_statement,
+    cached_verification, verify_query, verified_record
+)
+
+class AsyncSqlApiKeyStore:
+    """
+    Async counterpart of SqlApiKeyStore used by request handlers. Shares the auth cache,
+    revision watcher and last_used write-behind buffer with the sync store.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create(self, project_id: str, name: Optional[str] = None) -> Tuple[str, ProjectApiKey]:
+        raw_key, db_obj = new_api_key_db(project_id, name)
+        self.db.add(db_obj)
+        await self.db.commit()
+        await self.db.refresh(db_obj)
+        auth_cache.invalidate(db_obj.key_hash)
+        return raw_key, self._to_schema(db_obj)
+
+    async def list(self, project_id: str) -> List[ProjectApiKey]:
+        return (await self.list_page(project_id))[0]
+
+    async def list_page(
+        self,
+        project_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        active_only: bool = False
+    ) -> Tuple[List[ProjectApiKey], Optional[str]]:
+        q = list_page_query(project_id, limit, cursor, active_only)
+        rows = (await self.db.execute(q)).scalars().all()
+        return page_from_rows([self._to_schema(row) for row in rows], limit)
+
+    async def revoke(self, project_id: str, key_id: str) -> Optional[ProjectApiKey]:
+        row = (await self.db.execute(select(ProjectApiKeyDB).where(ProjectApiKeyDB.id == key_id))).scalar_one_or_none()
+        if not row or row.project_id != project_id:
+            return None
+        if row.revoked_at is None:
+            row.revoked_at = datetime.utcnow()
+            # Tell other workers to drop their cached copy of this key
+            await bump_auth_revision_async(self.db)
+            await self.db.commit()
+            await self.db.refresh(row)
+        auth_cache.invalidate(row.key_hash)
+        return self._to_schema(row)
+
+    async def bulk_create(self, project_id: str, count: int, name: Optional[str] = None) -> List[Tuple[str, ProjectApiKey]]:
+        """Creates count keys with batched INSERTs in a single transaction."""
+        raw_keys, rows = new_api_key_rows(project_id, [name] * count)
+        try:
+            for chunk in chunked(rows, BULK_CHUNK_SIZE):
+                await self.db.execute(insert(ProjectApiKeyDB), chunk)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        return [(raw, api_key_dict_to_schema(row)) for raw, row in zip(raw_keys, rows)]
+
+    async def rotate_all(self, project_id: str) -> Tuple[int, List[Tuple[str, ProjectApiKey]]]:
+        """Revokes every active key of the project and creates same-named replacements in one transaction."""
+        now = datetime.utcnow()
+        try:
+            active = (await self.db.execute(active_keys_query(project_id))).all()
+            await self.db.execute(revoke_active_statement(project_id, now))
+            raw_keys, rows = new_api_key_rows(project_id, [name for _, name in active], now)
+            for chunk in chunked(rows, BULK_CHUNK_SIZE):
+                await self.db.execute(insert(ProjectApiKeyDB), chunk)
+            await bump_auth_revision_async(self.db)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        for key_hash, _ in active:
+            auth_cache.invalidate(key_hash)
+        return len(active), [(raw, api_key_dict_to_schema(row)) for raw, row in zip(raw_keys, rows)]
+
+    async def verify(self, raw_key: str) -> Optional[ProjectApiKey]:
+        if not raw_key:
+            return None
+        candidate_hash = hash_api_key(raw_key)
+        await self._sync_auth_revision()
+        # Hot path: answered from the in-process cache without a DB round trip
+        cached = cached_verification(candidate_hash)
+        if cached is not MISS:
+            return cached
+        row = (await self.db.execute(verify_query(candidate_hash))).scalar_one_or_none()
+        return verified_record(candidate_hash, row)
+
+    async def _sync_auth_revision(self) -> None:
+        # At most one cheap read per poll interval per worker; clears the cache on change
+        if not revision_watcher.claim_poll():
+            return
+        try:
+            revision_watcher.observe(await read_auth_revision_async(self.db))
+        except Exception:
+            await self.db.rollback()
+
+    def _to_schema(self, row: ProjectApiKeyDB) -> ProjectApiKey:
+        return api_key_row_to_schema(row)
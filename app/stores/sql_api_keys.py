@@ -1,75 +1,150 @@
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from typing import Optional, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, Optional, List, Tuple
 from datetime import datetime
 from app.db.models.api_key import ProjectApiKeyDB
 from app.schemas.api_key import ProjectApiKey
-from app.security.api_keys import generate_api_key, hash_api_key, key_prefix
-import hmac
+from app.security.api_keys import hash_api_key
+from app.security.auth_cache import auth_cache, MISS
+from app.security.auth_revision import revision_watcher, read_auth_revision, bump_auth_revision
+from app.stores.api_key_common import (
+    api_key_row_to_schema, api_key_dict_to_schema, new_api_key_db, new_api_key_rows, chunked, BULK_CHUNK_SIZE,
+    list_page_query, page_from_rows, active_keys_query, revoke_active_statement,
+    cached_verification, verify_query, verified_record,
+    import_row, existing_import_keys_query, split_import_chunk, export_row
+)
 
 class SqlApiKeyStore:
     def __init__(self, db: Session):
         self.db = db
 
     def create(self, project_id: str, name: Optional[str] = None) -> Tuple[str, ProjectApiKey]:
-        raw_key = generate_api_key()
-        prefix = key_prefix(raw_key)
-        key_hash = hash_api_key(raw_key)
-        fingerprint = key_hash[-8:]
-        db_obj = ProjectApiKeyDB(
-            project_id=project_id,
-            key_prefix=prefix,
-            key_hash=key_hash,
-            key_fingerprint=fingerprint,
-            name=name
-        )
+        raw_key, db_obj = new_api_key_db(project_id, name)
         self.db.add(db_obj)
         self.db.commit()
         self.db.refresh(db_obj)
+        auth_cache.invalidate(db_obj.key_hash)
         return raw_key, self._to_schema(db_obj)
 
     def list(self, project_id: str) -> List[ProjectApiKey]:
-        q = self.db.query(ProjectApiKeyDB).filter(ProjectApiKeyDB.project_id == project_id).order_by(ProjectApiKeyDB.created_at.desc())
-        return [self._to_schema(row) for row in q.all()]
+        return self.list_page(project_id)[0]
+
+    def list_page(
+        self,
+        project_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        active_only: bool = False
+    ) -> Tuple[List[ProjectApiKey], Optional[str]]:
+        """
+        Keyset-paginated listing, newest first. Returns (keys, next_cursor); next_cursor is
+        None on the last page. Raises ValueError for a malformed cursor.
+        """
+        q = list_page_query(project_id, limit, cursor, active_only)
+        rows = self.db.execute(q).scalars().all()
+        return page_from_rows([self._to_schema(row) for row in rows], limit)
 
     def revoke(self, project_id: str, key_id: str) -> Optional[ProjectApiKey]:
-        row = self.db.query(ProjectApiKeyDB).filter(ProjectApiKeyDB.id == key_id).first()
+        row = self.db.execute(select(ProjectApiKeyDB).where(ProjectApiKeyDB.id == key_id)).scalar_one_or_none()
         if not row or row.project_id != project_id:
             return None
         if row.revoked_at is None:
             row.revoked_at = datetime.utcnow()
+            # Tell other workers to drop their cached copy of this key
+            bump_auth_revision(self.db)
             self.db.commit()
             self.db.refresh(row)
+        auth_cache.invalidate(row.key_hash)
         return self._to_schema(row)
 
+    def bulk_create(self, project_id: str, count: int, name: Optional[str] = None) -> List[Tuple[str, ProjectApiKey]]:
+        """Creates count keys with batched INSERTs in a single transaction."""
+        raw_keys, rows = new_api_key_rows(project_id, [name] * count)
+        try:
+            for chunk in chunked(rows, BULK_CHUNK_SIZE):
+                self.db.execute(insert(ProjectApiKeyDB), chunk)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return [(raw, api_key_dict_to_schema(row)) for raw, row in zip(raw_keys, rows)]
+
+    def import_hashed(self, records: Iterable[Dict[str, Any]]) -> Tuple[int, int, List[str]]:
+        """
+        Imports pre-hashed keys (e.g. from export) in a single transaction. Records whose
+        key_hash already exists are skipped; records whose api_key_id belongs to a different
+        key are left out and reported. Returns (imported, skipped, conflicting api_key_ids).
+        """
+        imported = skipped = 0
+        conflicts: List[str] = []
+        seen_hashes, seen_ids = set(), set()
+        try:
+            for chunk in chunked((import_row(r) for r in records), BULK_CHUNK_SIZE):
+                existing = self.db.execute(existing_import_keys_query(chunk)).all()
+                fresh, already, clashing = split_import_chunk(chunk, existing, seen_hashes, seen_ids)
+                if fresh:
+                    self.db.execute(insert(ProjectApiKeyDB), fresh)
+                imported += len(fresh)
+                skipped += already
+                conflicts.extend(clashing)
+            # Other workers may hold negative cache entries for the imported hashes
+            bump_auth_revision(self.db)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        auth_cache.clear()
+        return imported, skipped, conflicts
+
+    def export(self, project_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Streams keys (hash, never the raw key) in import_hashed format."""
+        q = select(ProjectApiKeyDB).order_by(ProjectApiKeyDB.created_at, ProjectApiKeyDB.id)
+        if project_id:
+            q = q.where(ProjectApiKeyDB.project_id == project_id)
+        for row in self.db.execute(q.execution_options(yield_per=BULK_CHUNK_SIZE)).scalars():
+            yield export_row(row)
+
+    def rotate_all(self, project_id: str) -> Tuple[int, List[Tuple[str, ProjectApiKey]]]:
+        """
+        Revokes every active key of the project and creates one replacement per revoked
+        key (same name), all in one transaction. Returns (revoked_count, new keys).
+        """
+        now = datetime.utcnow()
+        try:
+            active = self.db.execute(active_keys_query(project_id)).all()
+            self.db.execute(revoke_active_statement(project_id, now))
+            raw_keys, rows = new_api_key_rows(project_id, [name for _, name in active], now)
+            for chunk in chunked(rows, BULK_CHUNK_SIZE):
+                self.db.execute(insert(ProjectApiKeyDB), chunk)
+            bump_auth_revision(self.db)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        for key_hash, _ in active:
+            auth_cache.invalidate(key_hash)
+        return len(active), [(raw, api_key_dict_to_schema(row)) for raw, row in zip(raw_keys, rows)]
+
     def verify(self, raw_key: str) -> Optional[ProjectApiKey]:
         if not raw_key:
             return None
         candidate_hash = hash_api_key(raw_key)
-        row = self.db.query(ProjectApiKeyDB).filter(
-            ProjectApiKeyDB.key_hash == candidate_hash,
-            ProjectApiKeyDB.revoked_at.is_(None)
-        ).first()
-        if not row:
-            return None
-        # Optional: constant-time compare
-        if not hmac.compare_digest(row.key_hash, candidate_hash):
-            return None
-        # Best-effort update last_used_at
+        self._sync_auth_revision()
+        # Hot path: answered from the in-process cache without a DB round trip
+        cached = cached_verification(candidate_hash)
+        if cached is not MISS:
+            return cached
+        row = self.db.execute(verify_query(candidate_hash)).scalar_one_or_none()
+        return verified_record(candidate_hash, row)
+
+    def _sync_auth_revision(self) -> None:
+        # At most one cheap read per poll interval per worker; clears the cache on change
+        if not revision_watcher.claim_poll():
+            return
         try:
-            row.last_used_at = datetime.utcnow()
-            self.db.commit()
+            revision_watcher.observe(read_auth_revision(self.db))
         except Exception:
             self.db.rollback()
-        return self._to_schema(row)
 
     def _to_schema(self, row: ProjectApiKeyDB) -> ProjectApiKey:
-        return ProjectApiKey(
-            id=row.id,
-            project_id=row.project_id,
-            key_prefix=row.key_prefix,
-            key_fingerprint=row.key_fingerprint,
-            name=row.name,
-            created_at=row.created_at,
-            last_used_at=row.last_used_at,
-            revoked_at=row.revoked_at
-        )
+        return api_key_row_to_schema(row)
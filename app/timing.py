@@ -0,0 +1,99 @@
+"""
+Per-stage wall-clock timings (and, with memory accounting on, peak allocations) for one
+request or OCR job.
+
+The pipeline middleware starts a StageTimings per request and makes it current through a
+context variable; code records into whatever is current with stage()/mark(), which are
+no-ops when nothing is current. Child tasks (asyncio.gather, run_in_executor) inherit
+the same object, so concurrent pages add up into one stage total. In traced requests each
+stage() is also a span.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+from app import memory_accounting, tracing
+from app.memory_accounting import MemorySpan
+from app.metrics import STAGE_MEMORY_PEAK
+
+_current: ContextVar[Optional["StageTimings"]] = ContextVar("stage_timings", default=None)
+
+
+class StageTimings:
+    def __init__(self, started: Optional[float] = None):
+        self.started = time.perf_counter() if started is None else started
+        self.durations: Dict[str, float] = {}  # seconds, summed over repeated stages
+        self.counts: Dict[str, int] = {}
+        self.memory_peaks: Dict[str, int] = {}  # bytes, max over repeated stages
+        # Started at the beginning of the request/job when memory accounting is on; mark() measures from it
+        self.memory_span: Optional[MemorySpan] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def add_memory(self, name: str, peak_bytes: int) -> None:
+        if peak_bytes > self.memory_peaks.get(name, -1):
+            self.memory_peaks[name] = peak_bytes
+        STAGE_MEMORY_PEAK.observe(peak_bytes, (name,))
+
+    def as_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.durations.items()}
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. 'validation;dur=0.412, b64_size;dur=0.031'."""
+        return ", ".join(f"{name};dur={ms:.3f}" for name, ms in self.as_ms().items())
+
+
+def current_timings() -> Optional[StageTimings]:
+    return _current.get()
+
+
+@contextmanager
+def use_timings(timings: StageTimings) -> Iterator[StageTimings]:
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Adds the time spent in the block to stage name of the current timings."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    span = memory_accounting.span_start() if memory_accounting.enabled else None
+    start = time.perf_counter()
+    try:
+        with tracing.span(name):
+            yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+        if span is not None:
+            timings.add_memory(name, memory_accounting.span_end(span))
+
+
+@contextmanager
+def track_memory(name: str) -> Iterator[None]:
+    """Records only the peak allocation of the block (no timing); no-op unless accounting is on."""
+    timings = _current.get()
+    if timings is None or not memory_accounting.enabled:
+        yield
+        return
+    span = memory_accounting.span_start()
+    try:
+        yield
+    finally:
+        timings.add_memory(name, memory_accounting.span_end(span))
+
+
+def mark(name: str, since: Optional[float] = None) -> None:
+    """Records stage name as the time from since (default: start of the timings) until now."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, time.perf_counter() - (timings.started if since is None else since))
+        if since is None and timings.memory_span is not None:
+            timings.add_memory(name, memory_accounting.span_peak(timings.memory_span))
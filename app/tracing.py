@@ -0,0 +1,205 @@
+"""
+Minimal in-process tracing compatible with W3C Trace Context (traceparent).
+
+The pipeline middleware starts a root span per sampled request (continuing an incoming
+traceparent); span() opens a child of the current span through a context variable, so
+stages (app.timing), DB queries and the OCR job worker nest under the request. Finished
+spans are written as JSON lines by a LogWriter thread (bounded queue, batched writes) to
+TRACING_EXPORT_PATH, a stand-in for an OTLP collector. Unsampled requests create no spans:
+span() costs one context variable lookup.
+"""
+import json
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from app import config
+from app.logging_setup import LogWriter
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value: Optional[str]):
+    """Returns (trace_id, parent_span_id, sampled) or None when missing or malformed."""
+    if not value:
+        return None
+    match = _TRACEPARENT.match(value.strip().lower())
+    if not match:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def _new_id(hex_chars: int) -> str:
+    return os.urandom(hex_chars // 2).hex()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], start_ns: Optional[int] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(16)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def child(self, name: str, start_ns: Optional[int] = None) -> "Span":
+        return Span(self.tracer, name, self.trace_id, self.span_id, start_ns)
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        """Ends and exports the span; later calls are ignored."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns() if end_ns is None else end_ns
+        self.tracer.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """
+    Head sampling: an incoming traceparent's sampled flag is followed, otherwise a new
+    trace is sampled with probability sample_rate. exporter is anything with put(line).
+    """
+
+    def __init__(self, exporter, sample_rate: float, service_name: str = config.APP_NAME):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None) -> Optional[Span]:
+        """Root span of this process for a request, or None when the trace is not sampled."""
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = _new_id(32), None
+            sampled = self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+        if not sampled:
+            return None
+        span = Span(self, name, trace_id, parent_id)
+        span.set_attribute("service.name", self.service_name)
+        return span
+
+    def export(self, span: Span) -> None:
+        self.exporter.put(json.dumps(span.to_dict(), default=str))
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def use_span(span: Optional[Span]) -> Iterator[Optional[Span]]:
+    """Makes span current for the block (without ending it)."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, parent: Optional[Span] = None, **attributes) -> Iterator[Optional[Span]]:
+    """Child of parent (default: the current span) for the block; yields None when not tracing."""
+    parent = parent or _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name)
+    child.attributes.update(attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.status = "error"
+        child.set_attribute("error.type", type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is not None:
+        db_span = parent.child("db.query")
+        db_span.set_attribute("db.system", conn.dialect.name)
+        db_span.set_attribute("db.statement", statement[:500])
+        context._trace_span = db_span
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_span = getattr(context, "_trace_span", None)
+    if db_span is not None:
+        db_span.end()
+
+
+def _handle_error(exception_context):
+    db_span = getattr(exception_context.execution_context, "_trace_span", None)
+    if db_span is not None:
+        db_span.status = "error"
+        db_span.end()
+
+
+def instrument_engine(engine) -> None:
+    """DB query spans for a (sync) SQLAlchemy engine; pass async_engine.sync_engine for async."""
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_built = False
+
+def build_tracer() -> Optional[Tracer]:
+    """None when TRACING_SAMPLE_RATE is 0: the pipeline then skips tracing entirely."""
+    if config.TRACING_SAMPLE_RATE <= 0:
+        return None
+    export_file = open(config.TRACING_EXPORT_PATH, "a", encoding="utf-8")
+    exporter = LogWriter(lambda: export_file, config.TRACING_QUEUE_MAX, config.TRACING_BATCH_MAX)
+    return Tracer(exporter, config.TRACING_SAMPLE_RATE)
+
+def get_tracer() -> Optional[Tracer]:
+    global _tracer, _tracer_built
+    if not _tracer_built:
+        _tracer = build_tracer()
+        _tracer_built = True
+    return _tracer
+
+def flush_tracing(timeout: float = 5.0) -> None:
+    """Waits for exported spans to be written; called from the app lifespan on shutdown."""
+    if _tracer is not None and hasattr(_tracer.exporter, "flush"):
+        _tracer.exporter.flush(timeout)
@@ -1,12 +1,195 @@
+import asyncio
+import logging
 import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import config
+from app.db.models.usage_rollup import UsageRollupDB
+from app.stores.api_key_common import BULK_CHUNK_SIZE, chunked
 
-_usage_events = []
-_usage_lock = threading.Lock()
+logger = logging.getLogger("usage")
 
-def add_usage_event(event: dict):
-    with _usage_lock:
-        _usage_events.append(event)
+USAGE_FIELDS = ("requests", "pages", "decoded_bytes", "engine_ms", "cache_hits")
 
-def get_usage_events():
-    with _usage_lock:
-        return list(_usage_events)
+# (project_id, bucket_start epoch seconds)
+BucketKey = Tuple[str, int]
+
+
+class UsageAggregator:
+    """
+    Per-project usage counters aggregated in memory into bucket_seconds time buckets and
+    written behind: a flush adds every pending bucket to usage_rollups in one transaction
+    (an upsert per bucket, so several workers can flush into the same row), in multi-row
+    statements of BULK_CHUNK_SIZE buckets to stay under the bind-parameter limit. Memory is
+    bounded by projects x buckets touched between two flushes.
+    """
+
+    def __init__(self, bucket_seconds: int, clock: Callable[[], float] = time.time):
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        self._clock = clock
+        self._pending: Dict[BucketKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def bucket_start(self, when: float) -> int:
+        epoch = int(when)
+        return epoch - epoch % self.bucket_seconds
+
+    def record(
+        self,
+        project_id: str,
+        requests: int = 0,
+        pages: int = 0,
+        decoded_bytes: int = 0,
+        engine_ms: float = 0.0,
+        cache_hits: int = 0,
+        when: Optional[float] = None
+    ) -> None:
+        key = (project_id, self.bucket_start(self._clock() if when is None else when))
+        with self._lock:
+            counters = self._pending.get(key)
+            if counters is None:
+                counters = self._pending[key] = [0, 0, 0, 0.0, 0]
+            counters[0] += requests
+            counters[1] += pages
+            counters[2] += decoded_bytes
+            counters[3] += engine_ms
+            counters[4] += cache_hits
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def snapshot(self) -> List[dict]:
+        """Unflushed buckets of this worker (for /debug/usage)."""
+        with self._lock:
+            pending = {key: list(counters) for key, counters in self._pending.items()}
+        return [_bucket_dict(project_id, start, counters) for (project_id, start), counters in sorted(pending.items())]
+
+    def drain(self) -> Dict[BucketKey, List[float]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def requeue(self, pending: Dict[BucketKey, List[float]]) -> None:
+        with self._lock:
+            for key, counters in pending.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = counters
+                else:
+                    self._pending[key] = [a + b for a, b in zip(current, counters)]
+
+    @staticmethod
+    def _upserts(dialect: str, pending: Dict[BucketKey, List[float]]) -> Iterator:
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            raise ValueError(f"Usage rollups need an upsert; unsupported database dialect: {dialect}")
+        rows = (
+            {
+                "project_id": project_id,
+                "bucket_start": start,
+                "requests": int(counters[0]),
+                "pages": int(counters[1]),
+                "decoded_bytes": int(counters[2]),
+                "engine_ms": int(round(counters[3])),
+                "cache_hits": int(counters[4]),
+            }
+            for (project_id, start), counters in pending.items()
+        )
+        table = UsageRollupDB.__table__
+        # One statement for every pending bucket would exceed the bind-parameter limit
+        # (SQLite 32766, asyncpg 32767) after a few thousand buckets and fail every flush
+        for chunk in chunked(rows, BULK_CHUNK_SIZE):
+            stmt = insert(UsageRollupDB).values(chunk)
+            yield stmt.on_conflict_do_update(
+                index_elements=["project_id", "bucket_start"],
+                set_={name: table.c[name] + stmt.excluded[name] for name in USAGE_FIELDS},
+            )
+
+    def flush(self, db: Session) -> int:
+        """Writes all pending buckets in a single transaction. Returns the number of buckets written."""
+        pending = self.drain()
+        if not pending:
+            return 0
+        try:
+            for stmt in self._upserts(db.get_bind().dialect.name, pending):
+                db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.requeue(pending)
+            raise
+        return len(pending)
+
+    async def flush_async(self, db: AsyncSession) -> int:
+        pending = self.drain()
+        if not pending:
+            return 0
+        try:
+            for stmt in self._upserts(db.get_bind().dialect.name, pending):
+                await db.execute(stmt)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self.requeue(pending)
+            raise
+        return len(pending)
+
+
+def _bucket_dict(project_id: Optional[str], start: int, counters) -> dict:
+    bucket = {"start": datetime.fromtimestamp(start, timezone.utc).isoformat()}
+    if project_id is not None:
+        bucket["project_id"] = project_id
+    bucket.update({name: int(round(value)) for name, value in zip(USAGE_FIELDS, counters)})
+    return bucket
+
+
+def rollup_query(project_id: str, start: int, end: int, step: int):
+    """
+    Sums usage_rollups rows of project_id with start <= bucket_start < end into step-second
+    buckets. Served by the (project_id, bucket_start) primary key; returns (start, *sums).
+    """
+    table = UsageRollupDB.__table__
+    bucket = (table.c.bucket_start - table.c.bucket_start % step).label("start")
+    return (
+        select(bucket, *(func.sum(table.c[name]) for name in USAGE_FIELDS))
+        .where(table.c.project_id == project_id, table.c.bucket_start >= start, table.c.bucket_start < end)
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+
+
+def rollup_buckets(rows) -> List[dict]:
+    return [_bucket_dict(None, int(row[0]), [value or 0 for value in row[1:]]) for row in rows]
+
+
+def query_rollups(db: Session, project_id: str, start: int, end: int, step: int) -> List[dict]:
+    return rollup_buckets(db.execute(rollup_query(project_id, start, end, step)).all())
+
+
+async def query_rollups_async(db: AsyncSession, project_id: str, start: int, end: int, step: int) -> List[dict]:
+    return rollup_buckets((await db.execute(rollup_query(project_id, start, end, step))).all())
+
+
+# Process-wide aggregator fed by the ocr route and the OCR job worker
+usage_aggregator = UsageAggregator(config.USAGE_BUCKET_SECONDS)
+
+async def flush_usage() -> int:
+    from app.db.session import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        return await usage_aggregator.flush_async(db)
+
+async def run_usage_flusher(interval_seconds: float) -> None:
+    """Background loop started from the app lifespan; flushes pending buckets every interval."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await flush_usage()
+        except Exception:
+            logger.exception("Failed to flush usage rollups")
@@ -0,0 +1,71 @@
+"""
+In-memory API key verification: linear scan vs hash index.
+
+Fills PROJECT_API_KEYS with N keys spread over many projects, then times
+verify_api_key / verify_api_key_allow_revoked against the previous
+scan-and-compare implementation.
+
+Usage: python -m benchmarks.bench_api_key_lookup [--keys 100000]
+"""
+import argparse
+import json
+import os
+import time
+from typing import Optional
+from app.schemas.api_key import ProjectApiKey, PROJECT_API_KEYS
+from app.security.api_keys import (
+    compare_hashes, generate_api_key, hash_api_key, store_api_key,
+    verify_api_key, verify_api_key_allow_revoked,
+)
+
+
+def scan_verify(raw_key: str) -> Optional[ProjectApiKey]:
+    key_hash = hash_api_key(raw_key)
+    for api_key in PROJECT_API_KEYS.values():
+        if api_key.revoked_at is None and compare_hashes(api_key.key_hash, key_hash):
+            return api_key
+    return None
+
+
+def _time_us(fn, arg, *extra, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg, *extra)
+    return round((time.perf_counter() - start) / repeat * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=2000, help="Iterations for indexed lookups")
+    args = parser.parse_args()
+    os.environ.setdefault("API_KEY_PEPPER", "bench_pepper")
+
+    PROJECT_API_KEYS.clear()
+    raw_keys = []
+    for i in range(args.keys):
+        raw = generate_api_key()
+        store_api_key(f"proj-{i % args.projects}", raw)
+        raw_keys.append(raw)
+    # Worst case for the scan: the last inserted key
+    target = raw_keys[-1]
+    target_project = f"proj-{(args.keys - 1) % args.projects}"
+
+    scan_repeat = max(1, args.repeat // 200)
+    results = {
+        "keys": args.keys,
+        "hash_api_key_us": _time_us(hash_api_key, target, repeat=args.repeat),
+        "scan_verify_us": _time_us(scan_verify, target, repeat=scan_repeat),
+        "indexed_verify_us": _time_us(verify_api_key, target, repeat=args.repeat),
+        "indexed_verify_allow_revoked_us": _time_us(
+            verify_api_key_allow_revoked, target, target_project, repeat=args.repeat
+        ),
+        "indexed_verify_unknown_us": _time_us(verify_api_key, "mph_unknown", repeat=args.repeat),
+    }
+    PROJECT_API_KEYS.clear()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Throughput vs added latency of BatchingOCREngine.
+
+Simulates a batch-capable engine whose cost per call is a fixed overhead plus a
+per-page cost, then drives it with N concurrent single-page clients in a closed loop
+for each (max_batch_size, max_wait_ms) setting.
+
+Usage: python -m benchmarks.bench_batching [--clients 32] [--duration 2]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Optional
+from app.engines.ocr_engine import OCREngine, PAGE_SEPARATOR
+from app.engines.batching_engine import BatchingOCREngine
+
+
+class FixedCostBatchEngine(OCREngine):
+    """One inference call costs call_ms + page_ms * len(images); calls run serially like a single GPU."""
+
+    def __init__(self, call_ms: float, page_ms: float):
+        self.call_s = call_ms / 1000
+        self.page_s = page_ms / 1000
+        self._device = asyncio.Lock()
+
+    async def run(self, images: List[str], document_type: Optional[str]) -> str:
+        return PAGE_SEPARATOR.join(await self.run_batch(images, document_type))
+
+    async def run_batch(self, images: List[str], document_type: Optional[str]) -> List[str]:
+        async with self._device:
+            await asyncio.sleep(self.call_s + self.page_s * len(images))
+        return ["text"] * len(images)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _drive(engine: OCREngine, clients: int, duration: float) -> dict:
+    latencies: List[float] = []
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await engine.run(["page"], "invoice")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        "pages_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per setting")
+    parser.add_argument("--call-ms", type=float, default=8.0, help="Fixed engine cost per call")
+    parser.add_argument("--page-ms", type=float, default=0.5, help="Engine cost per page")
+    parser.add_argument("--sizes", default="1,4,16,32")
+    parser.add_argument("--waits", default="1,5,10")
+    args = parser.parse_args()
+
+    results = []
+    inner = FixedCostBatchEngine(args.call_ms, args.page_ms)
+    baseline = asyncio.run(_drive(inner, args.clients, args.duration))
+    results.append({"mode": "unbatched", **baseline})
+    for size in (int(s) for s in args.sizes.split(",")):
+        for wait in (float(w) for w in args.waits.split(",")):
+            engine = BatchingOCREngine(FixedCostBatchEngine(args.call_ms, args.page_ms), size, wait)
+            stats = asyncio.run(_drive(engine, args.clients, args.duration))
+            results.append({"mode": "batched", "max_batch_size": size, "max_wait_ms": wait, **stats})
+    print(json.dumps({"clients": args.clients, "call_ms": args.call_ms, "page_ms": args.page_ms,
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Sync vs async API key verification throughput against a real SQLite database.
+
+Sync: SqlApiKeyStore with a fresh Session per call on a thread pool (the old get_db
+path under Starlette's threadpool). Async: AsyncSqlApiKeyStore with a fresh
+AsyncSession per call on the event loop. Each mode runs with the auth cache disabled
+(every verify hits the DB) and enabled.
+
+Usage: python -m benchmarks.bench_db_auth [--requests 2000] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir.name, 'bench.db')}"
+os.environ.setdefault("API_KEY_PEPPER", "bench_pepper")
+
+from app.db.base import Base  # noqa: E402
+from app.db.models.api_key import ProjectApiKeyDB  # noqa: E402,F401
+from app.db.models.auth_revision import AuthRevisionDB  # noqa: E402,F401
+from app.db.session import engine, SessionLocal, AsyncSessionLocal, async_engine  # noqa: E402
+from app.security.auth_cache import auth_cache  # noqa: E402
+from app.stores.sql_api_keys import SqlApiKeyStore  # noqa: E402
+from app.stores.async_sql_api_keys import AsyncSqlApiKeyStore  # noqa: E402
+
+
+def _sync_verify(raw_key: str) -> None:
+    db = SessionLocal()
+    try:
+        assert SqlApiKeyStore(db).verify(raw_key) is not None
+    finally:
+        db.close()
+
+
+def run_sync(raw_keys, requests: int, concurrency: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(_sync_verify, (raw_keys[i % len(raw_keys)] for i in range(requests))))
+    return requests / (time.perf_counter() - start)
+
+
+async def run_async(raw_keys, requests: int, concurrency: int) -> float:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with limit:
+            async with AsyncSessionLocal() as db:
+                assert await AsyncSqlApiKeyStore(db).verify(raw_keys[i % len(raw_keys)]) is not None
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    await async_engine.dispose()
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--keys", type=int, default=200)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    store = SqlApiKeyStore(db)
+    raw_keys = [store.create(f"proj-{i % 10}")[0] for i in range(args.keys)]
+    db.close()
+
+    results = {"requests": args.requests, "concurrency": args.concurrency}
+    cache_size = auth_cache.max_entries
+    for label, max_entries in (("db", 0), ("cached", cache_size)):
+        auth_cache.max_entries = max_entries
+        auth_cache.clear()
+        results[f"sync_{label}_verifies_per_s"] = round(run_sync(raw_keys, args.requests, args.concurrency), 1)
+        auth_cache.clear()
+        results[f"async_{label}_verifies_per_s"] = round(
+            asyncio.run(run_async(raw_keys, args.requests, args.concurrency)), 1
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Per-request middleware overhead: the previous BaseHTTPMiddleware stack vs the fused
+RequestPipelineMiddleware.
+
+Both stacks wrap the same trivial endpoint and are driven by direct ASGI calls (no HTTP
+client or server), so the difference is the middleware cost alone. The endpoint-only
+time is reported as the baseline.
+
+Usage: python -m benchmarks.bench_middleware [--requests 20000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import app.rate_limit_middleware as rate_limit
+from app.context_middleware import ContextMiddleware
+from app.middleware.pipeline import RequestPipelineMiddleware
+from app.middleware.request_id import RequestIDMiddleware
+from app.rate_limit_middleware import RateLimitMiddleware
+from app.request_logging import RequestLoggingMiddleware
+from app.security_headers_middleware import SecurityHeadersMiddleware
+
+CORS_OPTIONS = dict(
+    allow_origins=["http://localhost:3000"],
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["*"],
+)
+
+
+async def version(request):
+    return JSONResponse({"version": "bench"})
+
+
+def build(middleware):
+    return Starlette(routes=[Route("/version", version)], middleware=middleware)
+
+
+STACKS = {
+    "endpoint_only": [],
+    # Same order as the old app.main registration (outermost first)
+    "separate": [
+        Middleware(RequestIDMiddleware),
+        Middleware(SecurityHeadersMiddleware),
+        Middleware(CORSMiddleware, **CORS_OPTIONS),
+        Middleware(ContextMiddleware),
+        Middleware(RequestLoggingMiddleware),
+        Middleware(RateLimitMiddleware),
+    ],
+    "pipeline": [Middleware(RequestPipelineMiddleware, cors_options=CORS_OPTIONS)],
+}
+
+
+def _scope():
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/version",
+        "raw_path": b"/version",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"user-agent", b"bench"),
+            (b"accept", b"*/*"),
+            (b"origin", b"http://localhost:3000"),
+            (b"x-request-id", b"bench-request"),
+            (b"x-project-id", b"proj-1"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+
+
+async def _run(asgi_app, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(200):
+        await asgi_app(_scope(), receive, send)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await asgi_app(_scope(), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    # Keep the rate limiter and log handlers out of the measurement's way
+    rate_limit._RATE_LIMIT = 1 << 62
+    logging.getLogger("request_log").disabled = True
+
+    results = {"requests": args.requests}
+    for name, middleware in STACKS.items():
+        results[f"{name}_us_per_request"] = round(asyncio.run(_run(build(middleware), args.requests)), 2)
+    base = results["endpoint_only_us_per_request"]
+    for name in ("separate", "pipeline"):
+        results[f"{name}_overhead_us"] = round(results[f"{name}_us_per_request"] - base, 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
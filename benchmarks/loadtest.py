@@ -0,0 +1,286 @@
+"""
+End-to-end load test of app.main:app: throughput, tail latency and RSS per scenario.
+
+By default the real app runs in-process behind httpx's ASGI transport, with a temp SQLite
+database, the synthetic OCR engine and rate limits/quotas lifted (except in the
+rate_limit scenario, which installs a small limiter). With --url it drives a running
+server instead (e.g. uvicorn app.main:app); pass --api-key/--project for the key listing
+scenario and --server-pid to report the server's RSS.
+
+Scenarios (closed loop, --concurrency clients for --duration seconds each):
+- ocr_submit: POST /ocr with --pages images of --image-kb decoded bytes, unique per request.
+  In-process, the ASGI transport returns after background tasks, so this includes the job.
+- job_poll: GET of existing jobs
+- key_list: authenticated GET /api/projects/{project_id}/api-keys (auth + keyset page)
+- rate_limit: one client IP over its limit; mostly 429 RATE_LIMIT_EXCEEDED
+- payload_413: an image just over the 10MB per-image cap, rejected before any work
+
+Usage: python -m benchmarks.loadtest [--scenarios ocr_submit,job_poll] [--output results.json]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+SCENARIOS = ("ocr_submit", "job_poll", "key_list", "rate_limit", "payload_413")
+PROJECT_ID = "loadtest"
+PER_IMAGE_CAP = 10 * 1024 * 1024
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Current resident set size from /proc (Linux); None where unavailable."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _image_b64(decoded_kb: float, seed: int) -> str:
+    raw = seed.to_bytes(8, "big") + b"\x00" * max(0, int(decoded_kb * 1024) - 8)
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _images_json(pages: int, image_kb: float, seed: int) -> bytes:
+    return json.dumps([_image_b64(image_kb, seed * 1000 + i) for i in range(pages)]).encode()
+
+
+def _ocr_body(images_json: bytes, document_type: str) -> bytes:
+    return b'{"images": ' + images_json + b', "document_type": "' + document_type.encode() + b'"}'
+
+
+def _setup_in_process(args):
+    """Environment for the in-process app; must run before app.main is imported."""
+    tmpdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'loadtest.db')}"
+    os.environ.setdefault("API_KEY_PEPPER", "loadtest_pepper")
+    os.environ.setdefault("OCR_ENGINE", "synthetic")
+    os.environ.setdefault("SYNTHETIC_OCR_LATENCY_MS", str(args.engine_ms))
+    os.environ.setdefault("SYNTHETIC_OCR_CPU_MS", "1")
+    for name in ("RATE_LIMIT_IP_PER_MINUTE", "RATE_LIMIT_KEY_PER_MINUTE", "RATE_LIMIT_PROJECT_PER_MINUTE",
+                 "OCR_QUOTA_PAGES_PER_MINUTE", "OCR_QUOTA_PAGES_PER_DAY",
+                 "OCR_QUOTA_BYTES_PER_MINUTE", "OCR_QUOTA_BYTES_PER_DAY"):
+        os.environ.setdefault(name, "0")
+    os.environ.setdefault("REQUEST_LOG_SAMPLE_RATE", "0")
+
+    from app.db.base import Base
+    from app.db.models.api_key import ProjectApiKeyDB  # noqa: F401
+    from app.db.models.auth_revision import AuthRevisionDB  # noqa: F401
+    from app.db.models.usage_rollup import UsageRollupDB  # noqa: F401
+    from app.db.session import engine, SessionLocal
+    from app.stores.sql_api_keys import SqlApiKeyStore
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        store = SqlApiKeyStore(db)
+        raw_key = store.create(PROJECT_ID, name="loadtest")[0]
+        # A realistically sized key listing
+        store.bulk_create(PROJECT_ID, args.keys - 1, name="filler")
+    finally:
+        db.close()
+    return raw_key
+
+
+def _limit_rate(enabled: bool) -> None:
+    import app.services.rate_limiter as rate_limiter
+    from app.services.rate_limiter import BucketLimit, MemoryBucketStore, RateLimiter
+    if enabled:
+        # 10 requests/s per IP with a burst of 20: saturated within the first few milliseconds
+        rate_limiter._limiter = RateLimiter(MemoryBucketStore(1000, 600), BucketLimit(rate=10, burst=20), None, None)
+    else:
+        rate_limiter._limiter = None
+
+
+async def _run_scenario(
+    client,
+    make_request: Callable[[int], tuple],
+    concurrency: int,
+    duration: float,
+    expected: set
+) -> Dict[str, object]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    deadline = time.perf_counter() + duration
+    counter = iter(range(10 ** 12))
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            method, url, kwargs = make_request(next(counter))
+            start = time.perf_counter()
+            try:
+                res = await client.request(method, url, **kwargs)
+                statuses[str(res.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        return {"requests": 0}
+    return {
+        "requests": len(latencies),
+        "unexpected": sum(n for status, n in statuses.items() if status not in expected),
+        "statuses": dict(statuses),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def _main(args) -> dict:
+    import httpx
+
+    in_process = args.url is None
+    raw_key = args.api_key
+    if in_process:
+        raw_key = _setup_in_process(args)
+        from app.main import app
+        transport = httpx.ASGITransport(app=app, client=("10.0.0.1", 50000))
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60, limits=httpx.Limits(max_connections=args.concurrency))
+
+    project = args.project
+    ocr_url = f"/v1/projects/{project}/ocr"
+    json_headers = {"content-type": "application/json"}
+    # Bodies are built up front so the load generator does not compete with the app for CPU
+    ocr_images = [_images_json(args.pages, args.image_kb, seed) for seed in range(args.distinct_bodies)]
+    oversized = json.dumps({"images": [_image_b64(PER_IMAGE_CAP / 1024 + 1, 0)]}).encode()
+
+    job_ids: List[str] = []
+    for images_json in ocr_images[:16]:
+        res = await client.post(ocr_url, content=_ocr_body(images_json, "invoice"), headers=json_headers)
+        if res.status_code == 202:
+            job_ids.append(res.json()["job_id"])
+
+    run_id = time.time_ns()
+    scenarios = {
+        "ocr_submit": (
+            # The request hash covers images and document_type: a unique type keeps every submission a cache miss
+            lambda i: ("POST", ocr_url, {
+                "content": _ocr_body(ocr_images[i % len(ocr_images)], f"invoice-{run_id}-{i}"),
+                "headers": json_headers,
+            }),
+            {"202"},
+        ),
+        "job_poll": (
+            lambda i: ("GET", f"/v1/projects/{project}/jobs/{job_ids[i % len(job_ids)]}", {}),
+            {"200"},
+        ),
+        "key_list": (
+            lambda i: ("GET", f"/api/projects/{project}/api-keys", {"headers": {"authorization": f"Bearer {raw_key}"}}),
+            {"200"},
+        ),
+        "rate_limit": (
+            lambda i: ("GET", "/version", {}),
+            {"200", "429"},
+        ),
+        "payload_413": (
+            lambda i: ("POST", ocr_url, {"content": oversized, "headers": json_headers}),
+            {"413"},
+        ),
+    }
+
+    results = {}
+    for name in args.scenarios:
+        if name == "job_poll" and not job_ids:
+            results[name] = {"skipped": "no jobs could be created"}
+            continue
+        if name == "key_list" and not raw_key:
+            results[name] = {"skipped": "needs --api-key when using --url"}
+            continue
+        if in_process:
+            _limit_rate(name == "rate_limit")
+        make_request, expected = scenarios[name]
+        stats = await _run_scenario(client, make_request, args.concurrency, args.duration, expected)
+        stats["rss_mb"] = _rss_mb(args.server_pid if not in_process else None)
+        if in_process:
+            stats["peak_rss_mb"] = _peak_rss_mb()
+        results[name] = stats
+        print(f"{name}: {stats.get('throughput_rps')} rps, p99 {stats.get('p99_ms')} ms", file=sys.stderr)
+    await client.aclose()
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario")
+    parser.add_argument("--pages", type=int, default=3, help="Images per OCR submission")
+    parser.add_argument("--image-kb", type=float, default=400, help="Decoded size of each image")
+    parser.add_argument("--distinct-bodies", type=int, default=32)
+    parser.add_argument("--engine-ms", type=float, default=20, help="Synthetic engine latency (in-process)")
+    parser.add_argument("--keys", type=int, default=50, help="API keys in the listed project (in-process)")
+    parser.add_argument("--url", help="Drive a running server instead of the in-process app")
+    parser.add_argument("--api-key", help="API key of --project for key_list with --url")
+    parser.add_argument("--project", default=PROJECT_ID)
+    parser.add_argument("--server-pid", type=int, help="Report this process's RSS with --url")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.url is None and args.project != PROJECT_ID:
+        parser.error("--project only applies with --url")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": "in-process" if args.url is None else args.url,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "pages": args.pages,
+            "image_kb": args.image_kb,
+        },
+        "scenarios": asyncio.run(_main(args)),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Micro-benchmarks of the per-request hot path, with stored baselines and a regression check.
+
+Cases: b64_decoded_size / estimate_base64_decoded_bytes on 1KB-13MB strings,
+OCRService.compute_request_hash, hash_api_key and verify_api_key with many keys,
+OCRRequest parsing + validation of 10 large images, and each RequestPipelineMiddleware
+layer (cumulative stacks over a trivial endpoint driven by direct ASGI calls; the
+per-layer cost is the difference to the previous stack).
+
+Every case is timed as --samples samples of enough calls to last --min-time seconds each,
+taken round-robin over the cases with GC off while timing; a sample is the mean time per
+call. compare runs a one-sided
+Mann-Whitney U test per case and flags a slowdown when the current samples are
+significantly slower (p < --alpha) AND the median moved by more than --threshold. When
+compare runs the suite itself, flagged cases are measured again and only slowdowns seen
+both times count; it exits with status 1 if any case regressed. Baselines are
+machine-specific: refresh them on the machine that runs the comparison.
+
+Usage:
+  python -m benchmarks.micro run [--filter b64] [--output results.json]
+  python -m benchmarks.micro run --output benchmarks/baselines/micro.json   # new baseline
+  python -m benchmarks.micro compare [results.json] [--baseline benchmarks/baselines/micro.json]
+"""
+import argparse
+import asyncio
+import base64
+import gc
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("API_KEY_PEPPER", "bench_pepper")
+os.environ.setdefault("OCR_ENGINE", "synthetic")
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+B64_SIZES = {"1kb": 1024, "64kb": 64 * 1024, "1mb": 1024 * 1024, "13mb": 13 * 1024 * 1024}
+
+# A case returns run(n) -> seconds taken by n calls
+Case = Callable[[int], float]
+
+
+def _b64_string(length: int) -> str:
+    raw = os.urandom(length * 3 // 4)
+    return base64.b64encode(raw).decode("ascii")[:length]
+
+
+def _timed(fn: Callable[[], object]) -> Case:
+    def run(n: int) -> float:
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return time.perf_counter() - start
+    return run
+
+
+def b64_cases() -> Dict[str, Case]:
+    from app.main import b64_decoded_size
+    from app.utils.base64_size import estimate_base64_decoded_bytes
+    cases = {}
+    for label, length in B64_SIZES.items():
+        value = _b64_string(length)
+        cases[f"b64_decoded_size.{label}"] = _timed(lambda v=value: b64_decoded_size(v))
+        cases[f"estimate_base64_decoded_bytes.{label}"] = _timed(lambda v=value: estimate_base64_decoded_bytes(v))
+    return cases
+
+
+def _ocr_body(images: int, image_bytes: int) -> bytes:
+    return json.dumps({
+        "images": [base64.b64encode(os.urandom(image_bytes)).decode("ascii") for _ in range(images)],
+        "document_type": "invoice",
+    }).encode()
+
+
+def ocr_request_cases() -> Dict[str, Case]:
+    from app.schemas.ocr import OCRRequest
+    from app.services.ocr_service import OCRService
+    body = _ocr_body(10, 1024 * 1024)
+    request = OCRRequest.model_validate_json(body)
+    service = OCRService()
+    return {
+        # FastAPI parses the JSON body, then validates the dict
+        "ocr_request.validate_10x1mb": _timed(lambda: OCRRequest.model_validate(json.loads(body))),
+        "ocr_service.compute_request_hash_10x1mb": _timed(lambda: service.compute_request_hash(request)),
+    }
+
+
+def api_key_cases(keys: int) -> Dict[str, Case]:
+    from app.schemas.api_key import PROJECT_API_KEYS
+    from app.security.api_keys import generate_api_key, hash_api_key, store_api_key, verify_api_key
+    PROJECT_API_KEYS.clear()
+    raw_keys = [generate_api_key() for _ in range(keys)]
+    for i, raw in enumerate(raw_keys):
+        store_api_key(f"proj-{i % 1000}", raw)
+    target = raw_keys[-1]
+    return {
+        "hash_api_key": _timed(lambda: hash_api_key(target)),
+        f"verify_api_key.{keys}_keys": _timed(lambda: verify_api_key(target)),
+        f"verify_api_key.{keys}_keys_unknown": _timed(lambda: verify_api_key("mph_unknown")),
+    }
+
+
+class _NullExporter:
+    def put(self, line: str) -> None:
+        pass
+
+
+def middleware_cases() -> Dict[str, Case]:
+    from starlette.applications import Starlette
+    from starlette.middleware import Middleware
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+    from app.middleware.log_sampling import RequestLogSampler
+    from app.middleware.pipeline import RequestPipelineMiddleware
+    from app.services.rate_limiter import BucketLimit, MemoryBucketStore, RateLimiter
+    from app.tracing import Tracer
+
+    async def version(request):
+        return JSONResponse({"version": "bench"})
+
+    # Request log lines are built and emitted, but not written anywhere
+    request_log = logging.getLogger("request_log")
+    request_log.handlers = [logging.NullHandler()]
+    request_log.propagate = False
+    request_log.setLevel(logging.INFO)
+
+    unlimited = RateLimiter(MemoryBucketStore(1000, 600), None, None, None)
+    never_log = RequestLogSampler([], default_rate=0.0, slow_ms=float("inf"))
+    always_log = RequestLogSampler([], default_rate=1.0, slow_ms=float("inf"))
+    cors = dict(allow_origins=["http://localhost:3000"], allow_credentials=True, allow_methods=["GET"], allow_headers=["*"])
+    # Cumulative: each stack adds one layer to the previous one
+    layers = [
+        ("pipeline", dict(limiter=unlimited, sampler=never_log, server_timing=False)),
+        ("cors", dict(cors_options=cors)),
+        ("rate_limit", dict(limiter=RateLimiter(MemoryBucketStore(1000, 600), *[BucketLimit(1e12, 1e12)] * 3))),
+        ("request_log", dict(sampler=always_log)),
+        ("server_timing", dict(server_timing=True)),
+        ("tracing", dict(tracer=Tracer(_NullExporter(), 1.0))),
+    ]
+    stacks = {"middleware.endpoint": []}
+    options: Dict[str, object] = {}
+    for name, extra in layers:
+        options = {**options, **extra}
+        stacks[f"middleware.+{name}"] = [Middleware(RequestPipelineMiddleware, **options)]
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/version",
+        "raw_path": b"/version",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"origin", b"http://localhost:3000"),
+            (b"authorization", b"Bearer mph_bench"),
+            (b"x-request-id", b"bench-request"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def drive(asgi_app, n: int) -> float:
+        start = time.perf_counter()
+        for _ in range(n):
+            await asgi_app(dict(scope), receive, send)
+        return time.perf_counter() - start
+
+    loop = asyncio.new_event_loop()
+    cases = {}
+    for name, middleware in stacks.items():
+        asgi_app = Starlette(routes=[Route("/version", version)], middleware=middleware)
+        cases[name] = lambda n, a=asgi_app: loop.run_until_complete(drive(a, n))
+    return cases
+
+
+def collect_cases(keys: int) -> Dict[str, Case]:
+    cases = {}
+    cases.update(b64_cases())
+    cases.update(ocr_request_cases())
+    cases.update(api_key_cases(keys))
+    cases.update(middleware_cases())
+    return cases
+
+
+def calibrate(run: Case, min_time: float) -> int:
+    """Calls per sample so that one sample lasts at least min_time."""
+    run(1)
+    n = 1
+    while True:
+        elapsed = run(n)
+        if elapsed >= min_time:
+            return n
+        n = max(n + 1, int(n * min_time / max(elapsed, 1e-9) * 1.1))
+
+
+def measure(cases: Dict[str, Case], samples: int, min_time: float) -> Dict[str, List[float]]:
+    """
+    Per-call times in microseconds, samples per case. Samples are taken round-robin over
+    the cases, so CPU frequency or noisy-neighbour drift hits every case alike.
+    """
+    calls = {name: calibrate(run, min_time) for name, run in cases.items()}
+    times: Dict[str, List[float]] = {name: [] for name in cases}
+    gc_was_enabled = gc.isenabled()
+    try:
+        for _ in range(samples):
+            for name, run in cases.items():
+                gc.collect()
+                gc.disable()
+                times[name].append(run(calls[name]) / calls[name] * 1e6)
+                if gc_was_enabled:
+                    gc.enable()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return times
+
+
+def _summary(times: List[float]) -> Dict[str, object]:
+    q1, median, q3 = statistics.quantiles(times, n=4) if len(times) > 1 else (times[0],) * 3
+    return {
+        "median_us": round(median, 4),
+        "iqr_us": round(q3 - q1, 4),
+        "min_us": round(min(times), 4),
+        "samples_us": [round(t, 4) for t in times],
+    }
+
+
+def _layer_costs(results: Dict[str, dict]) -> Dict[str, float]:
+    costs = {}
+    previous = results.get("middleware.endpoint")
+    for name, result in results.items():
+        if name.startswith("middleware.+") and previous is not None:
+            costs[name[len("middleware.+"):]] = round(result["median_us"] - previous["median_us"], 2)
+        if name.startswith("middleware."):
+            previous = result
+    return costs
+
+
+def run_suite(args, names: Optional[List[str]] = None) -> dict:
+    cases = {
+        name: run for name, run in collect_cases(args.keys).items()
+        if (not args.filter or args.filter in name) and (names is None or name in names)
+    }
+    results = {}
+    for name, times in measure(cases, args.samples, args.min_time).items():
+        results[name] = _summary(times)
+        print(f"{name}: {results[name]['median_us']} us", file=sys.stderr)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "samples": args.samples,
+            "min_time_s": args.min_time,
+        },
+        "cases": results,
+    }
+    layers = _layer_costs(results)
+    if layers:
+        report["middleware_layer_us"] = layers
+    return report
+
+
+def mann_whitney_greater(current: List[float], baseline: List[float]) -> float:
+    """
+    One-sided p-value for "current tends to be larger than baseline" (normal approximation
+    with tie correction; adequate from ~10 samples per side).
+    """
+    n1, n2 = len(current), len(baseline)
+    ranked = sorted([(v, 0) for v in current] + [(v, 1) for v in baseline])
+    ranks = [0.0] * len(ranked)
+    tie_term = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+    r1 = sum(rank for rank, (_, group) in zip(ranks, ranked) if group == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u1 - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(baseline: dict, current: dict, alpha: float, threshold: float) -> dict:
+    cases = {}
+    for name, result in current["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            cases[name] = {"status": "new", "median_us": result["median_us"]}
+            continue
+        ratio = result["median_us"] / base["median_us"] if base["median_us"] else float("inf")
+        p_slower = mann_whitney_greater(result["samples_us"], base["samples_us"])
+        p_faster = mann_whitney_greater(base["samples_us"], result["samples_us"])
+        if p_slower < alpha and ratio > 1 + threshold:
+            status = "slower"
+        elif p_faster < alpha and ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "unchanged"
+        cases[name] = {
+            "status": status,
+            "baseline_median_us": base["median_us"],
+            "median_us": result["median_us"],
+            "ratio": round(ratio, 3),
+            "p_value": round(p_slower if ratio >= 1 else p_faster, 6),
+        }
+    report = {
+        "baseline": baseline.get("meta", {}),
+        "current": current.get("meta", {}),
+        "alpha": alpha,
+        "threshold": threshold,
+        "regressions": sorted(name for name, case in cases.items() if case["status"] == "slower"),
+        "cases": cases,
+    }
+    base_meta, meta = baseline.get("meta", {}), current.get("meta", {})
+    if (base_meta.get("python"), base_meta.get("machine")) != (meta.get("python"), meta.get("machine")):
+        report["warning"] = "Baseline was recorded with a different Python version or machine; refresh it before trusting the result"
+    return report
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command in ("run", "compare"):
+        sub = commands.add_parser(command)
+        sub.add_argument("--filter", help="Only cases whose name contains this")
+        sub.add_argument("--samples", type=int, default=20)
+        sub.add_argument("--min-time", type=float, default=0.02, help="Seconds per sample")
+        sub.add_argument("--keys", type=int, default=50_000, help="Keys loaded for verify_api_key")
+        sub.add_argument("--output", help="Also write the JSON report to this file")
+        if command == "compare":
+            sub.add_argument("current", nargs="?", help="Results of a previous run (default: run the suite now)")
+            sub.add_argument("--baseline", default=DEFAULT_BASELINE)
+            sub.add_argument("--alpha", type=float, default=0.01, help="Significance level of the slowdown test")
+            sub.add_argument("--threshold", type=float, default=0.10, help="Minimum relative change of the median")
+            sub.add_argument("--no-confirm", dest="confirm", action="store_false", help="Do not re-measure flagged cases")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run_suite(args)
+        exit_code = 0
+    else:
+        baseline = _load(args.baseline)
+        current = _load(args.current) if args.current else run_suite(args)
+        report = compare(baseline, current, args.alpha, args.threshold)
+        if report["regressions"] and not args.current and args.confirm:
+            # Shared and laptop CPUs drift for seconds at a time: a slowdown only counts if a
+            # second measurement of the case shows it too
+            recheck = compare(baseline, run_suite(args, report["regressions"]), args.alpha, args.threshold)
+            for name, case in recheck["cases"].items():
+                if case["status"] != "slower":
+                    report["cases"][name]["status"] = "unconfirmed"
+                    report["cases"][name]["recheck"] = case
+            report["regressions"] = [name for name in report["regressions"] if report["cases"][name]["status"] == "slower"]
+        exit_code = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
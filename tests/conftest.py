@@ -25,15 +25,25 @@ def _setup_test_db():
     tmpdir.cleanup()
 
 
-# In-memory API key store for tests (logic unchanged)
+# In-memory API key store for tests (same async interface as AsyncSqlApiKeyStore)
 class InMemoryApiKeyStore:
-    def create(self, project_id, name=None):
+    async def create(self, project_id, name=None):
         raw_key = generate_api_key()
         api_key = store_api_key(project_id, raw_key, name=name)
         return raw_key, api_key
-    def list(self, project_id):
+    async def list(self, project_id):
         return [k for k in PROJECT_API_KEYS.values() if k.project_id == project_id]
-    def revoke(self, project_id, key_id):
+    async def list_page(self, project_id, limit=None, cursor=None, active_only=False):
+        from app.stores.api_key_common import decode_list_cursor, page_from_rows
+        keys = [k for k in PROJECT_API_KEYS.values() if k.project_id == project_id]
+        if active_only:
+            keys = [k for k in keys if k.revoked_at is None]
+        keys.sort(key=lambda k: (k.created_at, k.id), reverse=True)
+        if cursor:
+            after = decode_list_cursor(cursor)
+            keys = [k for k in keys if (k.created_at, k.id) < after]
+        return page_from_rows(keys if limit is None else keys[:limit + 1], limit)
+    async def revoke(self, project_id, key_id):
         key = PROJECT_API_KEYS.get(key_id)
         if not key or key.project_id != project_id:
             return None
@@ -41,7 +51,14 @@ class InMemoryApiKeyStore:
             from datetime import datetime
             key.revoked_at = datetime.utcnow()
         return key
-    def verify(self, raw_key):
+    async def bulk_create(self, project_id, count, name=None):
+        return [await self.create(project_id, name) for _ in range(count)]
+    async def rotate_all(self, project_id):
+        active = [k for k in PROJECT_API_KEYS.values() if k.project_id == project_id and k.revoked_at is None]
+        for key in active:
+            await self.revoke(project_id, key.id)
+        return len(active), [await self.create(project_id, key.name) for key in active]
+    async def verify(self, raw_key):
         from app.security.api_keys import verify_api_key
         return verify_api_key(raw_key)
 
@@ -62,9 +79,9 @@ def _tripwire_sql_api_key_store(*args, **kwargs):
 def override_api_key_store(monkeypatch):
     import app.stores.sql_api_keys
     import app.deps.stores
-    # Patch SqlApiKeyStore.__init__ in both modules to fail if constructed
+    # Patch the SQL store constructors to fail if called
     monkeypatch.setattr(app.stores.sql_api_keys.SqlApiKeyStore, "__init__", lambda self, *a, **kw: pytest.fail("SqlApiKeyStore should not be constructed during tests. Use in-memory store only."))
-    monkeypatch.setattr(app.deps.stores.SqlApiKeyStore, "__init__", lambda self, *a, **kw: pytest.fail("SqlApiKeyStore should not be constructed during tests. Use in-memory store only."))
+    monkeypatch.setattr(app.deps.stores.AsyncSqlApiKeyStore, "__init__", lambda self, *a, **kw: pytest.fail("AsyncSqlApiKeyStore should not be constructed during tests. Use in-memory store only."))
     PROJECT_API_KEYS.clear()
     store = InMemoryApiKeyStore()
     fastapi_app.dependency_overrides[get_api_key_store] = lambda: store
@@ -72,6 +89,14 @@ def override_api_key_store(monkeypatch):
     PROJECT_API_KEYS.clear()
     fastapi_app.dependency_overrides.pop(get_api_key_store, None)
 
+@pytest.fixture(autouse=True)
+def fresh_rate_limits(monkeypatch):
+    # Each test starts with full buckets instead of sharing one per-IP budget across the session
+    import app.services.rate_limiter as rate_limiter
+    import app.services.quota as quota
+    monkeypatch.setattr(rate_limiter, "_limiter", rate_limiter.build_rate_limiter())
+    monkeypatch.setattr(quota, "_quota", quota.build_cost_quota())
+
 # Provide create_project_and_key fixture globally for all tests
 @pytest.fixture
 def create_project_and_key():
@@ -107,3 +107,74 @@ def test_last_used_at_updates(client, create_project_and_key):
     for k in items:
         if k["api_key_id"] == info["api_key_id"]:
             assert k["last_used_at"] is not None
+
+def test_registry_indexes_track_mutations():
+    from app.security.api_keys import verify_api_key, verify_api_key_allow_revoked
+    raw_a, raw_b = generate_api_key(), generate_api_key()
+    a = store_api_key("projA", raw_a)
+    b = store_api_key("projB", raw_b)
+    assert PROJECT_API_KEYS.find_by_hash(a.key_hash) is a
+    assert PROJECT_API_KEYS.find_by_project_hash("projB", b.key_hash) is b
+    assert PROJECT_API_KEYS.find_by_project_hash("projA", b.key_hash) is None
+    assert verify_api_key(raw_a) is a
+    assert verify_api_key_allow_revoked(raw_b, "projA") is None
+    a.revoked_at = datetime.utcnow()
+    assert verify_api_key(raw_a) is None
+    assert verify_api_key_allow_revoked(raw_a, "projA") is a
+    del PROJECT_API_KEYS[b.id]
+    assert verify_api_key(raw_b) is None
+    PROJECT_API_KEYS.clear()
+    assert PROJECT_API_KEYS.find_by_hash(a.key_hash) is None
+
+def test_bulk_create_and_rotate(client, create_project_and_key, monkeypatch):
+    info = create_project_and_key(name="ci")
+    base = f"/api/projects/{info['project_id']}/api-keys"
+    resp = client.post(f"{base}/bulk", json={"count": 3, "name": "batch"}, headers=auth_headers(info["api_key"]))
+    assert resp.status_code == 200
+    items = resp.json()["items"]
+    assert len(items) == 3 and len({i["api_key"] for i in items}) == 3
+    assert all(i["name"] == "batch" for i in items)
+
+    from app import config
+    monkeypatch.setattr(config, "API_KEY_BULK_MAX", 2)
+    resp = client.post(f"{base}/bulk", json={"count": 3}, headers=auth_headers(info["api_key"]))
+    assert resp.status_code == 400
+    assert resp.json()["error_code"] == "BULK_LIMIT_EXCEEDED"
+
+    resp = client.post(f"{base}/rotate", headers=auth_headers(info["api_key"]))
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["revoked_count"] == 4
+    assert sorted(i["name"] for i in body["items"]) == ["batch", "batch", "batch", "ci"]
+    # The caller's own key was rotated too; the replacements work
+    assert client.get(base, headers=auth_headers(info["api_key"])).status_code == 401
+    assert client.get(base, headers=auth_headers(body["items"][0]["api_key"])).status_code == 200
+
+def test_list_keyset_pagination_and_active_only(client, create_project_and_key):
+    info = create_project_and_key()
+    base = f"/api/projects/{info['project_id']}/api-keys"
+    client.post(f"{base}/bulk", json={"count": 4}, headers=auth_headers(info["api_key"]))
+    first = next(iter(PROJECT_API_KEYS.values()))
+    # Revoke one key other than the caller's
+    revoked_id = next(k.id for k in PROJECT_API_KEYS.values() if k.id != info["api_key_id"])
+    client.post(f"{base}/{revoked_id}/revoke", headers=auth_headers(info["api_key"]))
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get(base, params=params, headers=auth_headers(info["api_key"])).json()
+        assert len(body["items"]) <= 2
+        seen += [k["api_key_id"] for k in body["items"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 5
+    assert first.id in seen
+
+    active = client.get(base, params={"active_only": "true"}, headers=auth_headers(info["api_key"])).json()
+    assert len(active["items"]) == 4 and revoked_id not in [k["api_key_id"] for k in active["items"]]
+    assert active["next_cursor"] is None
+
+    resp = client.get(base, params={"cursor": "not-a-cursor"}, headers=auth_headers(info["api_key"]))
+    assert resp.status_code == 400
+    assert resp.json()["error_code"] == "INVALID_CURSOR"
@@ -0,0 +1,273 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.schemas.api_key import ProjectApiKey
+from app.security.auth_cache import VerifiedKeyCache, MISS, auth_cache
+from app.stores.sql_api_keys import SqlApiKeyStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _record(key_id="k1"):
+    return ProjectApiKey(id=key_id, project_id="p", key_prefix="mph_abcd", key_hash="h", key_fingerprint="f")
+
+
+def test_positive_and_negative_entries_expire_independently():
+    clock = FakeClock()
+    cache = VerifiedKeyCache(ttl_seconds=30, negative_ttl_seconds=5, max_entries=10, clock=clock)
+    rec = _record()
+    cache.put("good", rec)
+    cache.put("bad", None)
+    assert cache.get("good") is rec
+    assert cache.get("bad") is None
+    clock.now += 6
+    assert cache.get("bad") is MISS
+    assert cache.get("good") is rec
+    clock.now += 25
+    assert cache.get("good") is MISS
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_capacity_is_bounded_lru():
+    cache = VerifiedKeyCache(ttl_seconds=30, negative_ttl_seconds=5, max_entries=2, clock=FakeClock())
+    cache.put("a", None)
+    cache.put("b", None)
+    cache.get("a")
+    cache.put("c", None)
+    assert len(cache) == 2
+    assert cache.get("b") is MISS
+    assert cache.get("a") is None
+
+
+def test_invalidate_and_disabled_cache():
+    cache = VerifiedKeyCache(ttl_seconds=30, negative_ttl_seconds=5, max_entries=10, clock=FakeClock())
+    cache.put("a", _record())
+    cache.invalidate("a")
+    assert cache.get("a") is MISS
+    disabled = VerifiedKeyCache(ttl_seconds=30, negative_ttl_seconds=5, max_entries=0)
+    disabled.put("a", _record())
+    assert disabled.get("a") is MISS
+
+
+@pytest.fixture
+def sql_store():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db = sessionmaker(bind=engine)()
+    # Bypass the conftest tripwire on __init__: this test targets the SQL store directly
+    store = SqlApiKeyStore.__new__(SqlApiKeyStore)
+    store.db = db
+    store.statements = statements
+    auth_cache.clear()
+    yield store
+    auth_cache.clear()
+    db.close()
+
+
+def test_sql_verify_hits_cache_without_db(sql_store):
+    raw_key, rec = sql_store.create("proj", "ci")
+    assert sql_store.verify(raw_key).id == rec.id
+    sql_store.statements.clear()
+    assert sql_store.verify(raw_key).id == rec.id
+    assert sql_store.verify("mph_not_a_key") is None
+    assert sql_store.verify("mph_not_a_key") is None
+    # One lookup for the unknown key, then served from the negative cache
+    assert len(sql_store.statements) == 1
+
+
+def test_sql_revoke_invalidates_cached_key(sql_store):
+    raw_key, rec = sql_store.create("proj")
+    assert sql_store.verify(raw_key) is not None
+    sql_store.revoke("proj", rec.id)
+    assert sql_store.verify(raw_key) is None
+
+
+def test_last_used_is_coarsened_and_deduped():
+    from datetime import datetime
+    from app.security.last_used import LastUsedRecorder
+    now = [datetime(2026, 1, 1, 12, 0, 5)]
+    recorder = LastUsedRecorder(granularity_seconds=60, clock=lambda: now[0])
+    recorder.record("k1")
+    recorder.record("k1")
+    recorder.record("k2")
+    assert recorder.drain() == {"k1": datetime(2026, 1, 1, 12, 0), "k2": datetime(2026, 1, 1, 12, 0)}
+    recorder.record("k1")
+    assert recorder.pending_count() == 0
+    now[0] = datetime(2026, 1, 1, 12, 1, 30)
+    recorder.record("k1")
+    assert recorder.drain() == {"k1": datetime(2026, 1, 1, 12, 1)}
+
+
+def test_last_used_flush_is_one_batched_update(sql_store, monkeypatch):
+    from app.security.last_used import LastUsedRecorder
+    recorder = LastUsedRecorder(granularity_seconds=60)
+    monkeypatch.setattr("app.stores.api_key_common.last_used_recorder", recorder)
+    keys = [sql_store.create("proj") for _ in range(3)]
+    for raw_key, _ in keys:
+        sql_store.verify(raw_key)
+    assert all(k.last_used_at is None for k in sql_store.list("proj"))
+    sql_store.statements.clear()
+    assert recorder.flush(sql_store.db) == 3
+    assert sum(s.lstrip().upper().startswith("UPDATE") for s in sql_store.statements) == 1
+    assert all(k.last_used_at is not None for k in sql_store.list("proj"))
+    assert recorder.flush(sql_store.db) == 0
+
+
+def test_last_used_flush_failure_requeues(sql_store):
+    from app.security.last_used import LastUsedRecorder
+    recorder = LastUsedRecorder(granularity_seconds=60)
+    recorder.record("k1")
+
+    class BrokenSession:
+        def execute(self, *a, **kw):
+            raise RuntimeError("db down")
+
+        def rollback(self):
+            pass
+
+    with pytest.raises(RuntimeError):
+        recorder.flush(BrokenSession())
+    assert recorder.pending_count() == 1
+
+
+def test_revoke_on_other_worker_propagates_within_poll_interval(sql_store, monkeypatch):
+    from app.security.auth_revision import RevisionWatcher
+    import app.stores.api_key_common as common_module
+    import app.stores.sql_api_keys as sql_module
+    clock = FakeClock()
+    # Worker B: its own cache and watcher, sharing the DB with worker A (sql_store)
+    cache_b = VerifiedKeyCache(ttl_seconds=300, negative_ttl_seconds=5, max_entries=100, clock=clock)
+    watcher_b = RevisionWatcher(cache_b, poll_seconds=2, clock=clock)
+    raw_key, rec = sql_store.create("proj")
+
+    def verify_on_b():
+        monkeypatch.setattr(sql_module, "auth_cache", cache_b)
+        monkeypatch.setattr(common_module, "auth_cache", cache_b)
+        monkeypatch.setattr(sql_module, "revision_watcher", watcher_b)
+        try:
+            return sql_store.verify(raw_key)
+        finally:
+            monkeypatch.undo()
+
+    assert verify_on_b() is not None
+    # Worker A revokes; its own cache is invalidated directly
+    sql_store.revoke("proj", rec.id)
+    assert sql_store.verify(raw_key) is None
+    # Worker B still serves its cached entry until its next poll...
+    sql_store.statements.clear()
+    assert verify_on_b() is not None
+    assert sql_store.statements == []
+    # ...and drops it once the poll interval has passed
+    clock.now += 2
+    assert verify_on_b() is None
+
+
+def test_watcher_polls_once_per_interval():
+    from app.security.auth_revision import RevisionWatcher
+    clock = FakeClock()
+    cache = VerifiedKeyCache(ttl_seconds=30, negative_ttl_seconds=5, max_entries=10, clock=clock)
+    watcher = RevisionWatcher(cache, poll_seconds=2, clock=clock)
+    assert watcher.claim_poll() is True
+    assert watcher.claim_poll() is False
+    watcher.observe(5)
+    cache.put("a", None)
+    watcher.observe(5)
+    assert cache.get("a") is None
+    watcher.observe(6)
+    assert cache.get("a") is MISS
+
+
+def test_async_store_verify_cache_and_revoke():
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.stores.async_sql_api_keys import AsyncSqlApiKeyStore
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            # Bypass the conftest tripwire on __init__: this test targets the SQL store directly
+            store = AsyncSqlApiKeyStore.__new__(AsyncSqlApiKeyStore)
+            store.db = db
+            raw_key, rec = await store.create("proj", "ci")
+            assert (await store.verify(raw_key)).id == rec.id
+            statements.clear()
+            assert (await store.verify(raw_key)).id == rec.id
+            assert statements == []
+            assert [k.id for k in await store.list("proj")] == [rec.id]
+            revoked = await store.revoke("proj", rec.id)
+            assert revoked.revoked_at is not None
+            assert await store.verify(raw_key) is None
+        await engine.dispose()
+
+    auth_cache.clear()
+    try:
+        asyncio.run(main())
+    finally:
+        auth_cache.clear()
+
+
+def test_async_url_mapping():
+    from app.db.session import to_async_url
+    assert to_async_url("sqlite:///./dev.db") == "sqlite+aiosqlite:///./dev.db"
+    assert to_async_url("postgres://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert to_async_url("postgresql+asyncpg://u@h/db") == "postgresql+asyncpg://u@h/db"
+
+
+def test_sql_bulk_create_export_import_rotate(sql_store):
+    created = sql_store.bulk_create("proj", 3, "batch")
+    assert len(created) == 3
+    sql_store.statements.clear()
+    sql_store.bulk_create("proj", 2)
+    # One executemany for the whole batch
+    assert sum(s.lstrip().upper().startswith("INSERT") for s in sql_store.statements) == 1
+    assert sql_store.verify(created[0][0]).id == created[0][1].id
+
+    exported = list(sql_store.export("proj"))
+    assert len(exported) == 5 and all("key_hash" in r for r in exported)
+    assert sql_store.import_hashed(exported) == (0, 5, [])
+    assert sql_store.import_hashed([dict(exported[0], api_key_id=None, project_id="other", key_hash="a" * 64)]) == (1, 0, [])
+    # A new key whose api_key_id is taken is reported, and the rest of the import still lands
+    clashing = dict(exported[1], project_id="other", key_hash="b" * 64)
+    assert sql_store.import_hashed([clashing, dict(clashing, api_key_id=None, key_hash="c" * 64)]) == (1, 0, [exported[1]["api_key_id"]])
+    with pytest.raises(ValueError):
+        sql_store.import_hashed([dict(exported[0], key_hash="nothex")])
+
+    revoked_count, replacements = sql_store.rotate_all("proj")
+    assert revoked_count == 5 and len(replacements) == 5
+    assert sql_store.verify(created[0][0]) is None
+    assert sql_store.verify(replacements[0][0]).project_id == "proj"
+    assert sum(k.revoked_at is None for k in sql_store.list("proj")) == 5
+
+
+def test_sql_list_page_walks_keyset_in_order(sql_store):
+    sql_store.bulk_create("proj", 5)
+    # Same created_at for the whole batch: the id tie-breaker keeps pages disjoint
+    _, revoked = sql_store.create("proj")
+    sql_store.revoke("proj", revoked.id)
+    pages, cursor = [], None
+    while True:
+        keys, cursor = sql_store.list_page("proj", limit=2, cursor=cursor)
+        pages.append(keys)
+        if cursor is None:
+            break
+    flat = [k for page in pages for k in page]
+    assert [len(p) for p in pages] == [2, 2, 2]
+    assert flat == sorted(flat, key=lambda k: (k.created_at, k.id), reverse=True)
+    keys, cursor = sql_store.list_page("proj", limit=10, active_only=True)
+    assert len(keys) == 5 and cursor is None
+    with pytest.raises(ValueError):
+        sql_store.list_page("proj", cursor="garbage")
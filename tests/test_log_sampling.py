@@ -0,0 +1,91 @@
+import json
+import logging
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.middleware.log_sampling import RequestLogSampler, parse_rules, sample_point
+
+
+@pytest.fixture
+def client(override_api_key_store):
+    return TestClient(app)
+
+
+SAMPLER = RequestLogSampler(
+    parse_rules('[{"path": "/health", "rate": 0}, {"method": "get", "path": "/v1/projects/*/jobs/*", "rate": 0.01}]'),
+    default_rate=1.0,
+    slow_ms=500,
+)
+
+
+def test_rules_match_method_and_path_in_order():
+    assert SAMPLER.rate_for("GET", "/health") == 0
+    assert SAMPLER.rate_for("GET", "/v1/projects/p/jobs/j") == 0.01
+    assert SAMPLER.rate_for("POST", "/v1/projects/p/jobs/j") == 1.0
+    assert SAMPLER.rate_for("GET", "/version") == 1.0
+    with pytest.raises(ValueError):
+        parse_rules('[{"path": "/x", "rate": 2}]')
+
+
+def test_path_globs_match_whole_segments():
+    assert SAMPLER.rate_for("GET", "/v1/projects/p/jobs/j/stream") == 1.0
+    rules = parse_rules('[{"path": "/debug/**", "rate": 0}, {"path": "/v?/x", "rate": 0.5}]')
+    sampler = RequestLogSampler(rules)
+    assert sampler.rate_for("GET", "/debug/profile/requests/abc") == 0
+    assert sampler.rate_for("GET", "/v1/x") == 0.5
+    assert sampler.rate_for("GET", "/v/1/x") == 1.0
+
+
+def test_errors_and_slow_requests_are_always_logged():
+    assert SAMPLER.should_log("GET", "/health", 200, 5, "r1") is None
+    assert SAMPLER.should_log("GET", "/health", 404, 5, "r1") == 1.0
+    assert SAMPLER.should_log("GET", "/health", 503, 5, "r1") == 1.0
+    assert SAMPLER.should_log("GET", "/health", 200, 500, "r1") == 1.0
+
+
+def test_sampling_is_deterministic_per_request_id():
+    ids = [f"req-{i}" for i in range(20000)]
+    kept = [i for i in ids if SAMPLER.should_log("GET", "/v1/projects/p/jobs/j", 200, 1, i)]
+    assert 100 <= len(kept) <= 300
+    assert kept == [i for i in ids if SAMPLER.should_log("GET", "/v1/projects/p/jobs/j", 200, 1, i)]
+    assert all(sample_point(i) < 0.01 for i in kept)
+
+
+def test_health_checks_are_not_logged_but_errors_are(client, caplog):
+    caplog.set_level(logging.INFO, logger="request_log")
+    client.get("/health")
+    client.get("/v1/projects/p/jobs/missing")
+    logged = [json.loads(r.msg) for r in caplog.records if r.name == "request_log"]
+    assert [d["path"] for d in logged] == ["/v1/projects/p/jobs/missing"]
+    assert logged[0]["status_code"] == 404 and "sample_rate" not in logged[0]
+
+
+
+def test_fast_request_with_slow_background_task_is_still_sampled(caplog):
+    from starlette.applications import Starlette
+    from starlette.background import BackgroundTask
+    from starlette.middleware import Middleware
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+    from app.middleware.pipeline import RequestPipelineMiddleware
+    from app.services.rate_limiter import MemoryBucketStore, RateLimiter
+
+    async def submit(request):
+        return JSONResponse({"job_id": "j1"}, status_code=202, background=BackgroundTask(time.sleep, 0.3))
+
+    # The job takes 300ms, well over slow_ms, but the 202 goes out right away
+    sampler = RequestLogSampler(parse_rules('[{"method": "POST", "path": "/submit", "rate": 0}]'), slow_ms=100)
+    test_app = Starlette(
+        routes=[Route("/submit", submit, methods=["POST"])],
+        middleware=[Middleware(
+            RequestPipelineMiddleware,
+            limiter=RateLimiter(MemoryBucketStore(100, 600), None, None, None),
+            sampler=sampler,
+            server_timing=False,
+        )],
+    )
+    caplog.set_level(logging.INFO, logger="request_log")
+    with TestClient(test_app) as test_client:
+        assert test_client.post("/submit").status_code == 202
+    assert not [r for r in caplog.records if r.name == "request_log"]
@@ -0,0 +1,75 @@
+import json
+import logging
+import threading
+from app.logging_setup import LogWriter, QueueLogHandler
+
+
+class BlockingStream:
+    """Records writes; the first write waits until released, simulating stdout backpressure."""
+
+    def __init__(self):
+        self.writes = []
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.release.wait(5)
+        self.writes.append(data)
+
+    def flush(self):
+        pass
+
+
+def test_lines_are_batched_and_drops_counted_while_stream_blocks():
+    stream = BlockingStream()
+    writer = LogWriter(lambda: stream, max_queue=5, batch_size=100)
+    writer.put("first")
+    # Give the writer thread time to take "first" and block on the stream
+    for _ in range(100):
+        if writer.stats()["queued"] == 0:
+            break
+        threading.Event().wait(0.01)
+    accepted = [writer.put(f"line-{i}") for i in range(8)]
+    assert accepted == [True] * 5 + [False] * 3
+    stream.release.set()
+    assert writer.flush()
+    assert stream.writes[0] == "first\n"
+    # Everything queued meanwhile goes out in one write, followed by the drop report
+    lines = stream.writes[1].splitlines()
+    assert lines[:5] == [f"line-{i}" for i in range(5)]
+    assert json.loads(lines[5]) == {"level": "WARNING", "event": "log_lines_dropped", "count": 3}
+    assert writer.stats()["dropped"] == 3
+    writer.close()
+
+
+def test_handler_passes_preformatted_lines_through():
+    stream = BlockingStream()
+    stream.release.set()
+    writer = LogWriter(lambda: stream, max_queue=100, batch_size=100)
+    log = logging.getLogger("test_logging_setup")
+    handler = QueueLogHandler(writer)
+    log.addHandler(handler)
+    log.propagate = False
+    try:
+        log.warning('{"already": "json"}', extra={"preformatted": True})
+        log.warning("plain %s", "message")
+    finally:
+        log.removeHandler(handler)
+        log.propagate = True
+    writer.close()
+    lines = "".join(stream.writes).splitlines()
+    assert lines[0] == '{"already": "json"}'
+    rendered = json.loads(lines[1])
+    assert rendered["message"] == "plain message" and rendered["level"] == "WARNING"
+
+
+def test_setup_only_routes_app_loggers_to_the_queue():
+    from app.logging_setup import APP_LOGGERS, setup_logging
+    root = logging.getLogger()
+    root_level = root.level
+    setup_logging()
+    assert not [h for h in root.handlers if isinstance(h, QueueLogHandler)]
+    assert root.level == root_level
+    assert not [h for h in logging.getLogger("httpx").handlers if isinstance(h, QueueLogHandler)]
+    for name in APP_LOGGERS:
+        log = logging.getLogger(name)
+        assert [h for h in log.handlers if isinstance(h, QueueLogHandler)] and not log.propagate
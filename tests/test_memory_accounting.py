@@ -0,0 +1,59 @@
+import base64
+import pytest
+from fastapi.testclient import TestClient
+from app import config, memory_accounting
+from app.main import app
+from app.metrics import STAGE_MEMORY_PEAK
+from app.timing import StageTimings, stage, track_memory, use_timings
+
+PROJECT_ID = "memory"
+
+
+@pytest.fixture
+def accounting():
+    memory_accounting.enable_memory_accounting()
+    yield
+    memory_accounting.disable_memory_accounting()
+
+
+def test_nested_stages_keep_their_own_peaks(accounting):
+    timings = StageTimings()
+    with use_timings(timings):
+        with track_memory("outer"):
+            big = bytearray(4 * 1024 * 1024)
+            del big
+            with stage("inner"):
+                small = bytearray(256 * 1024)
+                del small
+    assert 256 * 1024 <= timings.memory_peaks["inner"] < 4 * 1024 * 1024
+    # The inner stage reset the tracemalloc peak; the outer span still saw the 4MB buffer
+    assert timings.memory_peaks["outer"] >= 4 * 1024 * 1024
+    assert ("inner",) in STAGE_MEMORY_PEAK.values()
+
+
+def test_disabled_accounting_records_nothing():
+    timings = StageTimings()
+    with use_timings(timings):
+        with stage("hash"), track_memory("job"):
+            bytearray(1024)
+    assert timings.memory_peaks == {}
+    assert "hash" in timings.durations
+
+
+def test_job_reports_stage_peaks(accounting, override_api_key_store, monkeypatch):
+    monkeypatch.setattr(config, "SERVER_TIMING_ENABLED", True)
+    client = TestClient(app)
+    image = base64.b64encode(b"\x01" * 2 * 1024 * 1024).decode("ascii")
+    res = client.post(f"/v1/projects/{PROJECT_ID}/ocr", json={"images": [image], "document_type": "memory"})
+    assert res.status_code == 202, res.text
+    job_url = f"/v1/projects/{PROJECT_ID}/jobs/{res.json()['job_id']}"
+    data = client.get(job_url, params={"debug": "true"}).json()
+    peaks = data["memory_peaks"]
+    assert {"hash", "cache_lookup", "engine", "job"} <= set(peaks)
+    # Hashing serializes the base64 images into a new string
+    assert peaks["hash"] >= len(image)
+
+    debug = client.get("/debug/memory", params={"limit": 5}).json()
+    assert debug["enabled"] and debug["traced_bytes"] > 0
+    assert len(debug["top_allocations"]) <= 5
+    assert "tracemalloc_traced_bytes " in client.get("/metrics").text
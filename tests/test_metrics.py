@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.metrics import Registry
+
+
+@pytest.fixture
+def client(override_api_key_store):
+    return TestClient(app)
+
+
+def test_concurrent_updates_are_not_lost():
+    registry = Registry()
+    counter = registry.counter("things", "Things", ("kind",))
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    threads, per_thread = 16, 5000
+
+    def work():
+        for i in range(per_thread):
+            counter.inc(labels=("a",))
+            histogram.observe(0.05 if i % 2 else 0.5)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert counter.values() == {("a",): threads * per_thread}
+    series = histogram.values()[()]
+    assert series[:3] == [threads * per_thread / 2, threads * per_thread / 2, 0]
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    registry.counter("jobs", "Jobs", ("status",)).inc(2, ("ok",))
+    gauge = registry.gauge("in_flight", "In flight")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    registry.histogram("wait_seconds", "Wait", buckets=(1.0,)).observe(0.25)
+
+    @registry.collected("broken", "Raises")
+    def broken():
+        raise RuntimeError("boom")
+
+    text = registry.render()
+    assert '# TYPE jobs_total counter\njobs_total{status="ok"} 2\n' in text
+    assert "in_flight 1\n" in text
+    assert 'wait_seconds_bucket{le="1"} 1\nwait_seconds_bucket{le="+Inf"} 1\n' in text
+    assert "wait_seconds_count 1\nwait_seconds_sum 0.25\n" in text
+    assert "broken" not in text
+    with pytest.raises(ValueError):
+        registry.counter("jobs", "Again")
+
+
+def test_rendered_text_parses_as_typed_families(client):
+    parser = pytest.importorskip("prometheus_client.parser")
+    client.get("/health")
+    families = {f.name: f for f in parser.text_string_to_metric_families(client.get("/metrics").text)}
+    assert "unknown" not in {f.type for f in families.values()}
+    for name in ("http_requests", "rate_limit_rejections", "ocr_cache_lookups", "auth_cache_lookups"):
+        assert families[name].type == "counter"
+    assert any(s.name == "http_requests_total" for s in families["http_requests"].samples)
+    assert families["http_request_duration_seconds"].type == "histogram"
+    assert families["http_requests_in_flight"].type == "gauge"
+
+
+def test_metrics_endpoint_uses_route_templates(client):
+    client.get("/api/projects/proj_metrics/api-keys")
+    client.get("/does-not-exist")
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = res.text
+    assert 'http_requests_total{method="GET",route="/api/projects/{project_id}/api-keys",status="' in text
+    assert 'route="unmatched",status="404"' in text
+    assert "proj_metrics" not in text
+    assert "ocr_job_queue_depth" in text
+    assert 'auth_cache_lookups_total{result="hit"}' in text
+
+
+def test_engine_duration_document_type_label_is_bounded():
+    from app.engines.instrumented_engine import InstrumentedOCREngine
+    from app.engines.ocr_engine import OCREngine
+    from app.metrics import OCR_ENGINE_DURATION
+
+    class EchoEngine(OCREngine):
+        async def run(self, images, document_type):
+            return "+".join(images)
+
+    engine = InstrumentedOCREngine(EchoEngine(), frozenset({"invoice"}))
+    for document_type in ("invoice", None, "invoice-1", "invoice-2", "x" * 200):
+        asyncio.run(engine.run(["a"], document_type))
+    labels = {labels[0] for labels in OCR_ENGINE_DURATION.values()}
+    assert {"invoice", "none", "other"} <= labels
+    assert not labels & {"invoice-1", "invoice-2", "x" * 200}
@@ -0,0 +1,179 @@
+import json
+import logging
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+import app.services.rate_limiter as rate_limiter
+from app.services.rate_limiter import BucketLimit, MemoryBucketStore, RateLimiter
+
+
+@pytest.fixture
+def client(override_api_key_store):
+    return TestClient(app)
+
+
+@pytest.fixture
+def verified_keys():
+    """Puts keys in the auth cache, as if this worker had verified them."""
+    from app.schemas.api_key import ProjectApiKey
+    from app.security.api_keys import hash_api_key
+    from app.security.auth_cache import auth_cache
+    hashes = []
+
+    def _verify(raw_key, project_id):
+        key_hash = hash_api_key(raw_key)
+        auth_cache.put(key_hash, ProjectApiKey(
+            id=f"key-{raw_key}", project_id=project_id, key_prefix=raw_key[:8], key_hash=key_hash, key_fingerprint=key_hash[-8:]
+        ))
+        hashes.append(key_hash)
+
+    yield _verify
+    for key_hash in hashes:
+        auth_cache.invalidate(key_hash)
+
+
+@pytest.fixture
+def no_requests_allowed(monkeypatch):
+    limiter = RateLimiter(MemoryBucketStore(100, 600), BucketLimit(rate=1 / 30, burst=0.5), None, None)
+    monkeypatch.setattr(rate_limiter, "_limiter", limiter)
+
+
+def test_security_headers_and_single_request_id(client):
+    resp = client.get("/version", headers={"x-request-id": "  abc-123  "})
+    assert resp.headers["x-request-id"] == "abc-123"
+    assert resp.headers.get_list("x-request-id") == ["abc-123"]
+    assert resp.headers["x-content-type-options"] == "nosniff"
+    assert resp.headers["referrer-policy"] == "no-referrer"
+    assert resp.headers["x-frame-options"] == "DENY"
+
+
+def test_rate_limited_response_keeps_contract(client, no_requests_allowed, caplog):
+    caplog.set_level(logging.INFO, logger="request_log")
+    resp = client.get("/version", headers={"x-request-id": "rl-1", "origin": "http://localhost:3000"})
+    assert resp.status_code == 429
+    assert resp.json() == {"error_code": "RATE_LIMIT_EXCEEDED", "message": "Too many requests", "request_id": "rl-1"}
+    assert resp.headers["x-request-id"] == "rl-1"
+    assert resp.headers["x-frame-options"] == "DENY"
+    assert resp.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert resp.headers["retry-after"] == "15"
+    assert resp.headers["x-ratelimit-remaining"] == "0"
+    logged = [json.loads(r.msg) for r in caplog.records if r.name == "request_log"]
+    assert any(d["status_code"] == 429 and d["request_id"] == "rl-1" for d in logged)
+
+
+def test_project_bucket_is_charged_only_for_verified_keys(client, verified_keys, monkeypatch):
+    # Roomy IP bucket, a project bucket that admits a single request
+    limiter = RateLimiter(MemoryBucketStore(100, 600), BucketLimit.per_minute(1000), None, BucketLimit(rate=1 / 60, burst=1))
+    monkeypatch.setattr(rate_limiter, "_limiter", limiter)
+    # Anonymous requests naming the victim's project in the path do not touch its bucket
+    for _ in range(3):
+        assert client.get("/v1/projects/victim/jobs/missing").status_code == 404
+        assert client.get("/v1/projects/victim/jobs/missing", headers={"x-api-key": "mph_unverified"}).status_code == 404
+    verified_keys("mph_victim", "victim")
+    assert client.get("/version", headers={"x-api-key": "mph_victim"}).status_code == 200
+    assert client.get("/version", headers={"x-api-key": "mph_victim"}).status_code == 429
+
+
+def test_preflight_is_not_rate_limited_or_logged(client, no_requests_allowed, caplog):
+    caplog.set_level(logging.INFO, logger="request_log")
+    resp = client.options("/version", headers={
+        "origin": "http://localhost:3000",
+        "access-control-request-method": "GET",
+    })
+    assert resp.status_code == 200
+    assert resp.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert resp.headers["x-request-id"]
+    assert resp.headers["x-content-type-options"] == "nosniff"
+    assert not [r for r in caplog.records if r.name == "request_log"]
+
+
+def test_limits_by_api_key_and_project_with_headers(client, verified_keys, monkeypatch):
+    limiter = RateLimiter(
+        MemoryBucketStore(100, 600),
+        ip_limit=BucketLimit.per_minute(100),
+        key_limit=BucketLimit.per_minute(2),
+        project_limit=BucketLimit.per_minute(3),
+    )
+    monkeypatch.setattr(rate_limiter, "_limiter", limiter)
+    verified_keys("mph_key_one", "proj-a")
+    verified_keys("mph_key_two", "proj-a")
+    url = "/v1/projects/proj-a/jobs/missing"
+    first = client.get(url, headers={"Authorization": "Bearer mph_key_one"})
+    assert first.headers["x-ratelimit-limit"] == "2"
+    assert first.headers["x-ratelimit-remaining"] == "1"
+    client.get(url, headers={"Authorization": "Bearer mph_key_one"})
+    # Key bucket empty
+    assert client.get(url, headers={"Authorization": "Bearer mph_key_one"}).status_code == 429
+    # Another key still has room, until the project bucket (3) runs out
+    assert client.get(url, headers={"X-API-Key": "mph_key_two"}).status_code != 429
+    assert client.get(url, headers={"X-API-Key": "mph_key_two"}).status_code == 429
+    # Other projects are unaffected
+    verified_keys("mph_key_three", "proj-b")
+    assert client.get("/v1/projects/proj-b/jobs/missing", headers={"X-API-Key": "mph_key_three"}).status_code != 429
+
+
+def _app_with_slow_background_task(job_log, **pipeline_options):
+    from starlette.applications import Starlette
+    from starlette.background import BackgroundTask
+    from starlette.middleware import Middleware
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+    from app.middleware.pipeline import RequestPipelineMiddleware
+
+    def slow_job():
+        time.sleep(0.3)
+        job_log.append("done")
+
+    async def submit(request):
+        return JSONResponse({"job_id": "j1"}, status_code=202, background=BackgroundTask(slow_job))
+
+    limiter = RateLimiter(MemoryBucketStore(100, 600), None, None, None)
+    return Starlette(
+        routes=[Route("/submit", submit, methods=["POST"])],
+        middleware=[Middleware(RequestPipelineMiddleware, limiter=limiter, server_timing=False, **pipeline_options)],
+    )
+
+
+def test_latency_is_recorded_at_response_end_not_after_background_tasks():
+    job_log = []
+    decisions = []
+
+    class RecordingSampler:
+        def should_log(self, method, path, status_code, latency_ms, request_id):
+            decisions.append((status_code, latency_ms, list(job_log)))
+            return None
+
+    test_app = _app_with_slow_background_task(job_log, sampler=RecordingSampler())
+    with TestClient(test_app) as test_client:
+        assert test_client.post("/submit").status_code == 202
+    assert job_log == ["done"]
+    [(status_code, latency_ms, jobs_done)] = decisions
+    assert status_code == 202
+    assert latency_ms < 200
+    # Recorded before the background task ran
+    assert jobs_done == []
+
+
+def test_handler_failing_after_response_start_is_recorded_as_500(caplog):
+    from app.metrics import HTTP_REQUESTS
+    from app.middleware.log_sampling import RequestLogSampler
+    from app.middleware.pipeline import RequestPipelineMiddleware
+
+    async def broken(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        raise RuntimeError("boom")
+
+    pipeline = RequestPipelineMiddleware(
+        broken,
+        limiter=RateLimiter(MemoryBucketStore(100, 600), None, None, None),
+        sampler=RequestLogSampler([], default_rate=1.0),
+        server_timing=False,
+    )
+    caplog.set_level(logging.INFO, logger="request_log")
+    before = HTTP_REQUESTS.values().get(("GET", "unmatched", "500"), 0)
+    with pytest.raises(RuntimeError):
+        TestClient(pipeline).get("/broken-after-start")
+    logged = [json.loads(r.msg) for r in caplog.records if r.name == "request_log"]
+    assert [d["status_code"] for d in logged] == [500]
+    assert HTTP_REQUESTS.values()[("GET", "unmatched", "500")] == before + 1
@@ -0,0 +1,226 @@
+import asyncio
+import pytest
+from app.engines.ocr_engine import OCREngine, PAGE_SEPARATOR
+from app.engines.batching_engine import BatchingOCREngine
+
+
+class RecordingBatchEngine(OCREngine):
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def run(self, images, document_type):
+        return PAGE_SEPARATOR.join(await self.run_batch(images, document_type))
+
+    async def run_batch(self, images, document_type):
+        self.batches.append((list(images), document_type))
+        if self.fail:
+            raise RuntimeError("engine down")
+        return [f"{document_type}:{img}" for img in images]
+
+
+def test_default_run_batch_runs_each_page():
+    class EchoEngine(OCREngine):
+        async def run(self, images, document_type):
+            return "+".join(images)
+
+    assert asyncio.run(EchoEngine().run_batch(["a", "b"], None)) == ["a", "b"]
+
+
+def test_batching_combines_concurrent_jobs_and_scatters_results():
+    inner = RecordingBatchEngine()
+    engine = BatchingOCREngine(inner, max_batch_size=16, max_wait_ms=5)
+
+    async def main():
+        return await asyncio.gather(
+            engine.run(["a1", "a2"], "invoice"),
+            engine.run(["b1"], "invoice"),
+            engine.run(["c1"], "receipt"),
+        )
+
+    a, b, c = asyncio.run(main())
+    assert a == "invoice:a1" + PAGE_SEPARATOR + "invoice:a2"
+    assert b == "invoice:b1"
+    assert c == "receipt:c1"
+    # One engine call per document_type
+    assert sorted(len(images) for images, _ in inner.batches) == [1, 3]
+
+
+def test_batching_flushes_at_max_batch_size():
+    inner = RecordingBatchEngine()
+    engine = BatchingOCREngine(inner, max_batch_size=2, max_wait_ms=10_000)
+
+    async def main():
+        return await asyncio.wait_for(engine.run_batch(["1", "2", "3", "4"], None), timeout=1)
+
+    assert asyncio.run(main()) == ["None:1", "None:2", "None:3", "None:4"]
+    assert [len(images) for images, _ in inner.batches] == [2, 2]
+
+
+def test_batching_propagates_engine_errors_to_every_waiter():
+    engine = BatchingOCREngine(RecordingBatchEngine(fail=True), max_batch_size=8, max_wait_ms=1)
+
+    async def main():
+        return await asyncio.gather(
+            engine.run(["a"], None), engine.run(["b"], None), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_batching_keeps_dispatch_tasks_and_drains_them_on_close():
+    class SlowBatchEngine(RecordingBatchEngine):
+        async def run_batch(self, images, document_type):
+            await asyncio.sleep(0.05)
+            return await super().run_batch(images, document_type)
+
+    engine = BatchingOCREngine(SlowBatchEngine(), max_batch_size=8, max_wait_ms=10_000)
+
+    async def main():
+        job = asyncio.ensure_future(engine.run(["a", "b"], None))
+        await asyncio.sleep(0)
+        # Waiting pages are dispatched by aclose, and the batch is referenced while in flight
+        closing = asyncio.ensure_future(engine.aclose())
+        await asyncio.sleep(0)
+        assert len(engine._tasks) == 1
+        await closing
+        assert not engine._tasks
+        return await job
+
+    assert asyncio.run(main()) == "None:a" + PAGE_SEPARATOR + "None:b"
+
+
+def test_batching_close_timeout_fails_waiters_instead_of_hanging():
+    class StuckBatchEngine(RecordingBatchEngine):
+        async def run_batch(self, images, document_type):
+            await asyncio.sleep(60)
+
+    engine = BatchingOCREngine(StuckBatchEngine(), max_batch_size=1, max_wait_ms=1)
+
+    async def main():
+        job = asyncio.ensure_future(engine.run(["a"], None))
+        await asyncio.sleep(0.01)
+        await engine.aclose(timeout=0.01)
+        return await asyncio.gather(job, return_exceptions=True)
+
+    [result] = asyncio.run(asyncio.wait_for(main(), timeout=2))
+    assert isinstance(result, RuntimeError)
+
+
+def test_page_layout_is_columnar_and_serializes_selected_fields():
+    from app.engines.ocr_result import OCRPageLayout
+    page = OCRPageLayout(0)
+    page.add_line("Invoice 42", (1, 2, 3, 4), 0.5)
+    page.add_line("Total 10")
+    assert page.boxes.typecode == "d" and len(page.boxes) == 8
+    assert not hasattr(page, "__dict__")
+    lines = list(page.lines())
+    assert lines[0].bbox == (1, 2, 3, 4) and lines[0].confidence == 0.5
+    assert lines[1].confidence is None
+    assert page.to_dict(("text", "confidence")) == {
+        "index": 0, "text": ["Invoice 42", "Total 10"], "confidence": [0.5, None]
+    }
+    # A missing box is null, not a box at the origin
+    assert lines[1].bbox is None
+    assert page.to_dict(("bbox",))["bbox"] == [1, 2, 3, 4, None, None, None, None]
+
+
+def test_default_run_structured_derives_lines_from_text():
+    class TwoLineEngine(OCREngine):
+        async def run(self, images, document_type):
+            return f"{images[0]} line1\n{images[0]} line2"
+
+    result = asyncio.run(TwoLineEngine().run_structured(["a", "b"], None))
+    assert [len(p) for p in result.pages] == [2, 2]
+    assert result.to_dict(["text"])["pages"][1] == {"index": 1, "text": ["b line1", "b line2"]}
+
+
+def test_structured_output_through_api(override_api_key_store):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    client = TestClient(app)
+    headers = {"x-project-id": "test"}
+    post = client.post(
+        "/v1/projects/test/ocr",
+        headers=headers,
+        json={"images": ["c3RydWN0"], "output": "structured", "fields": ["text"]},
+    )
+    assert post.status_code == 202, post.text
+    data = client.get(f"/v1/projects/test/jobs/{post.json()['job_id']}", headers=headers).json()
+    assert data["status"] == "completed"
+    page = data["result"]["structured"]["pages"][0]
+    assert set(page) == {"index", "text"}
+    assert "\n".join(page["text"]) == data["result"]["text"]
+
+
+def test_invalid_structured_field_rejected(override_api_key_store):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    resp = TestClient(app).post(
+        "/v1/projects/test/ocr",
+        headers={"x-project-id": "test"},
+        json={"images": ["YQ=="], "output": "structured", "fields": ["pixels"]},
+    )
+    assert resp.status_code == 422
+
+
+@pytest.mark.parametrize("body", [
+    {"output": "structured", "fields": []},
+    {"fields": ["text"]},
+])
+def test_empty_or_unused_fields_rejected(override_api_key_store, body):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    resp = TestClient(app).post("/v1/projects/test/ocr", headers={"x-project-id": "test"}, json={"images": ["YQ=="], **body})
+    assert resp.status_code == 422
+    assert resp.json()["error_code"] == "VALIDATION_ERROR"
+
+
+def test_synthetic_engine_is_deterministic_for_seed():
+    from app.engines.synthetic_engine import SyntheticOCREngine, SyntheticProfile
+    profile = SyntheticProfile(seed=7, latency="heavy_tail", latency_ms=10.0)
+    a, b = SyntheticOCREngine(profile), SyntheticOCREngine(profile)
+    assert [a.sample_latency_ms() for _ in range(5)] == [b.sample_latency_ms() for _ in range(5)]
+    other = SyntheticOCREngine(SyntheticProfile(seed=8, latency="heavy_tail", latency_ms=10.0))
+    assert a.sample_latency_ms() != other.sample_latency_ms()
+
+
+def test_synthetic_engine_latency_distributions():
+    from app.engines.synthetic_engine import SyntheticOCREngine, SyntheticProfile
+    fixed = SyntheticOCREngine(SyntheticProfile(latency="fixed", latency_ms=3.0))
+    assert {fixed.sample_latency_ms() for _ in range(10)} == {3.0}
+    heavy = SyntheticOCREngine(SyntheticProfile(latency="heavy_tail", latency_ms=1.0, tail_alpha=1.2))
+    samples = [heavy.sample_latency_ms() for _ in range(2000)]
+    assert min(samples) >= 1.0 and max(samples) > 20.0
+    with pytest.raises(ValueError):
+        SyntheticOCREngine(SyntheticProfile(latency="uniform"))
+
+
+def test_synthetic_engine_output_and_failures():
+    from app.engines.synthetic_engine import SyntheticOCREngine, SyntheticProfile, SyntheticOCRError
+    engine = SyntheticOCREngine(SyntheticProfile(cpu_ms=1.0, alloc_kb=64, lines_per_page=2))
+    result = asyncio.run(engine.run_structured(["a", "b"], "invoice"))
+    assert [len(p) for p in result.pages] == [2, 2]
+    assert all(0.8 <= c <= 1.0 for p in result.pages for c in p.confidences)
+    texts = asyncio.run(engine.run_batch(["a", "b", "c"], "invoice"))
+    assert len(texts) == 3 and texts[2].startswith("synthetic invoice page 3")
+    failing = SyntheticOCREngine(SyntheticProfile(failure_rate=1.0))
+    with pytest.raises(SyntheticOCRError):
+        asyncio.run(failing.run(["a"], None))
+
+
+def test_factory_selects_engine_from_config(monkeypatch):
+    from app import config
+    from app.engines.factory import build_ocr_engine
+    from app.engines.synthetic_engine import SyntheticOCREngine
+    from app.engines.instrumented_engine import InstrumentedOCREngine
+    monkeypatch.setattr(config, "OCR_ENGINE", "synthetic")
+    monkeypatch.setattr(config, "OCR_BATCH_ENABLED", True)
+    engine = build_ocr_engine()
+    assert isinstance(engine, BatchingOCREngine)
+    assert isinstance(engine.engine, InstrumentedOCREngine)
+    assert isinstance(engine.engine.engine, SyntheticOCREngine)
+    monkeypatch.setattr(config, "OCR_ENGINE", "tesseract")
+    with pytest.raises(ValueError):
+        build_ocr_engine()
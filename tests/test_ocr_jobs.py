@@ -110,3 +110,34 @@ def test_get_job_wrong_project_id_returns_404(client):
     assert data["error_code"] == "NOT_FOUND"
     assert "request_id" in data
     assert "x-request-id" in get_resp.headers
+
+# 5️⃣ 429 once the project's OCR quota is spent, before any job is enqueued
+
+def test_post_ocr_quota_exceeded_returns_429(client, monkeypatch):
+    import app.services.quota as quota
+    from app.services.job_store import JOBS
+    from app.services.rate_limiter import MemoryBucketStore
+    budget = quota.QuotaBudget(pages_per_minute=4, bytes_per_day=10 * 1024)
+    monkeypatch.setattr(quota, "_quota", quota.CostQuota(MemoryBucketStore(100, quota.DAY_SECONDS), budget))
+    image = _fake_b64_str(1024)
+    headers = {"content-type": "application/json", "x-project-id": PROJECT_ID}
+    resp = client.post(OCR_URL, headers=headers, json={"images": [image, image]})
+    assert resp.status_code == 202, resp.text
+    jobs_before = len(JOBS)
+    # 3 more pages would exceed 4 pages per minute
+    resp = client.post(OCR_URL, headers=headers, json={"images": [image, image, image]})
+    assert resp.status_code == 429
+    data = resp.json()
+    assert data["error_code"] == "QUOTA_EXCEEDED"
+    assert resp.headers["x-request-id"] == data["request_id"]
+    assert int(resp.headers["retry-after"]) == 15
+    assert len(JOBS) == jobs_before
+    # One page still fits the page budget, but 8KB more exceeds the 10KB daily byte budget
+    assert client.post(OCR_URL, headers=headers, json={"images": [image]}).status_code == 202
+    big = _fake_b64_str(8 * 1024)
+    assert client.post(OCR_URL, headers=headers, json={"images": [big]}).status_code == 429
+    # More pages than the per-minute budget could ever hold: 413, nothing to retry
+    resp = client.post(OCR_URL, headers=headers, json={"images": [image] * 5})
+    assert resp.status_code == 413
+    assert resp.json()["error_code"] == "QUOTA_COST_TOO_LARGE"
+    assert "retry-after" not in resp.headers
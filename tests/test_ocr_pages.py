@@ -0,0 +1,184 @@
+import asyncio
+import pytest
+from app.engines.ocr_engine import OCREngine
+from app.schemas.ocr import OCRRequest
+from app.services import ocr_service
+from app.services.ocr_service import OCRService, PAGE_SEPARATOR
+
+
+class PageEngine(OCREngine):
+    """Echoes the page, tracks peak concurrency and fails selected pages."""
+
+    def __init__(self, fail_times=None):
+        self.fail_times = dict(fail_times or {})
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def run(self, images, document_type):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            # Later pages finish first to prove ordering is restored
+            await asyncio.sleep(0.001 * (10 - int(images[0])))
+            remaining = self.fail_times.get(images[0], 0)
+            if remaining:
+                self.fail_times[images[0]] = remaining - 1
+                raise RuntimeError(f"page {images[0]} boom")
+            return f"text-{images[0]}"
+        finally:
+            self.in_flight -= 1
+
+
+def _service(engine, concurrency=3, retries=1):
+    service = OCRService()
+    service.engine = engine
+    service.per_page = True
+    service.page_concurrency = concurrency
+    service.page_retries = retries
+    return service
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    ocr_service._ocr_cache.clear()
+    yield
+    ocr_service._ocr_cache.clear()
+
+
+def test_pages_merged_in_order_with_concurrency_cap():
+    engine = PageEngine()
+    service = _service(engine, concurrency=3)
+    req = OCRRequest(images=[str(i) for i in range(8)])
+    resp, cache_hit = asyncio.run(service.process(req, "rid"))
+    assert cache_hit is False
+    assert resp.text == PAGE_SEPARATOR.join(f"text-{i}" for i in range(8))
+    assert [p.index for p in resp.pages] == list(range(8))
+    assert engine.peak == 3
+
+
+def test_failed_page_is_retried():
+    engine = PageEngine(fail_times={"2": 1})
+    service = _service(engine, retries=1)
+    resp, _ = asyncio.run(service.process(OCRRequest(images=["1", "2"]), "rid"))
+    assert all(p.status == "completed" for p in resp.pages)
+    assert resp.pages[1].attempts == 2
+
+
+def test_page_failure_does_not_lose_job_and_is_not_cached():
+    engine = PageEngine(fail_times={"2": 5})
+    service = _service(engine, retries=1)
+    req = OCRRequest(images=["1", "2", "3"])
+    resp, _ = asyncio.run(service.process(req, "rid"))
+    assert [p.status for p in resp.pages] == ["completed", "failed", "completed"]
+    assert "page 2 boom" in resp.pages[1].error
+    assert resp.text == PAGE_SEPARATOR.join(["text-1", "text-3"])
+    assert not service.is_cache_hit(service.compute_request_hash(req))
+
+
+def test_all_pages_failed_raises():
+    service = _service(PageEngine(fail_times={"1": 5}), retries=0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.process(OCRRequest(images=["1"]), "rid"))
+
+
+def test_on_page_called_as_pages_finish():
+    finished = []
+    service = _service(PageEngine(), concurrency=4)
+    asyncio.run(service.process(OCRRequest(images=["1", "5", "9"]), "rid", on_page=finished.append))
+    # Page 9 sleeps least, so it is reported first
+    assert [p.index for p in finished] == [2, 1, 0]
+
+
+def test_cache_hit_returns_the_same_pages():
+    engine = PageEngine()
+    service = _service(engine)
+    req = OCRRequest(images=["1", "2"])
+    first, _ = asyncio.run(service.process(req, "rid"))
+    finished = []
+    second, cache_hit = asyncio.run(service.process(req, "rid2", on_page=finished.append))
+    assert cache_hit is True and engine.calls == 2
+    assert second.text == first.text
+    assert second.pages == first.pages
+    assert [p.index for p in finished] == [0, 1]
+
+
+def test_entry_cached_without_pages_is_recomputed_in_per_page_mode():
+    engine = PageEngine()
+    req = OCRRequest(images=["1", "2"])
+    whole = _service(engine)
+    whole.per_page = False
+    asyncio.run(whole.process(req, "rid"))
+    resp, cache_hit = asyncio.run(_service(engine).process(req, "rid2"))
+    assert cache_hit is False
+    assert [p.index for p in resp.pages] == [0, 1]
+
+
+@pytest.fixture
+def per_page_client(override_api_key_store, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import config
+    from app.main import app
+    monkeypatch.setattr(config, "OCR_PER_PAGE", True)
+    return TestClient(app)
+
+
+def test_get_job_returns_pages_and_progress(per_page_client):
+    headers = {"x-project-id": "test"}
+    post = per_page_client.post("/v1/projects/test/ocr", headers=headers, json={"images": ["YQ==", "Yg=="]})
+    assert post.status_code == 202, post.text
+    job_id = post.json()["job_id"]
+    data = per_page_client.get(f"/v1/projects/test/jobs/{job_id}", headers=headers).json()
+    assert data["status"] == "completed"
+    assert data["progress"] == 1.0
+    assert [p["index"] for p in data["pages"]] == [0, 1]
+    assert "pages" not in data["result"]
+
+
+def test_stream_job_emits_pages_then_job_line(per_page_client):
+    import json
+    headers = {"x-project-id": "test"}
+    post = per_page_client.post("/v1/projects/test/ocr", headers=headers, json={"images": ["YQ==", "Yg=="]})
+    job_id = post.json()["job_id"]
+    resp = per_page_client.get(f"/v1/projects/test/jobs/{job_id}/stream", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert resp.headers["x-request-id"]
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["type"] for line in lines] == ["page", "page", "job"]
+    assert lines[-1]["status"] == "completed"
+
+
+def test_stream_job_without_per_page_sends_only_the_job_line(override_api_key_store, monkeypatch):
+    import json
+    from fastapi.testclient import TestClient
+    from app import config
+    from app.main import app
+    monkeypatch.setattr(config, "OCR_PER_PAGE", False)
+    client = TestClient(app)
+    headers = {"x-project-id": "test"}
+    post = client.post("/v1/projects/test/ocr", headers=headers, json={"images": ["YQ==", "Yg=="]})
+    assert post.status_code == 202, post.text
+    job_id = post.json()["job_id"]
+    data = client.get(f"/v1/projects/test/jobs/{job_id}", headers=headers).json()
+    assert data["status"] == "completed" and data["progress"] == 1.0
+    assert data["pages"] == []
+    lines = [json.loads(line) for line in client.get(f"/v1/projects/test/jobs/{job_id}/stream", headers=headers).text.splitlines()]
+    assert [line["type"] for line in lines] == ["job"]
+    assert lines[0]["status"] == "completed" and "text" in lines[0]["result"]
+
+
+def test_stream_job_wrong_project_returns_404(per_page_client):
+    resp = per_page_client.get("/v1/projects/other/jobs/missing/stream", headers={"x-project-id": "other"})
+    assert resp.status_code == 404
+    assert resp.json()["error_code"] == "NOT_FOUND"
+
+
+def test_per_page_structured_output_keeps_page_order():
+    service = _service(PageEngine(), concurrency=4)
+    req = OCRRequest(images=["1", "5", "9"], output="structured")
+    resp, _ = asyncio.run(service.process(req, "rid"))
+    pages = resp.structured["pages"]
+    assert [p["index"] for p in pages] == [0, 1, 2]
+    assert [p["text"] for p in pages] == [["text-1"], ["text-5"], ["text-9"]]
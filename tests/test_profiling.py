@@ -0,0 +1,130 @@
+import threading
+import time
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app as main_app
+from app.middleware.pipeline import RequestPipelineMiddleware
+from app.profiling import ProfilerBusyError, RequestProfiles, SamplingProfiler, collapsed
+from app.security.auth import AuthContext
+from app.services.rate_limiter import MemoryBucketStore, RateLimiter
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler_collapses_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001)
+    try:
+        stacks = profiler.sample(0.1)
+    finally:
+        stop.set()
+        worker.join()
+    busy = [stack for stack in stacks if stack.startswith("busy;")]
+    assert busy and all("test_profiling:_busy_loop" in stack for stack in busy)
+    line = collapsed(stacks).splitlines()[0]
+    assert line.rsplit(" ", 1)[1].isdigit()
+
+
+def test_sampling_profiler_runs_one_at_a_time():
+    profiler = SamplingProfiler(interval=0.001)
+    runner = threading.Thread(target=profiler.sample, args=(0.2,))
+    runner.start()
+    time.sleep(0.05)
+    with pytest.raises(ProfilerBusyError):
+        profiler.sample(0.01)
+    runner.join()
+
+
+def test_request_profiles_are_bounded(tmp_path):
+    profiles = RequestProfiles(str(tmp_path), max_stored=2)
+    for i in range(3):
+        profiler = profiles.start()
+        assert profiles.start() is None  # one capture at a time
+        sum(range(1000))
+        assert profiles.stop(profiler, f"p{i}") == f"p{i}"
+        time.sleep(0.01)
+    assert [e["profile_id"] for e in profiles.list()] == ["p2", "p1"]
+    assert "function calls" in profiles.text("p2")
+    with pytest.raises(ValueError):
+        profiles.path("../etc/passwd")
+
+
+def _profiled_client(tmp_path):
+    app = FastAPI()
+
+    @app.get("/work")
+    def work(request: Request, key: str = "none"):
+        if key != "none":
+            request.state.auth = AuthContext(project_id="p", api_key_id=key, key_fingerprint="f")
+        return {"total": sum(range(1000))}
+
+    profiles = RequestProfiles(str(tmp_path), max_stored=10)
+    limiter = RateLimiter(MemoryBucketStore(100, 600), None, None, None)
+    app.add_middleware(RequestPipelineMiddleware, limiter=limiter, profiles=profiles, server_timing=False)
+    return TestClient(app), profiles
+
+
+def _cache_verified_key(raw_key, key_id):
+    from app.schemas.api_key import ProjectApiKey
+    from app.security.api_keys import hash_api_key
+    from app.security.auth_cache import auth_cache
+    key_hash = hash_api_key(raw_key)
+    auth_cache.put(key_hash, ProjectApiKey(
+        id=key_id, project_id="p", key_prefix=raw_key[:8], key_hash=key_hash, key_fingerprint=key_hash[-8:]
+    ))
+
+
+def test_header_triggered_capture_only_for_allowed_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILING_API_KEY_IDS", frozenset({"key-allowed"}))
+    _cache_verified_key("mph_allowed", "key-allowed")
+    _cache_verified_key("mph_other", "key-other")
+    client, profiles = _profiled_client(tmp_path)
+    allowed = {"x-profile": "1", "authorization": "Bearer mph_allowed"}
+
+    res = client.get("/work", params={"key": "key-allowed"}, headers=allowed)
+    profile_id = res.headers["x-profile-id"]
+    assert [e["profile_id"] for e in profiles.list()] == [profile_id]
+
+    other = {"x-profile": "1", "authorization": "Bearer mph_other"}
+    assert "x-profile-id" not in client.get("/work", params={"key": "key-other"}, headers=other).headers
+    assert "x-profile-id" not in client.get("/work", params={"key": "key-allowed"}).headers
+    assert len(profiles.list()) == 1
+
+
+def test_unauthorized_clients_never_start_the_profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILING_API_KEY_IDS", frozenset({"key-allowed"}))
+    monkeypatch.setattr(config, "PROFILING_ADMIN_TOKEN", "s3cret")
+    client, profiles = _profiled_client(tmp_path)
+    started = []
+    start = profiles.start
+    monkeypatch.setattr(profiles, "start", lambda: started.append(1) or start())
+
+    # No key, an unknown (uncached) key, a wrong admin token
+    client.get("/work", headers={"x-profile": "1"})
+    client.get("/work", params={"key": "key-allowed"}, headers={"x-profile": "1", "x-api-key": "mph_not_cached"})
+    client.get("/work", headers={"x-profile": "1", "x-admin-token": "wrong"})
+    assert started == []
+
+    res = client.get("/work", headers={"x-profile": "1", "x-admin-token": "s3cret"})
+    assert started == [1] and res.headers["x-profile-id"]
+
+
+def test_debug_endpoints_require_admin_token(monkeypatch):
+    client = TestClient(main_app)
+    monkeypatch.setattr(config, "PROFILING_MAX_SECONDS", 0.05)
+    res = client.post("/debug/profile/sample", params={"seconds": 5})
+    assert res.status_code == 200
+    assert res.headers["content-disposition"].startswith("attachment;")
+
+    monkeypatch.setattr(config, "PROFILING_ADMIN_TOKEN", "s3cret")
+    assert client.get("/debug/profile/requests").status_code == 404
+    res = client.get("/debug/profile/requests", headers={"x-admin-token": "s3cret"})
+    assert res.status_code == 200 and "items" in res.json()
+    assert client.get("/debug/profile/requests/missing", headers={"x-admin-token": "s3cret"}).status_code == 404
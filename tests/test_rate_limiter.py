@@ -0,0 +1,152 @@
+import asyncio
+import sqlite3
+import time
+import pytest
+from app.services.rate_limiter import (
+    BucketLimit, MemoryBucketStore, RateLimiter, SqliteBucketStore, parse_overrides
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _stores(tmp_path, clock):
+    return [
+        MemoryBucketStore(max_entries=100, idle_seconds=600, clock=clock),
+        SqliteBucketStore(str(tmp_path / "rl.db"), idle_seconds=600, clock=clock),
+    ]
+
+
+@pytest.mark.parametrize("backend", [0, 1])
+def test_token_bucket_refills_and_reports_retry_after(tmp_path, backend):
+    clock = FakeClock()
+    store = _stores(tmp_path, clock)[backend]
+    limit = BucketLimit.per_minute(60, burst=2)
+    assert store.acquire([("ip:a", limit)]).remaining == 1
+    assert store.acquire([("ip:a", limit)]).remaining == 0
+    denied = store.acquire([("ip:a", limit)])
+    assert (denied.allowed, denied.retry_after, denied.limit) == (False, 1, 2)
+    clock.now += 1
+    assert store.acquire([("ip:a", limit)]).allowed
+
+
+@pytest.mark.parametrize("backend", [0, 1])
+def test_all_buckets_charged_or_none(tmp_path, backend):
+    store = _stores(tmp_path, FakeClock())[backend]
+    roomy, tight = BucketLimit.per_minute(60, burst=10), BucketLimit.per_minute(1, burst=1)
+    assert store.acquire([("ip:a", roomy), ("project:p", tight)]).allowed
+    denied = store.acquire([("ip:a", roomy), ("project:p", tight)])
+    assert not denied.allowed and denied.retry_after == 60
+    # The denied request did not consume from the roomy bucket
+    assert store.acquire([("ip:a", roomy)]).remaining == 8
+
+
+def test_sqlite_buckets_are_shared_between_store_instances(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "shared.db")
+    worker_a = SqliteBucketStore(path, idle_seconds=600, clock=clock)
+    worker_b = SqliteBucketStore(path, idle_seconds=600, clock=clock)
+    limit = BucketLimit.per_minute(60, burst=1)
+    assert worker_a.acquire([("ip:a", limit)]).allowed
+    assert not worker_b.acquire([("ip:a", limit)]).allowed
+
+
+def test_sqlite_contention_does_not_block_the_event_loop(tmp_path):
+    path = str(tmp_path / "rl.db")
+    store = SqliteBucketStore(path, idle_seconds=600, busy_timeout_ms=300)
+    limiter = RateLimiter(store, BucketLimit(rate=1, burst=5), None, None)
+    # Another worker holds the write lock for the whole busy timeout
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def main():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0.02)
+        decision = await limiter.check_async("1.2.3.4")
+        task.cancel()
+        return decision, ticks
+
+    try:
+        decision, ticks = asyncio.run(main())
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    # Lock timeout fails open; meanwhile the loop kept running
+    assert decision.allowed
+    assert ticks[-1] - ticks[0] >= 0.25
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.15
+
+
+def test_memory_store_evicts_idle_and_bounds_size():
+    clock = FakeClock()
+    store = MemoryBucketStore(max_entries=3, idle_seconds=60, clock=clock)
+    limit = BucketLimit.per_minute(60)
+    for i in range(5):
+        store.acquire([(f"ip:{i}", limit)])
+    assert len(store) == 3
+    clock.now += 61
+    store.acquire([("ip:new", limit)])
+    assert len(store) == 1
+
+
+def test_limiter_buckets_hash_keys_and_apply_overrides():
+    overrides = parse_overrides('{"project:big": {"per_minute": 1000}, "key:mph_vip1": {"per_minute": 5, "burst": 50}}')
+    limiter = RateLimiter(
+        MemoryBucketStore(100, 600),
+        ip_limit=BucketLimit.per_minute(60),
+        key_limit=BucketLimit.per_minute(120),
+        project_limit=None,
+        overrides=overrides,
+    )
+    items = dict(limiter.buckets("1.2.3.4", "mph_vip1_secret", "big"))
+    assert items["ip:1.2.3.4"] == BucketLimit.per_minute(60)
+    assert items["project:big"] == BucketLimit.per_minute(1000)
+    key_bucket = next(k for k in items if k.startswith("key:"))
+    assert "secret" not in key_bucket and items[key_bucket] == BucketLimit.per_minute(5, 50)
+    # No project limit without an override
+    assert [k for k, _ in limiter.buckets("1.2.3.4", None, "small")] == ["ip:1.2.3.4"]
+    with pytest.raises(ValueError):
+        parse_overrides('{"tenant:x": {"per_minute": 1}}')
+
+
+def test_quota_charges_pages_and_bytes_all_or_nothing():
+    from app.services.quota import CostQuota, QuotaBudget, parse_overrides
+    clock = FakeClock()
+    budget = QuotaBudget(pages_per_minute=10, pages_per_day=12, bytes_per_minute=1000)
+    quota = CostQuota(MemoryBucketStore(100, 86400, clock=clock), budget, parse_overrides('{"big": {"pages_per_day": 0}}', budget))
+    assert quota.charge("p", pages=5, decoded_bytes=900).allowed
+    # Bytes over budget: pages are not charged either
+    assert not quota.charge("p", pages=5, decoded_bytes=200).allowed
+    clock.now += 60
+    assert quota.charge("p", pages=5, decoded_bytes=100).allowed
+    clock.now += 60
+    denied = quota.charge("p", pages=5, decoded_bytes=100)
+    assert not denied.allowed and denied.limit == 12
+    # Override drops the daily page budget for this project only
+    assert quota.charge("big", pages=10, decoded_bytes=0).allowed
+    assert CostQuota(None, QuotaBudget()).charge("p", 1, 1) is None
+
+
+def test_quota_rejects_cost_over_a_whole_budget_without_charging():
+    from app.errors import QuotaCostTooLargeError
+    from app.services.quota import CostQuota, QuotaBudget
+    store = MemoryBucketStore(100, 86400, clock=FakeClock())
+    quota = CostQuota(store, QuotaBudget(pages_per_minute=10, bytes_per_day=1000))
+    with pytest.raises(QuotaCostTooLargeError):
+        quota.charge("p", pages=11, decoded_bytes=0)
+    with pytest.raises(QuotaCostTooLargeError):
+        quota.charge("p", pages=1, decoded_bytes=1001)
+    # Nothing was taken: the full budget is still there
+    assert quota.charge("p", pages=10, decoded_bytes=1000).allowed
@@ -0,0 +1,61 @@
+import asyncio
+import base64
+import pytest
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app
+from app.timing import StageTimings, current_timings, mark, stage, use_timings
+
+PROJECT_ID = "timing"
+
+
+@pytest.fixture
+def client(override_api_key_store):
+    return TestClient(app)
+
+
+def test_stages_accumulate_across_tasks():
+    timings = StageTimings()
+
+    async def page():
+        with stage("engine"):
+            await asyncio.sleep(0.01)
+
+    async def job():
+        with use_timings(timings):
+            with stage("hash"):
+                pass
+            await asyncio.gather(page(), page(), page())
+            mark("total")
+
+    asyncio.run(job())
+    assert timings.counts == {"hash": 1, "engine": 3, "total": 1}
+    assert timings.durations["engine"] >= 0.03
+    assert current_timings() is None
+    # Without current timings recording is a no-op
+    with stage("ignored"):
+        pass
+    header = timings.server_timing()
+    assert header.startswith("hash;dur=") and ", engine;dur=" in header
+
+
+def test_ocr_request_sends_server_timing(client, monkeypatch):
+    monkeypatch.setattr(config, "SERVER_TIMING_ENABLED", True)
+    image = base64.b64encode(b"\x00" * 1024).decode("ascii")
+    res = client.post(
+        f"/v1/projects/{PROJECT_ID}/ocr",
+        headers={"x-project-id": PROJECT_ID},
+        json={"images": [image], "document_type": "invoice"},
+    )
+    assert res.status_code == 202, res.text
+    names = [part.split(";")[0] for part in res.headers["server-timing"].split(", ")]
+    assert names == ["validation", "b64_size", "quota", "total"]
+
+    job_url = f"/v1/projects/{PROJECT_ID}/jobs/{res.json()['job_id']}"
+    data = client.get(job_url, params={"debug": "true"}, headers={"x-project-id": PROJECT_ID}).json()
+    assert data["status"] == "completed"
+    assert set(data["timings"]) == {"queue_wait", "hash", "cache_lookup", "engine"}
+    assert "timings" not in client.get(job_url, headers={"x-project-id": PROJECT_ID}).json()
+
+    monkeypatch.setattr(config, "SERVER_TIMING_ENABLED", False)
+    assert "timings" not in client.get(job_url, params={"debug": "true"}, headers={"x-project-id": PROJECT_ID}).json()
@@ -0,0 +1,94 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.middleware.pipeline import RequestPipelineMiddleware
+from app.services.rate_limiter import MemoryBucketStore, RateLimiter
+from app.timing import stage
+from app.tracing import Tracer, current_span, parse_traceparent, span
+
+PARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+class ListExporter:
+    def __init__(self):
+        self.lines = []
+
+    def put(self, line):
+        self.lines.append(line)
+
+    def spans(self):
+        return [json.loads(line) for line in self.lines]
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(PARENT) == ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True)
+    assert parse_traceparent(PARENT[:-1] + "0")[2] is False
+    for bad in (None, "", "00-xyz", "ff" + PARENT[2:], "00-" + "0" * 32 + "-b7ad6b7169203331-01"):
+        assert parse_traceparent(bad) is None
+
+
+def test_sampling_follows_parent_flag():
+    exporter = ListExporter()
+    never = Tracer(exporter, sample_rate=0.0)
+    always = Tracer(exporter, sample_rate=1.0)
+    assert never.start_trace("r") is None
+    assert never.start_trace("r", PARENT).trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert always.start_trace("r", PARENT[:-1] + "0") is None
+    assert always.start_trace("r").parent_id is None
+
+
+def test_spans_nest_and_record_errors():
+    exporter = ListExporter()
+    with pytest.raises(RuntimeError):
+        with span("ignored") as nothing:
+            assert nothing is None
+            raise RuntimeError()
+    root = Tracer(exporter, 1.0).start_trace("root")
+    with span("outer", parent=root, kind="test") as outer:
+        assert current_span() is outer
+        with pytest.raises(ValueError):
+            with span("inner"):
+                raise ValueError("boom")
+    root.end()
+    root.end()
+    inner, outer_d, root_d = exporter.spans()
+    assert inner["parent_span_id"] == outer_d["span_id"] and outer_d["parent_span_id"] == root_d["span_id"]
+    assert inner["status"] == "error" and inner["attributes"]["error.type"] == "ValueError"
+    assert outer_d["attributes"]["kind"] == "test"
+    assert current_span() is None
+
+
+def _traced_client(sample_rate):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: str):
+        with stage("lookup"):
+            return {"item_id": item_id}
+
+    exporter = ListExporter()
+    limiter = RateLimiter(MemoryBucketStore(100, 600), None, None, None)
+    app.add_middleware(RequestPipelineMiddleware, limiter=limiter, server_timing=False, tracer=Tracer(exporter, sample_rate))
+    return TestClient(app), exporter
+
+
+def test_request_spans_continue_incoming_trace():
+    client, exporter = _traced_client(0.0)
+    res = client.get("/items/1", headers={"traceparent": PARENT})
+    trace_id, root_id, sampled = parse_traceparent(res.headers["traceparent"])
+    assert trace_id == "0af7651916cd43dd8448eb211c80319c" and sampled
+    spans = {s["name"]: s for s in exporter.spans()}
+    assert set(spans) == {"rate_limit", "lookup", "handler /items/{item_id}", "GET /items/{item_id}"}
+    root = spans["GET /items/{item_id}"]
+    assert root["span_id"] == root_id and root["parent_span_id"] == "b7ad6b7169203331"
+    assert root["attributes"]["http.status_code"] == 200
+    assert spans["lookup"]["parent_span_id"] == spans["handler /items/{item_id}"]["span_id"]
+
+
+def test_unsampled_requests_export_nothing():
+    client, exporter = _traced_client(0.0)
+    res = client.get("/items/1")
+    assert res.status_code == 200
+    assert "traceparent" not in res.headers
+    assert exporter.lines == []
@@ -0,0 +1,106 @@
+import base64
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.db.models.usage_rollup import UsageRollupDB
+from app.main import app
+from app.usage import UsageAggregator, query_rollups, usage_aggregator
+
+HOUR = 3600
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    UsageRollupDB.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def test_counters_aggregate_into_buckets():
+    agg = UsageAggregator(bucket_seconds=300)
+    agg.record("p1", requests=1, pages=2, decoded_bytes=100, when=10)
+    agg.record("p1", requests=1, pages=3, decoded_bytes=50, when=299)
+    agg.record("p1", engine_ms=12.5, cache_hits=1, when=300)
+    agg.record("p2", requests=1, when=10)
+    assert agg.pending_count() == 3
+    first = agg.snapshot()[0]
+    assert first["project_id"] == "p1"
+    assert (first["requests"], first["pages"], first["decoded_bytes"]) == (2, 5, 150)
+
+
+def test_flush_upserts_and_rolls_up_by_range(db):
+    agg = UsageAggregator(bucket_seconds=300)
+    agg.record("p1", requests=2, pages=4, when=0)
+    agg.record("p1", requests=1, engine_ms=7.4, when=HOUR + 10)
+    agg.record("other", requests=5, when=0)
+    assert agg.flush(db) == 3
+    assert agg.pending_count() == 0
+    # A second flush (another worker, same bucket) adds to the existing row
+    agg.record("p1", requests=1, pages=1, cache_hits=1, when=60)
+    assert agg.flush(db) == 1
+
+    hourly = query_rollups(db, "p1", 0, 2 * HOUR, HOUR)
+    assert [(b["requests"], b["pages"], b["engine_ms"], b["cache_hits"]) for b in hourly] == [(3, 5, 0, 1), (1, 0, 7, 0)]
+    assert hourly[1]["start"] == "1970-01-01T01:00:00+00:00"
+    assert [b["requests"] for b in query_rollups(db, "p1", 0, 2 * HOUR, 86400)] == [4]
+    assert query_rollups(db, "p1", 2 * HOUR, 3 * HOUR, HOUR) == []
+
+
+def test_flush_writes_more_buckets_than_one_statement_holds():
+    import sqlite3
+    from sqlalchemy import event, func, select
+    from app.stores.api_key_common import BULK_CHUNK_SIZE
+    engine = create_engine("sqlite://")
+    # SQLite's default limit; some builds raise it, which would hide an oversized statement
+    event.listen(engine, "connect", lambda conn, _: conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766))
+    UsageRollupDB.__table__.create(engine)
+    agg = UsageAggregator(bucket_seconds=60)
+    # 7 bind parameters per bucket: a single statement for all of them would need 35000
+    buckets = max(5000, 2 * BULK_CHUNK_SIZE + 1)
+    for i in range(buckets):
+        agg.record(f"p{i % 50}", requests=1, when=i * 60)
+    with Session(engine) as db:
+        assert agg.flush(db) == buckets
+        assert agg.pending_count() == 0
+        assert db.execute(select(func.count(), func.sum(UsageRollupDB.requests))).one() == (buckets, buckets)
+
+
+def test_failed_flush_keeps_counts(db):
+    agg = UsageAggregator(bucket_seconds=300)
+    agg.record("p1", requests=1, when=0)
+    UsageRollupDB.__table__.drop(db.get_bind())
+    with pytest.raises(Exception):
+        agg.flush(db)
+    agg.record("p1", requests=2, when=0)
+    assert agg.snapshot()[0]["requests"] == 3
+
+
+def test_ocr_route_and_worker_record_usage(override_api_key_store):
+    usage_aggregator.drain()
+    client = TestClient(app)
+    image = base64.b64encode(b"\x00" * 1000).decode("ascii")
+    for _ in range(2):
+        res = client.post("/v1/projects/metered/ocr", json={"images": [image, image], "document_type": "invoice"})
+        assert res.status_code == 202, res.text
+    pending = [b for b in usage_aggregator.snapshot() if b["project_id"] == "metered"]
+    assert sum(b["requests"] for b in pending) == 2
+    assert sum(b["pages"] for b in pending) == 4
+    assert sum(b["decoded_bytes"] for b in pending) == 4000
+    # Same images twice: the second job is answered from the OCR cache
+    assert sum(b["cache_hits"] for b in pending) == 1
+
+
+def test_usage_endpoint_validates_range(override_api_key_store):
+    from app.security.api_keys import generate_api_key, store_api_key
+    raw_key = generate_api_key()
+    store_api_key("metered", raw_key)
+    client = TestClient(app)
+    res = client.get(
+        "/api/projects/metered/usage",
+        params={"start": "2026-01-02T00:00:00Z", "end": "2026-01-01T00:00:00Z"},
+        headers={"authorization": f"Bearer {raw_key}"},
+    )
+    assert res.status_code == 400
+    assert res.json()["error_code"] == "INVALID_RANGE"